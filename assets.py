@@ -0,0 +1,76 @@
+import os
+import json
+from pathlib import Path
+
+# فایل رجیستری دارایی‌ها؛ با متغیر محیطی ASSET_REGISTRY قابل تغییر است
+REGISTRY_FILE = Path(os.environ.get("ASSET_REGISTRY", Path(__file__).parent / "assets.json"))
+
+
+class Asset:
+    """
+    یک دارایی قابل ردیابی.
+    symbols: نماد جفت‌ارز در هر صرافی (کلید همان نام منبع در scraper است)
+    fixed_usd: برای دارایی‌هایی مثل تتر که قیمتشان ثابت فرض می‌شود
+    source: منبع خاص (مثلاً "gold") به جای صرافی‌ها
+    """
+    __slots__ = ("code", "name", "default", "coingecko", "symbols", "fixed_usd", "source")
+
+    def __init__(self, code, name, default=False, coingecko=None, symbols=None, fixed_usd=None, source=None):
+        if not code.isalnum():
+            raise ValueError(f"Invalid asset code: {code!r}")
+        self.code = code.upper()
+        self.name = name
+        self.default = default
+        self.coingecko = coingecko
+        self.symbols = symbols or {}
+        self.fixed_usd = fixed_usd
+        self.source = source
+
+
+class AssetRegistry:
+    """لیست مرتب دارایی‌ها که scraper، ربات و API همگی از آن استفاده می‌کنند."""
+
+    def __init__(self, assets):
+        self.assets = {a.code: a for a in assets}
+        self.order = {code: i for i, code in enumerate(self.assets)}
+        self.defaults = [a.code for a in assets if a.default]
+
+    @classmethod
+    def load(cls, path=REGISTRY_FILE):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls([Asset(**item) for item in data["assets"]])
+
+    def __contains__(self, code):
+        return code in self.assets
+
+    def __iter__(self):
+        return iter(self.assets)
+
+    def __len__(self):
+        return len(self.assets)
+
+    def get(self, code):
+        return self.assets.get(code)
+
+    def name(self, code):
+        asset = self.assets.get(code)
+        return asset.name if asset else code
+
+    def resolve(self, assets_str):
+        """رشته دارایی‌های فعال یک چت ("ALL" یا "BTC,ETH") را به لیست مرتب کدها تبدیل می‌کند."""
+        if assets_str == "ALL": return self.defaults
+        if not assets_str: return []
+        return self.sort([c for c in assets_str.split(",") if c in self.assets])
+
+    def sort(self, codes):
+        return sorted(codes, key=lambda c: self.order.get(c, len(self.order)))
+
+    def page(self, codes, page, per_page):
+        """یک صفحه از لیست به همراه تعداد کل صفحات"""
+        pages = max(1, -(-len(codes) // per_page))
+        page = min(max(page, 0), pages - 1)
+        return codes[page * per_page:(page + 1) * per_page], page, pages
+
+
+registry = AssetRegistry.load()
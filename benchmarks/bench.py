@@ -0,0 +1,147 @@
+"""
+میکروبنچمارک توابعی که در هر تیک اجرا می‌شوند.
+
+    python benchmarks/bench.py                   # اجرا و مقایسه با baseline.json
+    python benchmarks/bench.py --save-baseline   # ثبت نتایج فعلی به عنوان baseline
+    python benchmarks/bench.py --only gold       # فقط بنچمارک‌هایی که نامشان شامل gold است
+
+برای هر تابع تعداد اجرا در ثانیه و حافظه تخصیص یافته در هر فراخوانی گزارش می‌شود.
+اگر سرعت یک تابع بیش از حد آستانه (پیش‌فرض ۲۰٪) از baseline کمتر باشد، خروجی با کد ۱ تمام می‌شود.
+"""
+import os
+import sys
+import json
+import asyncio
+import timeit
+import argparse
+import tracemalloc
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).parent
+FIXTURES = BENCH_DIR / "fixtures"
+BASELINE_FILE = BENCH_DIR / "baseline.json"
+sys.path.insert(0, str(BENCH_DIR.parent))
+
+# bot.py در زمان import تنظیمات را از محیط می‌خواند
+os.environ.setdefault("BOT_TOKEN", "0:benchmark")
+os.environ.setdefault("CHANNEL_ID", "@YourChannelName")
+
+
+def load_json(name):
+    with open(FIXTURES / name, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def build_cases():
+    """لیست (نام، تابع بدون آرگومان) برای هر بنچمارک"""
+    import bot
+    import httpx
+    import scraper
+    from assets import registry
+    from replay import ReplayTransport
+    from snapshot import encode_snapshot, decode_snapshot
+
+    binance = load_json("binance_ticker_price.json")
+    lbank = load_json("lbank_ticker_24hr.json")
+    gold_html = (FIXTURES / "coinmarketcap_gold.html").read_text(encoding="utf-8")
+    raw_snapshot = load_json("prices_snapshot.json")
+    nested = json.dumps(raw_snapshot, ensure_ascii=False, separators=(",", ":"))
+    snapshot = decode_snapshot(raw_snapshot)
+    prices = snapshot["prices"]
+    columnar = encode_snapshot(snapshot)
+    sources = {s["name"]: s for s in scraper.EXCHANGE_SOURCES}
+    wanted = [a for a in map(registry.get, registry.defaults) if a.source is None]
+
+    # یک تیک کامل اسکرپر روی ترافیک ضبط شده (بدون شبکه و بدون انتظار)
+    loop = asyncio.new_event_loop()
+    replay_client = httpx.AsyncClient(transport=ReplayTransport(FIXTURES / "upstream.jsonl.gz", speed=0))
+    all_defaults = [registry.get(c) for c in registry.defaults]
+    scrape_tick = lambda: loop.run_until_complete(scraper.scrape_once(replay_client, all_defaults, "ts"))
+
+    # قیمت‌های قبلی برای نمایش روند، و ۵۰۰۰ هشدار که حدود ۱٪ آن‌ها فعال می‌شوند
+    bot.PREVIOUS_PRICES.update({k: v.price_num * 0.999 for k, v in prices.items()})
+    assets = list(prices)
+    alerts = []
+    for i in range(5000):
+        asset = assets[i % len(assets)]
+        curr = prices[asset].price_num
+        target = curr * (0.995 if i % 100 == 0 else 1.2)
+        alerts.append((i, 1000 + i, asset, target, "ABOVE"))
+
+    return [
+        ("scraper.normalize[str]", lambda: scraper.normalize("$97,234.51")),
+        ("scraper.normalize[float]", lambda: scraper.normalize(97234.51)),
+        ("scraper.extract_gold", lambda: scraper.extract_gold(gold_html)),
+        ("scraper.parse[binance]", lambda: scraper.parse_exchange_payload(sources["Binance"], binance, wanted)),
+        ("scraper.parse[lbank]", lambda: scraper.parse_exchange_payload(sources["LBank"], lbank, wanted)),
+        ("scraper.scrape_once[replay]", scrape_tick),
+        # کدک ستونی اسنپ‌شات در برابر JSON تو در توی قبلی
+        ("snapshot.encode[json]", lambda: json.dumps(raw_snapshot, ensure_ascii=False, separators=(",", ":"))),
+        ("snapshot.encode", lambda: encode_snapshot(snapshot)),
+        ("snapshot.decode[json]", lambda: json.loads(nested)),
+        ("snapshot.decode", lambda: decode_snapshot(columnar)),
+        ("bot.format_price_message", lambda: bot.format_price_message(prices, -100, "ALL")),
+        ("bot.calculate_trend", lambda: bot.calculate_trend("BTC", 97234.51)),
+        ("bot.evaluate_alerts[5000]", lambda: bot.evaluate_alerts(alerts, prices)),
+    ]
+
+
+def measure(func, min_time=0.2, repeat=5):
+    """بهترین تعداد اجرا در ثانیه از چند تکرار، و اوج حافظه تخصیص یافته در یک فراخوانی"""
+    number = 1
+    while timeit.timeit(func, number=number) < min_time:
+        number *= 2
+    best = min(timeit.repeat(func, number=number, repeat=repeat))
+    ops = number / best
+
+    tracemalloc.start()
+    func()
+    base, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return ops, peak - base
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--save-baseline", action="store_true", help="ذخیره نتایج به عنوان baseline")
+    parser.add_argument("--threshold", type=float, default=0.20, help="حداکثر کاهش مجاز سرعت نسبت به baseline")
+    parser.add_argument("--only", default="", help="فقط بنچمارک‌هایی که نامشان شامل این متن است")
+    args = parser.parse_args()
+
+    baseline = json.loads(BASELINE_FILE.read_text()) if BASELINE_FILE.exists() else {}
+    results = {}
+    regressions = []
+
+    print(f"{'benchmark':<28}{'ops/sec':>14}{'peak B':>12}{'vs base':>10}")
+    for name, func in build_cases():
+        if args.only and args.only not in name: continue
+        ops, alloc_bytes = measure(func)
+        results[name] = {"ops_per_sec": round(ops, 1), "alloc_bytes": alloc_bytes}
+
+        ratio = ""
+        base = baseline.get(name)
+        if base:
+            change = ops / base["ops_per_sec"] - 1
+            ratio = f"{change:+.1%}"
+            if change < -args.threshold:
+                regressions.append(name)
+                ratio += " !"
+        print(f"{name:<28}{ops:>14,.0f}{alloc_bytes:>12,}{ratio:>10}")
+
+    if args.save_baseline:
+        baseline.update(results)
+        BASELINE_FILE.write_text(json.dumps(baseline, indent=2, sort_keys=True) + "\n")
+        print(f"Baseline saved to {BASELINE_FILE}")
+    elif not baseline:
+        print("No baseline found; run with --save-baseline to record one.")
+
+    if regressions and not args.save_baseline:
+        print(f"Regressed past {args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,547 +1,915 @@
-import asyncio
-import logging
-import json
-from pathlib import Path
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import (
-    Application, CommandHandler, CallbackQueryHandler, MessageHandler, 
-    filters, ContextTypes, ChatMemberHandler
-)
-from telegram.constants import ChatMemberStatus
-from telegram.error import TelegramError
-
-# ایمپورت تنظیمات از فایل config.py
-from config import settings
-
-# ایمپورت دیتابیس
-from database import (
-    initialize_db, add_or_update_chat, remove_chat, get_user_chats,
-    set_chat_interval, get_all_scheduled_chats, set_chat_assets, get_chat_assets,
-    set_chat_language, get_chat_language,
-    add_alert, get_all_alerts, get_user_alerts, delete_alert
-)
-
-# --- تنظیمات ---
-# خواندن مقادیر حساس از فایل کانفیگ برای امنیت
-REQUIRED_CHANNEL = settings.CHANNEL_ID 
-PRICE_FILE = Path("prices.json") 
-
-logging.basicConfig(format="%(asctime)s - %(levelname)s - %(message)s", level=logging.INFO)
-logger = logging.getLogger(__name__)
-
-# --- سیستم ترجمه (Localization) ---
-TRANS = {
-    "fa": {
-        "welcome": "👋 <b>به ربات قیمت خوش آمدید!</b>\n\nلطفاً زبان خود را انتخاب کنید:\nPlease select your language:",
-        "main_menu_text": "✅ <b>منوی اصلی</b>\n\nگزینه مورد نظر را انتخاب کنید:",
-        "btn_prices": "📊 مشاهده قیمت‌ها",
-        "btn_alerts": "🔔 مدیریت هشدارها",
-        "btn_groups": "⚙️ مدیریت گروه‌ها",
-        "btn_help": "❓ راهنما و آموزش",
-        "btn_lang": "🌍 تغییر زبان / Language",
-        "price_title": "📊 <b>قیمت‌های لحظه‌ای بازار:</b>\n",
-        "alert_menu_title": "🔔 <b>منوی هشدارها:</b>",
-        "btn_new_alert": "➕ ثبت هشدار جدید",
-        "btn_my_alerts": "📋 هشدارهای من",
-        "btn_back": "🔙 بازگشت",
-        "btn_cancel": "❌ انصراف",
-        "select_asset": "🎯 ارز مورد نظر را انتخاب کنید:",
-        "enter_price": "🎯 ارز: <b>{asset}</b>\n🔢 لطفاً قیمت هدف را (به عدد انگلیسی) تایپ کنید:\nمثال: 95000",
-        "alert_set": "✅ هشدار ثبت شد!\nهر وقت <b>{asset}</b> {cond} از <b>{target}</b> دلار شد خبرت می‌کنم.",
-        "cond_above": "بیشتر",
-        "cond_below": "کمتر",
-        "no_alerts": "📭 شما هشداری ندارید.",
-        "alert_deleted": "✅ هشدار حذف شد.",
-        "group_menu_title": "مدیریت گروه‌ها:",
-        "no_groups": "شما گروه فعالی ندارید. ربات را در گروه ادمین کنید.",
-        "settings_title": "⚙️ تنظیمات: <b>{title}</b>",
-        "sec": "ثانیه",
-        "min": "دقیقه",
-        "off": "🔕 خاموش",
-        "active": "✅ فعال: ",
-        "calc_error": "⚠️ فرمت اشتباه.\nمثال: /calc 0.5 BTC",
-        "price_na": "⚠️ قیمت در دسترس نیست.",
-        "join_msg": "⛔️ <b>عضویت اجباری</b>\n\nبرای استفاده از ربات باید عضو کانال ما باشید.",
-        "btn_join": "📢 عضویت در کانال",
-        "btn_verify": "✅ عضو شدم",
-        "join_success": "✅ عضویت تایید شد! خوش آمدید.",
-        "join_fail": "❌ هنوز عضو کانال نشده‌اید!",
-        "help_text": (
-            "📚 <b>راهنما و آموزش استفاده</b>\n\n"
-            "🤖 <b>چگونه ربات را به گروه/کانال اضافه کنیم؟</b>\n"
-            "1️⃣ وارد پروفایل ربات شوید و گزینه <i>Add to Group</i> را بزنید.\n"
-            "2️⃣ گروه یا کانال خود را انتخاب کنید.\n"
-            "3️⃣ <b>مهم:</b> بعد از افزودن، حتماً ربات را <b>Admin</b> کنید تا بتواند پیام بفرستد.\n\n"
-            "🧮 <b>ماشین حساب:</b>\n"
-            "دستور: <code>/calc [مقدار] [ارز]</code>\n"
-            "مثال: <code>/calc 0.5 BTC</code>\n\n"
-            "🔔 <b>هشدار قیمت:</b>\n"
-            "از منوی اصلی دکمه «مدیریت هشدارها» را بزنید."
-        )
-    },
-    "en": {
-        "welcome": "👋 <b>Welcome to Crypto Price Bot!</b>\n\nPlease select your language:",
-        "main_menu_text": "✅ <b>Main Menu</b>\n\nSelect an option:",
-        "btn_prices": "📊 Live Prices",
-        "btn_alerts": "🔔 Price Alerts",
-        "btn_groups": "⚙️ Manage Groups",
-        "btn_help": "❓ Help & Tutorial",
-        "btn_lang": "🌍 Change Language",
-        "price_title": "📊 <b>Live Market Prices:</b>\n",
-        "alert_menu_title": "🔔 <b>Alerts Menu:</b>",
-        "btn_new_alert": "➕ New Alert",
-        "btn_my_alerts": "📋 My Alerts",
-        "btn_back": "🔙 Back",
-        "btn_cancel": "❌ Cancel",
-        "select_asset": "🎯 Select an asset:",
-        "enter_price": "🎯 Asset: <b>{asset}</b>\n🔢 Please type the target price (in numbers):\nExample: 95000",
-        "alert_set": "✅ Alert Set!\nI will notify you when <b>{asset}</b> goes {cond} <b>{target}</b> USD.",
-        "cond_above": "ABOVE",
-        "cond_below": "BELOW",
-        "no_alerts": "📭 You have no active alerts.",
-        "alert_deleted": "✅ Alert deleted.",
-        "group_menu_title": "Group Management:",
-        "no_groups": "No active groups found. Add & Admin the bot in a group first.",
-        "settings_title": "⚙️ Settings: <b>{title}</b>",
-        "sec": "sec",
-        "min": "min",
-        "off": "🔕 Off",
-        "active": "✅ Active: ",
-        "calc_error": "⚠️ Invalid format.\nExample: /calc 0.5 BTC",
-        "price_na": "⚠️ Price not available.",
-        "join_msg": "⛔️ <b>Action Required</b>\n\nYou must join our channel to use this bot.",
-        "btn_join": "📢 Join Channel",
-        "btn_verify": "✅ I have joined",
-        "join_success": "✅ Verified! Welcome.",
-        "join_fail": "❌ You haven't joined yet!",
-        "help_text": (
-            "📚 <b>Help & Tutorial</b>\n\n"
-            "🤖 <b>How to add bot to Group/Channel?</b>\n"
-            "1️⃣ Go to bot profile and click <i>Add to Group</i>.\n"
-            "2️⃣ Select your group or channel.\n"
-            "3️⃣ <b>IMPORTANT:</b> You MUST promote the bot to <b>Admin</b> so it can send messages.\n\n"
-            "🧮 <b>Calculator:</b>\n"
-            "Cmd: <code>/calc [amount] [asset]</code>\n"
-            "Ex: <code>/calc 0.5 BTC</code>\n\n"
-            "🔔 <b>Price Alerts:</b>\n"
-            "Use the 'Price Alerts' button in the main menu."
-        )
-    }
-}
-
-# --- حافظه موقت ---
-LAST_PRICES = {}
-PREVIOUS_PRICES = {}
-LAST_SENT_MESSAGES = {}
-USER_STATES = {}
-
-KNOWN_ASSETS = {
-    "BTC": "🪙 Bitcoin",
-    "ETH": "♦️ Ethereum",
-    "BNB": "🔶 BNB",
-    "USDT": "💲 Tether",
-    "TRX": "🔴 TRON",
-    "GOLD": "⚜️ Gold",
-}
-
-# --- توابع کمکی ---
-def t(key, chat_id):
-    """تابع ترجمه سریع"""
-    lang = get_chat_language(chat_id)
-    return TRANS.get(lang, TRANS["fa"]).get(key, key)
-
-def get_prices_from_file():
-    global LAST_PRICES, PREVIOUS_PRICES
-    try:
-        if not PRICE_FILE.exists(): return {}
-        with open(PRICE_FILE, "r", encoding="utf-8") as f:
-            new_prices = json.load(f)
-        
-        if LAST_PRICES:
-            temp_prev = {}
-            for k, v in LAST_PRICES.items():
-                if v and 'price_num' in v: temp_prev[k] = v['price_num']
-            PREVIOUS_PRICES.update(temp_prev)
-            
-        LAST_PRICES = new_prices
-        return new_prices
-    except Exception as e:
-        logger.error(f"Error reading prices: {e}")
-        return {}
-
-def calculate_trend(asset, current_price):
-    prev = PREVIOUS_PRICES.get(asset)
-    if prev is None: return ""
-    if current_price > prev: return "🟢"
-    elif current_price < prev: return "🔴"
-    return "⚪️"
-
-def format_price_message(prices, chat_id, enabled_assets_str="ALL"):
-    if not prices: return t("price_na", chat_id)
-    
-    assets_to_show = KNOWN_ASSETS.keys() if enabled_assets_str == "ALL" else enabled_assets_str.split(",")
-    
-    lines = [t("price_title", chat_id)]
-    has_data = False
-    
-    for code in KNOWN_ASSETS:
-        if code not in assets_to_show: continue
-        data = prices.get(code)
-        if data and data.get("price"):
-            name = KNOWN_ASSETS[code]
-            trend = calculate_trend(code, data.get("price_num"))
-            lines.append(f"{trend} <b>{name}</b>: <code>{data['price']}</code>")
-            has_data = True
-            
-    return "\n".join(lines) if has_data else "No assets selected."
-
-async def check_membership(user_id: int, context: ContextTypes.DEFAULT_TYPE) -> bool:
-    if not REQUIRED_CHANNEL or REQUIRED_CHANNEL == "@YourChannelName": return True
-    try:
-        member = await context.bot.get_chat_member(chat_id=REQUIRED_CHANNEL, user_id=user_id)
-        if member.status in [ChatMemberStatus.LEFT, ChatMemberStatus.BANNED]: return False
-        return True
-    except: return True 
-
-async def send_join_request(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    cid = update.effective_chat.id
-    channel_url = f"https://t.me/{REQUIRED_CHANNEL.replace('@', '')}"
-    
-    text = t("join_msg", cid)
-    keyboard = [
-        [InlineKeyboardButton(t("btn_join", cid), url=channel_url)],
-        [InlineKeyboardButton(t("btn_verify", cid), callback_data="verify_join")]
-    ]
-    
-    if update.callback_query:
-        await update.callback_query.edit_message_text(text, parse_mode="HTML", reply_markup=InlineKeyboardMarkup(keyboard))
-    else:
-        await update.message.reply_html(text, reply_markup=InlineKeyboardMarkup(keyboard))
-
-# --- هندلرها ---
-
-async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user_id = update.effective_user.id
-    cid = update.effective_chat.id
-    
-    if not await check_membership(user_id, context):
-        await send_join_request(update, context)
-        return
-
-    text = t("main_menu_text", cid)
-    keyboard = [
-        [InlineKeyboardButton(t("btn_prices", cid), callback_data="price_all")],
-        [InlineKeyboardButton(t("btn_alerts", cid), callback_data="alerts_menu"), InlineKeyboardButton(t("btn_groups", cid), callback_data="manage_groups")],
-        [InlineKeyboardButton(t("btn_help", cid), callback_data="help_menu"), InlineKeyboardButton(t("btn_lang", cid), callback_data="lang_menu")]
-    ]
-    
-    if user_id in USER_STATES: del USER_STATES[user_id]
-    
-    if update.callback_query:
-        await update.callback_query.edit_message_text(text, parse_mode="HTML", reply_markup=InlineKeyboardMarkup(keyboard))
-    else:
-        await update.message.reply_html(text, reply_markup=InlineKeyboardMarkup(keyboard))
-
-async def lang_menu_handler(update, context):
-    keyboard = [
-        [InlineKeyboardButton("🇺🇸 English", callback_data="set_lang_en")],
-        [InlineKeyboardButton("🇮🇷 فارسی", callback_data="set_lang_fa")],
-        [InlineKeyboardButton("🔙", callback_data="main_menu")]
-    ]
-    await update.callback_query.edit_message_text("Please select your language / لطفاً زبان را انتخاب کنید:", reply_markup=InlineKeyboardMarkup(keyboard))
-
-async def alerts_menu_handler(update, context):
-    cid = update.effective_chat.id
-    keyboard = [
-        [InlineKeyboardButton(t("btn_new_alert", cid), callback_data="alert_new")],
-        [InlineKeyboardButton(t("btn_my_alerts", cid), callback_data="alert_list")],
-        [InlineKeyboardButton(t("btn_back", cid), callback_data="main_menu")]
-    ]
-    await update.callback_query.edit_message_text(t("alert_menu_title", cid), parse_mode="HTML", reply_markup=InlineKeyboardMarkup(keyboard))
-
-async def alert_new_handler(update, context):
-    cid = update.effective_chat.id
-    keyboard = []
-    row = []
-    for code in KNOWN_ASSETS:
-        row.append(InlineKeyboardButton(code, callback_data=f"alert_sel_{code}"))
-        if len(row) == 2: keyboard.append(row); row = []
-    if row: keyboard.append(row)
-    keyboard.append([InlineKeyboardButton(t("btn_back", cid), callback_data="alerts_menu")])
-    await update.callback_query.edit_message_text(t("select_asset", cid), reply_markup=InlineKeyboardMarkup(keyboard))
-
-async def alert_list_handler(update, context):
-    user_id = update.effective_user.id
-    cid = update.effective_chat.id
-    alerts = get_user_alerts(user_id)
-    if not alerts:
-        await update.callback_query.edit_message_text(t("no_alerts", cid), reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton(t("btn_back", cid), callback_data="alerts_menu")]]))
-        return
-        
-    text = t("btn_my_alerts", cid) + ":\n\n"
-    keyboard = []
-    for aid, asset, target, cond in alerts:
-        icon = "📈" if cond == "ABOVE" else "📉"
-        text += f"{icon} <b>{asset}</b>: {target:,.2f}$\n"
-        keyboard.append([InlineKeyboardButton(f"🗑 {asset} {target}$", callback_data=f"alert_del_{aid}")])
-    keyboard.append([InlineKeyboardButton(t("btn_back", cid), callback_data="alerts_menu")])
-    await update.callback_query.edit_message_text(text, parse_mode="HTML", reply_markup=InlineKeyboardMarkup(keyboard))
-
-async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    query = update.callback_query
-    await query.answer()
-    data = query.data
-    user_id = query.from_user.id
-    cid = query.message.chat_id
-
-    # --- تنظیم زبان ---
-    if data.startswith("set_lang_"):
-        lang = data.split("_")[2]
-        set_chat_language(cid, lang)
-        await start_command(update, context)
-        return
-
-    if data == "lang_menu":
-        await lang_menu_handler(update, context)
-        return
-
-    # --- عضویت ---
-    if data == "verify_join":
-        is_member = await check_membership(user_id, context)
-        if is_member:
-            await query.answer(t("join_success", cid), show_alert=True)
-            await start_command(update, context)
-        else:
-            await query.answer(t("join_fail", cid), show_alert=True)
-        return
-
-    # چک برای سایر دکمه‌ها
-    if not await check_membership(user_id, context):
-        await send_join_request(update, context)
-        return
-
-    if data == "main_menu": await start_command(update, context)
-    elif data == "alerts_menu": await alerts_menu_handler(update, context)
-    elif data == "alert_new": await alert_new_handler(update, context)
-    elif data == "alert_list": await alert_list_handler(update, context)
-    
-    elif data == "price_all":
-        msg = format_price_message(LAST_PRICES, cid)
-        kb = [[InlineKeyboardButton("🔄", callback_data="price_all")], [InlineKeyboardButton(t("btn_back", cid), callback_data="main_menu")]]
-        try: await query.edit_message_text(msg, parse_mode="HTML", reply_markup=InlineKeyboardMarkup(kb))
-        except: pass
-
-    elif data == "help_menu":
-        txt = t("help_text", cid) 
-        await query.edit_message_text(txt, parse_mode="HTML", reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton(t("btn_back", cid), callback_data="main_menu")]]))
-
-    elif data.startswith("alert_sel_"):
-        asset = data.split("_")[2]
-        USER_STATES[user_id] = {"action": "WAIT_PRICE", "asset": asset}
-        msg = t("enter_price", cid).format(asset=asset)
-        await query.edit_message_text(msg, parse_mode="HTML", reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton(t("btn_cancel", cid), callback_data="alerts_menu")]]))
-
-    elif data.startswith("alert_del_"):
-        delete_alert(int(data.split("_")[2]))
-        await query.answer(t("alert_deleted", cid))
-        await alert_list_handler(update, context)
-
-    elif data == "manage_groups":
-        await show_groups_menu(update, context)
-
-    elif data.startswith("settings_"):
-        await show_chat_settings(update, context, int(data.split("_")[1]))
-
-    elif data.startswith("toggle_"):
-        _, group_id, asset = data.split("_")
-        group_id = int(group_id)
-        curr = get_chat_assets(group_id)
-        
-        if curr == "ALL": lst = list(KNOWN_ASSETS.keys()) 
-        elif curr == "": lst = []
-        else: lst = curr.split(",")
-            
-        if asset in lst: lst.remove(asset)
-        else: lst.append(asset)
-            
-        new_str = "ALL" if len(lst) == len(KNOWN_ASSETS) else ",".join(lst)
-        set_chat_assets(group_id, new_str)
-        await show_chat_settings(update, context, group_id)
-
-    elif data.startswith("set_"):
-        _, group_id, sec = data.split("_")
-        group_id = int(group_id)
-        sec = int(sec)
-        
-        for j in context.job_queue.get_jobs_by_name(str(group_id)): j.schedule_removal()
-        if sec > 0:
-            context.job_queue.run_repeating(post_prices_job, interval=sec, first=5, chat_id=group_id, name=str(group_id))
-            await query.answer(t("active", cid) + str(sec))
-        else:
-            await query.answer(t("off", cid))
-            
-        set_chat_interval(group_id, sec)
-        await show_chat_settings(update, context, group_id)
-
-async def handle_text(update, context):
-    user = update.effective_user
-    cid = update.effective_chat.id
-    
-    if not await check_membership(user.id, context):
-        await send_join_request(update, context)
-        return
-
-    state = USER_STATES.get(user.id)
-    if not state or state["action"] != "WAIT_PRICE": return
-    
-    try:
-        target = float(update.message.text.replace(",", ""))
-        asset = state["asset"]
-        curr = LAST_PRICES.get(asset, {}).get("price_num")
-        if not curr: 
-            await update.message.reply_text(t("price_na", cid))
-            return
-            
-        cond = "ABOVE" if target > curr else "BELOW"
-        add_alert(user.id, asset, target, cond)
-        del USER_STATES[user.id]
-        
-        cond_txt = t("cond_above", cid) if cond == "ABOVE" else t("cond_below", cid)
-        msg = t("alert_set", cid).format(asset=asset, cond=cond_txt, target=f"{target:,}")
-        
-        await update.message.reply_html(msg, reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton(t("btn_back", cid), callback_data="alerts_menu")]]))
-    except ValueError:
-        await update.message.reply_text("⚠️ Error: Please enter a valid number.")
-
-async def show_groups_menu(update, context):
-    cid = update.effective_chat.id
-    chats = get_user_chats(update.effective_user.id)
-    kb = []
-    for chat_id, title, _ in chats: kb.append([InlineKeyboardButton(title, callback_data=f"settings_{chat_id}")])
-    kb.append([InlineKeyboardButton(t("btn_back", cid), callback_data="main_menu")])
-    
-    msg = t("group_menu_title", cid) if chats else t("no_groups", cid)
-    if update.callback_query: await update.callback_query.edit_message_text(msg, reply_markup=InlineKeyboardMarkup(kb))
-
-async def show_chat_settings(update, context, chat_id):
-    user_cid = update.effective_chat.id 
-    assets = get_chat_assets(chat_id)
-    enabled = list(KNOWN_ASSETS.keys()) if assets == "ALL" else assets.split(",")
-    
-    chats = get_user_chats(update.effective_user.id)
-    curr_int = 0
-    title = "Group"
-    for c in chats:
-        if c[0] == chat_id:
-            curr_int = c[2]
-            title = c[1]
-            break
-            
-    def txt(sec, lbl): return f"✅ {lbl}" if curr_int == sec else lbl
-    
-    lbl_sec = t("sec", user_cid)
-    lbl_min = t("min", user_cid)
-    lbl_off = t("off", user_cid)
-    
-    kb = [
-        [InlineKeyboardButton(txt(30,f"30 {lbl_sec}"), callback_data=f"set_{chat_id}_30"), InlineKeyboardButton(txt(60,f"1 {lbl_min}"), callback_data=f"set_{chat_id}_60")],
-        [InlineKeyboardButton(txt(300,f"5 {lbl_min}"), callback_data=f"set_{chat_id}_300"), InlineKeyboardButton(txt(0,lbl_off), callback_data=f"set_{chat_id}_0")]
-    ]
-    
-    ab = []
-    for c in KNOWN_ASSETS:
-        s = "✅" if c in enabled else "❌"
-        ab.append(InlineKeyboardButton(f"{s} {c}", callback_data=f"toggle_{chat_id}_{c}"))
-    for i in range(0, len(ab), 2): kb.append(ab[i:i+2])
-    
-    kb.append([InlineKeyboardButton(t("btn_back", user_cid), callback_data="manage_groups")])
-    
-    msg = t("settings_title", user_cid).format(title=title)
-    
-    try:
-        await update.callback_query.edit_message_text(msg, parse_mode="HTML", reply_markup=InlineKeyboardMarkup(kb))
-    except TelegramError as e:
-        if "not modified" in str(e): await update.callback_query.answer("✅ Checked")
-
-async def calc_command(update, context):
-    cid = update.effective_chat.id
-    if not await check_membership(update.effective_user.id, context):
-        await send_join_request(update, context)
-        return
-
-    try:
-        amt, asset = float(context.args[0]), context.args[1].upper()
-        pr = LAST_PRICES.get(asset, {}).get("price_num")
-        if pr: await update.message.reply_html(f"🧮 {amt} {asset} = <b>${(amt*pr):,.2f}</b>")
-        else: await update.message.reply_text(t("price_na", cid))
-    except: await update.message.reply_text(t("calc_error", cid))
-
-# --- JOBS ---
-
-async def fetch_job(context):
-    prices = get_prices_from_file()
-    if not prices: return
-    
-    for aid, uid, asset, target, cond in get_all_alerts():
-        curr = prices.get(asset, {}).get("price_num")
-        if not curr: continue
-        
-        trig = False
-        if cond == "ABOVE" and curr >= target: trig = True
-        elif cond == "BELOW" and curr <= target: trig = True
-        
-        if trig:
-            cond_txt = t("cond_above", uid) if cond == "ABOVE" else t("cond_below", uid)
-            msg = t("alert_set", uid).format(asset=asset, cond=cond_txt, target=f"{target:,}")
-            msg = f"🚨 <b>ALARM:</b>\n" + msg + f"\nCurrent: {curr:,}"
-            
-            try: await context.bot.send_message(uid, msg, parse_mode="HTML"); delete_alert(aid)
-            except: pass
-
-async def post_prices_job(context):
-    cid = context.job.chat_id
-    assets = get_chat_assets(cid)
-    msg = format_price_message(LAST_PRICES, cid, assets)
-    
-    if LAST_SENT_MESSAGES.get(cid) == msg: return
-    try:
-        await context.bot.send_message(cid, msg, parse_mode="HTML")
-        LAST_SENT_MESSAGES[cid] = msg
-    except TelegramError as e:
-        if "kicked" in str(e) or "not found" in str(e):
-            remove_chat(cid)
-            context.job.schedule_removal()
-
-async def chat_member_handler(update, context):
-    m = update.my_chat_member
-    c = m.chat
-    if m.new_chat_member.status in [ChatMemberStatus.MEMBER, ChatMemberStatus.ADMINISTRATOR]:
-        add_or_update_chat(c.id, m.from_user.id, c.title or "Group")
-        set_chat_language(c.id, "fa")
-    elif m.new_chat_member.status == ChatMemberStatus.LEFT:
-        remove_chat(c.id)
-        for j in context.job_queue.get_jobs_by_name(str(c.id)): j.schedule_removal()
-
-def main():
-    initialize_db()
-    # استفاده از توکن خوانده شده از کانفیگ
-    app = Application.builder().token(settings.BOT_TOKEN).build()
-    
-    app.job_queue.run_repeating(fetch_job, interval=3, first=1)
-    
-    scheduled = get_all_scheduled_chats() 
-    for row in scheduled:
-        cid, inv = row[0], row[1]
-        if inv > 0: app.job_queue.run_repeating(post_prices_job, interval=inv, first=10, chat_id=cid, name=str(cid))
-    
-    app.add_handler(CommandHandler("start", start_command))
-    app.add_handler(CommandHandler("calc", calc_command))
-    app.add_handler(CallbackQueryHandler(button_callback))
-    app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_text))
-    app.add_handler(ChatMemberHandler(chat_member_handler))
-    
-    print("Bot Started (Bilingual & Secure)...")
-    app.run_polling()
-
-if __name__ == "__main__":
+from time import perf_counter
+STARTED = perf_counter()  # زمان‌سنجی راه‌اندازی از قبل از importهای سنگین
+
+import asyncio
+import io
+import time
+import logging
+from collections import Counter
+from pathlib import Path
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, InlineQueryResultArticle, InputTextMessageContent
+from telegram.ext import (
+    Application, CommandHandler, CallbackQueryHandler, MessageHandler, 
+    filters, ContextTypes, ChatMemberHandler, InlineQueryHandler
+)
+from telegram.constants import ChatMemberStatus
+from telegram.error import TelegramError, BadRequest, Forbidden
+
+# ایمپورت تنظیمات از فایل config.py
+from config import settings
+from price_source import create_price_source
+from converter import Converter, format_amount, format_price
+from assets import registry
+from state import StateStore, UserState
+from sender import SendScheduler, PRIORITY_ALERT, PRIORITY_INTERACTIVE, PRIORITY_POST
+from broadcast import Broadcaster
+from updates import OrderedUpdateProcessor
+import profiling
+from logsetup import setup_logging, fields
+from profiling import instrument, span, spanned
+
+# ایمپورت دیتابیس (لایه async روی ترد اختصاصی)
+from database import AsyncDatabase
+
+# --- تنظیمات ---
+# خواندن مقادیر حساس از فایل کانفیگ برای امنیت
+REQUIRED_CHANNEL = settings.CHANNEL_ID 
+PRICE_FILE = Path("prices.json") 
+PRICE_WATCH_INTERVAL = 1  # فقط یک stat ارزان؛ فایل فقط در صورت تغییر نسخه خوانده می‌شود
+STATE_FILE = Path("bot_state.json")
+STATE_SAVE_INTERVAL = 60
+# کش سمت تلگرام برای پاسخ‌های inline؛ هم‌اندازه فاصله انتشار اسنپ‌شات در scraper
+INLINE_CACHE_TIME = 5
+INLINE_MAX_RESULTS = 50
+
+logger = logging.getLogger(__name__)
+profiling.configure(settings.PROFILING_ENABLED, settings.SLOW_HANDLER_MS)
+STARTUP = profiling.PhaseTimer("bot", STARTED)
+STARTUP.mark("imports")
+
+# --- سیستم ترجمه (Localization) ---
+TRANS = {
+    "fa": {
+        "welcome": "👋 <b>به ربات قیمت خوش آمدید!</b>\n\nلطفاً زبان خود را انتخاب کنید:\nPlease select your language:",
+        "main_menu_text": "✅ <b>منوی اصلی</b>\n\nگزینه مورد نظر را انتخاب کنید:",
+        "btn_prices": "📊 مشاهده قیمت‌ها",
+        "btn_alerts": "🔔 مدیریت هشدارها",
+        "btn_groups": "⚙️ مدیریت گروه‌ها",
+        "btn_help": "❓ راهنما و آموزش",
+        "btn_lang": "🌍 تغییر زبان / Language",
+        "price_title": "📊 <b>قیمت‌های لحظه‌ای بازار:</b>\n",
+        "alert_menu_title": "🔔 <b>منوی هشدارها:</b>",
+        "btn_new_alert": "➕ ثبت هشدار جدید",
+        "btn_my_alerts": "📋 هشدارهای من",
+        "btn_back": "🔙 بازگشت",
+        "btn_cancel": "❌ انصراف",
+        "select_asset": "🎯 ارز مورد نظر را انتخاب کنید:",
+        "enter_price": "🎯 ارز: <b>{asset}</b>\n🔢 لطفاً قیمت هدف را (به عدد انگلیسی) تایپ کنید:\nمثال: 95000",
+        "alert_set": "✅ هشدار ثبت شد!\nهر وقت <b>{asset}</b> {cond} از <b>{target}</b> دلار شد خبرت می‌کنم.",
+        "cond_above": "بیشتر",
+        "cond_below": "کمتر",
+        "no_alerts": "📭 شما هشداری ندارید.",
+        "alert_deleted": "✅ هشدار حذف شد.",
+        "group_menu_title": "مدیریت گروه‌ها:",
+        "no_groups": "شما گروه فعالی ندارید. ربات را در گروه ادمین کنید.",
+        "settings_title": "⚙️ تنظیمات: <b>{title}</b>",
+        "policy_help": "\n\n📉 <b>آستانه ارسال:</b> فقط وقتی یکی از دارایی‌ها حداقل به این اندازه (درصد یا دلار) نسبت به آخرین پست تغییر کند، پست ارسال می‌شود.\n💓 <b>حداکثر سکوت:</b> بعد از این مدت در هر صورت یک پست ارسال می‌شود.",
+        "sec": "ثانیه",
+        "min": "دقیقه",
+        "off": "🔕 خاموش",
+        "active": "✅ فعال: ",
+        "live_ticker": "📌 تیکر زنده (ویرایش یک پیام)",
+        "calc_error": "⚠️ فرمت اشتباه.\nمثال: /calc 0.5 BTC یا /calc 0.5 BTC ETH",
+        "price_na": "⚠️ قیمت در دسترس نیست.",
+        "inline_all": "📊 همه قیمت‌ها",
+        "stale_note": "\n⏳ <i>آخرین به‌روزرسانی: {time} UTC</i>",
+        "join_msg": "⛔️ <b>عضویت اجباری</b>\n\nبرای استفاده از ربات باید عضو کانال ما باشید.",
+        "btn_join": "📢 عضویت در کانال",
+        "btn_verify": "✅ عضو شدم",
+        "join_success": "✅ عضویت تایید شد! خوش آمدید.",
+        "join_fail": "❌ هنوز عضو کانال نشده‌اید!",
+        "help_text": (
+            "📚 <b>راهنما و آموزش استفاده</b>\n\n"
+            "🤖 <b>چگونه ربات را به گروه/کانال اضافه کنیم؟</b>\n"
+            "1️⃣ وارد پروفایل ربات شوید و گزینه <i>Add to Group</i> را بزنید.\n"
+            "2️⃣ گروه یا کانال خود را انتخاب کنید.\n"
+            "3️⃣ <b>مهم:</b> بعد از افزودن، حتماً ربات را <b>Admin</b> کنید تا بتواند پیام بفرستد.\n\n"
+            "🧮 <b>ماشین حساب:</b>\n"
+            "دستور: <code>/calc [مقدار] [ارز] [ارز مقصد]</code>\n"
+            "مثال: <code>/calc 0.5 BTC</code> یا <code>/calc 0.5 BTC ETH</code>\n\n"
+            "🔔 <b>هشدار قیمت:</b>\n"
+            "از منوی اصلی دکمه «مدیریت هشدارها» را بزنید."
+        )
+    },
+    "en": {
+        "welcome": "👋 <b>Welcome to Crypto Price Bot!</b>\n\nPlease select your language:",
+        "main_menu_text": "✅ <b>Main Menu</b>\n\nSelect an option:",
+        "btn_prices": "📊 Live Prices",
+        "btn_alerts": "🔔 Price Alerts",
+        "btn_groups": "⚙️ Manage Groups",
+        "btn_help": "❓ Help & Tutorial",
+        "btn_lang": "🌍 Change Language",
+        "price_title": "📊 <b>Live Market Prices:</b>\n",
+        "alert_menu_title": "🔔 <b>Alerts Menu:</b>",
+        "btn_new_alert": "➕ New Alert",
+        "btn_my_alerts": "📋 My Alerts",
+        "btn_back": "🔙 Back",
+        "btn_cancel": "❌ Cancel",
+        "select_asset": "🎯 Select an asset:",
+        "enter_price": "🎯 Asset: <b>{asset}</b>\n🔢 Please type the target price (in numbers):\nExample: 95000",
+        "alert_set": "✅ Alert Set!\nI will notify you when <b>{asset}</b> goes {cond} <b>{target}</b> USD.",
+        "cond_above": "ABOVE",
+        "cond_below": "BELOW",
+        "no_alerts": "📭 You have no active alerts.",
+        "alert_deleted": "✅ Alert deleted.",
+        "group_menu_title": "Group Management:",
+        "no_groups": "No active groups found. Add & Admin the bot in a group first.",
+        "settings_title": "⚙️ Settings: <b>{title}</b>",
+        "policy_help": "\n\n📉 <b>Post threshold:</b> post only when an asset moved at least this much (percent or dollars) since the last post.\n💓 <b>Max silence:</b> post anyway after this long.",
+        "sec": "sec",
+        "min": "min",
+        "off": "🔕 Off",
+        "active": "✅ Active: ",
+        "live_ticker": "📌 Live ticker (edit one message)",
+        "calc_error": "⚠️ Invalid format.\nExample: /calc 0.5 BTC or /calc 0.5 BTC ETH",
+        "price_na": "⚠️ Price not available.",
+        "inline_all": "📊 All prices",
+        "stale_note": "\n⏳ <i>Last updated: {time} UTC</i>",
+        "join_msg": "⛔️ <b>Action Required</b>\n\nYou must join our channel to use this bot.",
+        "btn_join": "📢 Join Channel",
+        "btn_verify": "✅ I have joined",
+        "join_success": "✅ Verified! Welcome.",
+        "join_fail": "❌ You haven't joined yet!",
+        "help_text": (
+            "📚 <b>Help & Tutorial</b>\n\n"
+            "🤖 <b>How to add bot to Group/Channel?</b>\n"
+            "1️⃣ Go to bot profile and click <i>Add to Group</i>.\n"
+            "2️⃣ Select your group or channel.\n"
+            "3️⃣ <b>IMPORTANT:</b> You MUST promote the bot to <b>Admin</b> so it can send messages.\n\n"
+            "🧮 <b>Calculator:</b>\n"
+            "Cmd: <code>/calc [amount] [asset] [to]</code>\n"
+            "Ex: <code>/calc 0.5 BTC</code> or <code>/calc 0.5 BTC ETH</code>\n\n"
+            "🔔 <b>Price Alerts:</b>\n"
+            "Use the 'Price Alerts' button in the main menu."
+        )
+    }
+}
+
+# --- حافظه موقت ---
+# قیمت‌ها به تعداد دارایی‌ها محدودند؛ وضعیت کاربران و پیام‌های ارسالی در STATE با سقف و TTL نگه‌داری می‌شوند
+LAST_PRICES = {}
+PREVIOUS_PRICES = {}
+STATE = StateStore(STATE_FILE)
+# شمارنده فراخوانی‌های ارسال خودکار به گروه‌ها: sent / edited / skipped / below_threshold
+FANOUT_STATS = Counter()
+# گروه‌هایی که طبق آخرین اسنپ‌شات به آستانه تغییر خود رسیده‌اند (یک بار برای هر اسنپ‌شات محاسبه می‌شود)
+DUE_CHATS = set()
+# کارت‌های inline هر زبان برای اسنپ‌شات فعلی: (نسخه، قدیمی بودن) و {زبان: (کارت همه قیمت‌ها، {کد: کارت})}
+INLINE_KEY = None
+INLINE_RESULTS = {}
+# تمام فراخوانی‌های خروجی از این زمان‌بند عبور می‌کنند
+SENDER = SendScheduler()
+db = AsyncDatabase()
+# ارسال همگانی ادمین؛ cursor و پیشرفت در دیتابیس ذخیره می‌شود
+BROADCASTER = Broadcaster(db, SENDER)
+# آپدیت‌ها هم‌زمان پردازش می‌شوند ولی برای هر کاربر و هر چت به ترتیب
+UPDATES = OrderedUpdateProcessor(SENDER)
+# فایل محلی یا Price API (PRICE_SOURCE)؛ هر دو فقط نسخه‌های جدید را برمی‌گردانند
+price_watcher = create_price_source(settings, PRICE_FILE)
+converter = Converter(settings.QUOTE_CURRENCIES)
+
+# تعداد دکمه‌های دارایی در هر صفحه کیبورد (لیست دارایی‌ها از assets.json خوانده می‌شود)
+ASSET_PAGE_SIZE = 10
+# گزینه‌های سیاست ارسال در تنظیمات گروه: آستانه درصد، آستانه دلار و حداکثر سکوت (ثانیه)
+POLICY_OPTIONS = {
+    "pct": (0, 0.1, 0.5, 1),
+    "usd": (0, 1, 10, 100),
+    "hb": (0, 900, 1800, 3600),
+}
+
+# --- توابع کمکی ---
+def reply(update, *args, **kwargs):
+    """پاسخ تعاملی (ویرایش پیام دکمه یا پاسخ به پیام متنی) با اولویت میانی از طریق زمان‌بند خروجی"""
+    func = update.callback_query.edit_message_text if update.callback_query else update.message.reply_text
+    return SENDER.submit(PRIORITY_INTERACTIVE, update.effective_chat.id, func, *args, **kwargs)
+
+def answer(query, *args, **kwargs):
+    """پاسخ به callback یا inline query از طریق زمان‌بند؛ پیام چت نیست و محدودیت هر چت را مصرف نمی‌کند."""
+    return SENDER.submit(PRIORITY_INTERACTIVE, None, query.answer, *args, **kwargs)
+
+def asset_keyboard(codes, page, button, nav):
+    """دکمه‌های یک صفحه از دارایی‌ها در ردیف‌های دوتایی به همراه ردیف ◀️/▶️"""
+    codes, page, pages = registry.page(codes, page, ASSET_PAGE_SIZE)
+    buttons = [button(c) for c in codes]
+    kb = [buttons[i:i+2] for i in range(0, len(buttons), 2)]
+    if pages > 1:
+        row = []
+        if page > 0: row.append(InlineKeyboardButton("◀️", callback_data=nav(page - 1)))
+        row.append(InlineKeyboardButton(f"{page + 1}/{pages}", callback_data="noop"))
+        if page < pages - 1: row.append(InlineKeyboardButton("▶️", callback_data=nav(page + 1)))
+        kb.append(row)
+    return kb
+
+def t(key, chat_id):
+    """تابع ترجمه سریع"""
+    lang = db.get_chat_language(chat_id)
+    return TRANS.get(lang, TRANS["fa"]).get(key, key)
+
+def build_menus(lang):
+    """کیبوردهای ثابت یک زبان؛ یک بار ساخته می‌شوند و بین همه پاسخ‌ها مشترک‌اند (InlineKeyboardMarkup تغییرناپذیر است)."""
+    tr = TRANS[lang]
+    codes = list(registry)
+    pages = registry.page(codes, 0, ASSET_PAGE_SIZE)[2]
+    back_to_alerts = [InlineKeyboardButton(tr["btn_back"], callback_data="alerts_menu")]
+    return {
+        "main": InlineKeyboardMarkup([
+            [InlineKeyboardButton(tr["btn_prices"], callback_data="price_all")],
+            [InlineKeyboardButton(tr["btn_alerts"], callback_data="alerts_menu"), InlineKeyboardButton(tr["btn_groups"], callback_data="manage_groups")],
+            [InlineKeyboardButton(tr["btn_help"], callback_data="help_menu"), InlineKeyboardButton(tr["btn_lang"], callback_data="lang_menu")]
+        ]),
+        "alerts": InlineKeyboardMarkup([
+            [InlineKeyboardButton(tr["btn_new_alert"], callback_data="alert_new")],
+            [InlineKeyboardButton(tr["btn_my_alerts"], callback_data="alert_list")],
+            [InlineKeyboardButton(tr["btn_back"], callback_data="main_menu")]
+        ]),
+        "alert_pages": [
+            InlineKeyboardMarkup(asset_keyboard(codes, page,
+                                                lambda c: InlineKeyboardButton(c, callback_data=f"alert_sel_{c}"),
+                                                lambda p: f"alert_page_{p}") + [back_to_alerts])
+            for page in range(pages)
+        ],
+    }
+
+LANG_MENU = InlineKeyboardMarkup([
+    [InlineKeyboardButton("🇺🇸 English", callback_data="set_lang_en")],
+    [InlineKeyboardButton("🇮🇷 فارسی", callback_data="set_lang_fa")],
+    [InlineKeyboardButton("🔙", callback_data="main_menu")]
+])
+MENUS = {lang: build_menus(lang) for lang in TRANS}
+
+def menus(chat_id):
+    return MENUS.get(db.get_chat_language(chat_id), MENUS["fa"])
+
+def get_prices_from_file():
+    """فقط در صورت انتشار نسخه جدید اسنپ‌شات، قیمت‌های جدید را برمی‌گرداند."""
+    global LAST_PRICES, PREVIOUS_PRICES
+    try:
+        snapshot = price_watcher.poll()
+        if snapshot is None: return {}
+        new_prices = snapshot["prices"]
+        
+        if LAST_PRICES:
+            temp_prev = {}
+            for k, v in LAST_PRICES.items():
+                if v.price_num: temp_prev[k] = v.price_num
+            PREVIOUS_PRICES.update(temp_prev)
+            
+        LAST_PRICES = new_prices
+        return new_prices
+    except Exception as e:
+        logger.error("Error reading prices", extra=fields(error=e))
+        return {}
+
+def calculate_trend(asset, current_price):
+    prev = PREVIOUS_PRICES.get(asset)
+    if prev is None: return ""
+    if current_price > prev: return "🟢"
+    elif current_price < prev: return "🔴"
+    return "⚪️"
+
+@spanned("render")
+def format_price_message(prices, chat_id, enabled_assets_str="ALL"):
+    tr = TRANS.get(db.get_chat_language(chat_id), TRANS["fa"])
+    return render_prices(prices, tr, registry.resolve(enabled_assets_str))
+
+def render_prices(prices, tr, codes):
+    """متن قیمت‌های codes با ترجمه‌های tr (یک زبان از TRANS)"""
+    if not prices: return tr["price_na"]
+    
+    lines = [tr["price_title"]]
+    has_data = False
+    
+    for code in codes:
+        entry = prices.get(code)
+        if entry and entry.price:
+            name = registry.name(code)
+            trend = calculate_trend(code, entry.price_num)
+            lines.append(f"{trend} <b>{name}</b>: <code>{entry.price}</code>")
+            has_data = True
+    
+    # اسنپ‌شات قدیمی (مثلاً بازیابی شده بعد از ری‌استارت یا توقف اسکرپر) با زمان آن مشخص می‌شود
+    if has_data and price_watcher.is_stale():
+        lines.append(tr["stale_note"].format(time=price_watcher.snapshot["ts"][11:16]))
+            
+    return "\n".join(lines) if has_data else "No assets selected."
+
+def build_inline_results(prices):
+    """کارت قیمت هر دارایی و کارت همه قیمت‌ها برای تمام زبان‌ها؛ یک بار به ازای هر اسنپ‌شات ساخته می‌شوند."""
+    results = {}
+    # شناسه نتایج با revision ساخته می‌شود؛ نسخه فایل بعد از ری‌ست یا در فایل‌های قدیمی (0) تکرار می‌شود
+    revision = price_watcher.revision
+    for lang, tr in TRANS.items():
+        cards = {}
+        for code in registry:
+            entry = prices.get(code)
+            if not entry or not entry.price: continue
+            trend = calculate_trend(code, entry.price_num)
+            cards[code] = InlineQueryResultArticle(
+                id=f"{revision}:{code}", title=f"{registry.name(code)} ({code})", description=f"{trend} {entry.price}".strip(),
+                input_message_content=InputTextMessageContent(render_prices(prices, tr, [code]), parse_mode="HTML"))
+        everything = InlineQueryResultArticle(
+            id=f"{revision}:ALL", title=tr["inline_all"], description=", ".join(c for c in registry.defaults if c in cards),
+            input_message_content=InputTextMessageContent(render_prices(prices, tr, registry.defaults), parse_mode="HTML"))
+        results[lang] = (everything, cards)
+    return results
+
+def inline_results(lang):
+    global INLINE_KEY, INLINE_RESULTS
+    key = (price_watcher.revision, price_watcher.is_stale())
+    if key != INLINE_KEY:
+        INLINE_RESULTS = build_inline_results(LAST_PRICES) if LAST_PRICES else {}
+        INLINE_KEY = key
+    return INLINE_RESULTS.get(lang) or INLINE_RESULTS.get("fa")
+
+async def check_membership(user_id: int, context: ContextTypes.DEFAULT_TYPE) -> bool:
+    if not REQUIRED_CHANNEL or REQUIRED_CHANNEL == "@YourChannelName": return True
+    # فقط نتیجه مثبت کش می‌شود تا دکمه «عضو شدم» بلافاصله کار کند
+    if user_id in STATE.members: return True
+    try:
+        with span("telegram"):
+            member = await context.bot.get_chat_member(chat_id=REQUIRED_CHANNEL, user_id=user_id)
+        if member.status in [ChatMemberStatus.LEFT, ChatMemberStatus.BANNED]: return False
+        STATE.members.set(user_id, True)
+        return True
+    except: return True 
+
+async def send_join_request(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    cid = update.effective_chat.id
+    channel_url = f"https://t.me/{REQUIRED_CHANNEL.replace('@', '')}"
+    
+    text = t("join_msg", cid)
+    keyboard = [
+        [InlineKeyboardButton(t("btn_join", cid), url=channel_url)],
+        [InlineKeyboardButton(t("btn_verify", cid), callback_data="verify_join")]
+    ]
+    
+    await reply(update, text, parse_mode="HTML", reply_markup=InlineKeyboardMarkup(keyboard))
+
+# --- هندلرها ---
+
+@instrument
+async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.effective_user.id
+    cid = update.effective_chat.id
+    
+    if not await check_membership(user_id, context):
+        await send_join_request(update, context)
+        return
+
+    STATE.user_states.pop(user_id)
+    
+    await reply(update, t("main_menu_text", cid), parse_mode="HTML", reply_markup=menus(cid)["main"])
+
+async def lang_menu_handler(update, context):
+    await reply(update, "Please select your language / لطفاً زبان را انتخاب کنید:", reply_markup=LANG_MENU)
+
+async def alerts_menu_handler(update, context):
+    cid = update.effective_chat.id
+    await reply(update, t("alert_menu_title", cid), parse_mode="HTML", reply_markup=menus(cid)["alerts"])
+
+async def alert_new_handler(update, context, page=0):
+    cid = update.effective_chat.id
+    pages = menus(cid)["alert_pages"]
+    await reply(update, t("select_asset", cid), reply_markup=pages[min(max(page, 0), len(pages) - 1)])
+
+async def alert_list_handler(update, context):
+    user_id = update.effective_user.id
+    cid = update.effective_chat.id
+    alerts = await db.get_user_alerts(user_id)
+    if not alerts:
+        await reply(update, t("no_alerts", cid), reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton(t("btn_back", cid), callback_data="alerts_menu")]]))
+        return
+        
+    text = t("btn_my_alerts", cid) + ":\n\n"
+    keyboard = []
+    for aid, asset, target, cond in alerts:
+        icon = "📈" if cond == "ABOVE" else "📉"
+        text += f"{icon} <b>{asset}</b>: {format_price(target)}$\n"
+        keyboard.append([InlineKeyboardButton(f"🗑 {asset} {format_price(target)}$", callback_data=f"alert_del_{aid}")])
+    keyboard.append([InlineKeyboardButton(t("btn_back", cid), callback_data="alerts_menu")])
+    await reply(update, text, parse_mode="HTML", reply_markup=InlineKeyboardMarkup(keyboard))
+
+@instrument
+async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await answer(query)
+    data = query.data
+    user_id = query.from_user.id
+    cid = query.message.chat_id
+
+    # --- تنظیم زبان ---
+    if data.startswith("set_lang_"):
+        lang = data.split("_")[2]
+        db.set_chat_language(cid, lang)
+        await start_command(update, context)
+        return
+
+    if data == "lang_menu":
+        await lang_menu_handler(update, context)
+        return
+
+    # --- عضویت ---
+    if data == "verify_join":
+        is_member = await check_membership(user_id, context)
+        if is_member:
+            await answer(query, t("join_success", cid), show_alert=True)
+            await start_command(update, context)
+        else:
+            await answer(query, t("join_fail", cid), show_alert=True)
+        return
+
+    # چک برای سایر دکمه‌ها
+    if not await check_membership(user_id, context):
+        await send_join_request(update, context)
+        return
+
+    if data == "main_menu": await start_command(update, context)
+    elif data == "alerts_menu": await alerts_menu_handler(update, context)
+    elif data == "alert_new": await alert_new_handler(update, context)
+    elif data.startswith("alert_page_"): await alert_new_handler(update, context, int(data.split("_")[2]))
+    elif data == "alert_list": await alert_list_handler(update, context)
+    
+    elif data == "price_all":
+        msg = format_price_message(LAST_PRICES, cid)
+        kb = [[InlineKeyboardButton("🔄", callback_data="price_all")], [InlineKeyboardButton(t("btn_back", cid), callback_data="main_menu")]]
+        try: await reply(update, msg, parse_mode="HTML", reply_markup=InlineKeyboardMarkup(kb))
+        except: pass
+
+    elif data == "help_menu":
+        txt = t("help_text", cid) 
+        await reply(update, txt, parse_mode="HTML", reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton(t("btn_back", cid), callback_data="main_menu")]]))
+
+    elif data.startswith("alert_sel_"):
+        asset = data.split("_")[2]
+        if asset not in registry: return
+        # دارایی‌هایی که هشدار دارند در اسکرپر فعال می‌شوند
+        db.touch_asset_demand(asset)
+        STATE.user_states.set(user_id, UserState("WAIT_PRICE", asset))
+        msg = t("enter_price", cid).format(asset=asset)
+        await reply(update, msg, parse_mode="HTML", reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton(t("btn_cancel", cid), callback_data="alerts_menu")]]))
+
+    elif data.startswith("alert_del_"):
+        await db.delete_alert(int(data.split("_")[2]))
+        await answer(query, t("alert_deleted", cid))
+        await alert_list_handler(update, context)
+
+    elif data == "manage_groups":
+        await show_groups_menu(update, context)
+
+    elif data.startswith("settings_"):
+        parts = data.split("_")
+        page = int(parts[2]) if len(parts) > 2 else 0
+        await show_chat_settings(update, context, int(parts[1]), page)
+
+    elif data.startswith("toggle_"):
+        # دکمه‌های پیام‌های قبل از صفحه‌بندی toggle_{gid}_{asset} هستند و به صفحه اول برمی‌گردند
+        parts = data.split("_")
+        group_id, asset = int(parts[1]), parts[2]
+        page = int(parts[3]) if len(parts) > 3 else 0
+        if asset not in registry: return
+        curr = await db.get_chat_assets(group_id)
+        
+        lst = list(registry.resolve(curr))
+            
+        if asset in lst: lst.remove(asset)
+        else: lst.append(asset)
+            
+        new_str = "ALL" if set(lst) == set(registry.defaults) else ",".join(registry.sort(lst))
+        db.set_chat_assets(group_id, new_str)
+        await show_chat_settings(update, context, group_id, page)
+
+    elif data.startswith("live_"):
+        group_id = int(data.split("_")[1])
+        _, live, _ = await db.get_chat_post_settings(group_id)
+        await db.set_chat_live_ticker(group_id, not live)
+        await show_chat_settings(update, context, group_id)
+
+    elif data.startswith("pol_"):
+        _, group_id, field, value = data.split("_")
+        group_id = int(group_id)
+        if field not in POLICY_OPTIONS: return
+        _, _, policy = await db.get_chat_post_settings(group_id)
+        policy = list(policy)
+        policy[list(POLICY_OPTIONS).index(field)] = float(value) if field != "hb" else int(value)
+        await db.set_chat_post_policy(group_id, *policy)
+        await show_chat_settings(update, context, group_id)
+
+    elif data.startswith("set_"):
+        _, group_id, sec = data.split("_")
+        group_id = int(group_id)
+        sec = int(sec)
+        
+        for j in context.job_queue.get_jobs_by_name(str(group_id)): j.schedule_removal()
+        if sec > 0:
+            context.job_queue.run_repeating(post_prices_job, interval=sec, first=5, chat_id=group_id, name=str(group_id))
+            await answer(query, t("active", cid) + str(sec))
+        else:
+            await answer(query, t("off", cid))
+            
+        await db.set_chat_interval(group_id, sec)
+        await show_chat_settings(update, context, group_id)
+
+@instrument
+async def handle_text(update, context):
+    user = update.effective_user
+    cid = update.effective_chat.id
+    
+    if not await check_membership(user.id, context):
+        await send_join_request(update, context)
+        return
+
+    state = STATE.user_states.get(user.id)
+    if not state or state.action != "WAIT_PRICE": return
+    
+    try:
+        target = float(update.message.text.replace(",", ""))
+        asset = state.asset
+        entry = LAST_PRICES.get(asset)
+        curr = entry and entry.price_num
+        if not curr: 
+            await reply(update, t("price_na", cid))
+            return
+            
+        cond = "ABOVE" if target > curr else "BELOW"
+        await db.add_alert(user.id, asset, target, cond)
+        STATE.user_states.pop(user.id)
+        
+        cond_txt = t("cond_above", cid) if cond == "ABOVE" else t("cond_below", cid)
+        msg = t("alert_set", cid).format(asset=asset, cond=cond_txt, target=format_price(target))
+        
+        await reply(update, msg, parse_mode="HTML", reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton(t("btn_back", cid), callback_data="alerts_menu")]]))
+    except ValueError:
+        await reply(update, "⚠️ Error: Please enter a valid number.")
+
+async def show_groups_menu(update, context):
+    cid = update.effective_chat.id
+    chats = await db.get_user_chats(update.effective_user.id)
+    kb = []
+    for chat_id, title, _ in chats: kb.append([InlineKeyboardButton(title, callback_data=f"settings_{chat_id}")])
+    kb.append([InlineKeyboardButton(t("btn_back", cid), callback_data="main_menu")])
+    
+    msg = t("group_menu_title", cid) if chats else t("no_groups", cid)
+    if update.callback_query: await reply(update, msg, reply_markup=InlineKeyboardMarkup(kb))
+
+async def show_chat_settings(update, context, chat_id, page=0):
+    user_cid = update.effective_chat.id 
+    assets, live, policy = await db.get_chat_post_settings(chat_id)
+    enabled = set(registry.resolve(assets))
+    
+    chats = await db.get_user_chats(update.effective_user.id)
+    curr_int = 0
+    title = "Group"
+    for c in chats:
+        if c[0] == chat_id:
+            curr_int = c[2]
+            title = c[1]
+            break
+            
+    def txt(sec, lbl): return f"✅ {lbl}" if curr_int == sec else lbl
+    
+    lbl_sec = t("sec", user_cid)
+    lbl_min = t("min", user_cid)
+    lbl_off = t("off", user_cid)
+    
+    kb = [
+        [InlineKeyboardButton(txt(30,f"30 {lbl_sec}"), callback_data=f"set_{chat_id}_30"), InlineKeyboardButton(txt(60,f"1 {lbl_min}"), callback_data=f"set_{chat_id}_60")],
+        [InlineKeyboardButton(txt(300,f"5 {lbl_min}"), callback_data=f"set_{chat_id}_300"), InlineKeyboardButton(txt(0,lbl_off), callback_data=f"set_{chat_id}_0")]
+    ]
+    
+    kb += asset_keyboard(list(registry), page,
+                         lambda c: InlineKeyboardButton(f"{'✅' if c in enabled else '❌'} {c}", callback_data=f"toggle_{chat_id}_{c}_{page}"),
+                         lambda p: f"settings_{chat_id}_{p}")
+    
+    kb.append([InlineKeyboardButton(f"{'✅' if live else '❌'} {t('live_ticker', user_cid)}", callback_data=f"live_{chat_id}")])
+    
+    labels = {
+        "pct": lambda v: f"Δ {v:g}%",
+        "usd": lambda v: f"Δ ${v:g}",
+        "hb": lambda v: f"💓 {v // 60} {lbl_min}" if v else "💓 —",
+    }
+    for field, current in zip(POLICY_OPTIONS, policy):
+        kb.append([InlineKeyboardButton(f"✅ {labels[field](v)}" if v == current else labels[field](v), callback_data=f"pol_{chat_id}_{field}_{v}")
+                   for v in POLICY_OPTIONS[field]])
+    kb.append([InlineKeyboardButton(t("btn_back", user_cid), callback_data="manage_groups")])
+    
+    msg = t("settings_title", user_cid).format(title=title) + t("policy_help", user_cid)
+    
+    try:
+        await reply(update, msg, parse_mode="HTML", reply_markup=InlineKeyboardMarkup(kb))
+    except TelegramError as e:
+        if "not modified" in str(e): await answer(update.callback_query, "✅ Checked")
+
+@instrument
+async def calc_command(update, context):
+    cid = update.effective_chat.id
+    if not await check_membership(update.effective_user.id, context):
+        await send_join_request(update, context)
+        return
+
+    try:
+        amt, asset = float(context.args[0]), context.args[1].upper()
+        target = context.args[2].upper() if len(context.args) > 2 else "USD"
+    except (IndexError, ValueError):
+        await reply(update, t("calc_error", cid))
+        return
+
+    # ماتریس نرخ فقط با تغییر نسخه اسنپ‌شات دوباره ساخته می‌شود
+    result = converter.matrix(price_watcher.revision, LAST_PRICES).convert(amt, asset, target)
+    if result is None:
+        # دارایی معتبر ولی غیرفعال از تیک بعدی اسکرپر قیمت خواهد داشت
+        for code in (asset, target):
+            if code in registry and code not in LAST_PRICES: db.touch_asset_demand(code)
+        await reply(update, t("price_na", cid))
+    elif target == "USD": await reply(update, f"🧮 {amt} {asset} = <b>${format_price(result)}</b>", parse_mode="HTML")
+    else: await reply(update, f"🧮 {amt} {asset} = <b>{format_amount(result)} {target}</b>", parse_mode="HTML")
+
+async def profile_command(update, context):
+    """/profile [ثانیه] — پروفایل cProfile و tracemalloc برای یک بازه کوتاه (فقط ادمین‌ها)"""
+    if update.effective_user.id not in settings.ADMIN_IDS: return
+    try: seconds = min(max(float(context.args[0]), 1), 120) if context.args else 10
+    except ValueError: seconds = 10
+
+    await reply(update, f"⏱ Profiling for {seconds:g}s...")
+    try: report = await profiling.profile_for(seconds)
+    except RuntimeError as e:
+        await reply(update, f"⚠️ {e}")
+        return
+    await SENDER.submit(PRIORITY_INTERACTIVE, update.effective_chat.id, update.message.reply_document,
+                        document=io.BytesIO(report.encode("utf-8")), filename="profile.txt")
+
+@instrument
+async def inline_query_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    @bot btc — کارت قیمت دارایی‌ها در هر چتی.
+    پاسخ‌ها از کارت‌های از پیش ساخته شده اسنپ‌شات فعلی برمی‌گردند؛ هیچ کار دیتابیس یا فایلی انجام نمی‌شود.
+    """
+    query = update.inline_query
+    cached = inline_results(db.get_chat_language(query.from_user.id))
+    if cached is None:
+        results = []
+    else:
+        everything, cards = cached
+        text = query.query.strip().upper()
+        if not text:
+            results = [everything] + [cards[c] for c in registry.defaults if c in cards]
+        else:
+            results = [card for code, card in cards.items() if code.startswith(text) or text in registry.name(code).upper()]
+    # قیمت‌ها برای همه کاربران یک زبان یکسان‌اند ولی زبان هر کاربر فرق دارد، پس کش تلگرام شخصی است
+    await answer(query, results[:INLINE_MAX_RESULTS], cache_time=INLINE_CACHE_TIME, is_personal=True)
+
+async def broadcast_command(update, context):
+    """
+    /broadcast متن — ارسال به تمام چت‌ها و صاحبان هشدار (فقط ادمین‌ها)
+    /broadcast بدون متن وضعیت فعلی را نشان می‌دهد و /broadcast cancel آن را متوقف می‌کند.
+    """
+    if update.effective_user.id not in settings.ADMIN_IDS: return
+    parts = update.message.text.split(None, 1)
+    text = parts[1].strip() if len(parts) > 1 else ""
+
+    if text.lower() == "cancel":
+        cancelled = await BROADCASTER.cancel()
+        await reply(update, "🛑 Broadcast cancelled." if cancelled else "No broadcast is running.")
+    elif not text:
+        running = BROADCASTER.running
+        await reply(update, BROADCASTER.progress.format("running" if running else "finished") if BROADCASTER.progress
+                    else "No broadcast has run since startup.\nUsage: /broadcast <text>")
+    elif BROADCASTER.running:
+        await reply(update, f"⚠️ Broadcast #{BROADCASTER.progress.id} is still running; /broadcast cancel to stop it.")
+    else:
+        await BROADCASTER.start(context.bot, update.effective_user.id, text)
+
+def unschedule_chats(job_queue, chat_ids):
+    # job ارسال خودکار چت‌های حذف شده هم برداشته می‌شود
+    for cid in chat_ids:
+        for j in job_queue.get_jobs_by_name(str(cid)): j.schedule_removal()
+
+async def resume_broadcast(context):
+    await BROADCASTER.resume(context.bot)
+
+# --- JOBS ---
+
+def evaluate_alerts(alerts, prices):
+    """هشدارهایی که شرطشان برقرار شده را به همراه قیمت فعلی برمی‌گرداند."""
+    triggered = []
+    for aid, uid, asset, target, cond in alerts:
+        entry = prices.get(asset)
+        if not entry or not entry.price_num: continue
+        curr = entry.price_num
+        
+        if (cond == "ABOVE" and curr >= target) or (cond == "BELOW" and curr <= target):
+            triggered.append((aid, uid, asset, target, cond, curr))
+    return triggered
+
+def threshold_reached(reference, prices, codes, pct, usd) -> bool:
+    """آیا حداقل یکی از دارایی‌ها نسبت به قیمت‌های مبنا به اندازه آستانه درصد یا دلار تغییر کرده است؟"""
+    if reference is None: return True
+    for code in codes:
+        entry = prices.get(code)
+        if not entry or not entry.price_num: continue
+        curr = entry.price_num
+        old = reference.get(code)
+        if not old: return True  # دارایی جدیدی که در پست قبلی نبود
+        diff = abs(curr - old)
+        if (usd and diff >= usd) or (pct and diff * 100 >= pct * old): return True
+    return False
+
+def evaluate_post_policies(policies, prices):
+    """
+    برای تمام گروه‌های دارای آستانه، یک بار به ازای هر اسنپ‌شات، گروه‌هایی را که باید پست بگیرند برمی‌گرداند.
+    گروه‌هایی که نسخه مبنا، دارایی‌ها و آستانه یکسان دارند فقط یک بار محاسبه می‌شوند.
+    """
+    due = set()
+    memo = {}
+    for cid, assets, pct, usd in policies:
+        last = STATE.sent.get(cid)
+        if last is None: continue  # گروهی که هنوز پستی نگرفته بدون شرط ارسال می‌شود
+        key = (last.version, assets, pct, usd)
+        reached = memo.get(key)
+        if reached is None:
+            reached = memo[key] = threshold_reached(STATE.references.get(last.version), prices, registry.resolve(assets), pct, usd)
+        if reached: due.add(cid)
+    return due
+
+@instrument
+async def fetch_job(context):
+    global DUE_CHATS
+    # فقط یک بار به ازای هر اسنپ‌شات جدید اجرا می‌شود
+    prices = get_prices_from_file()
+    if not prices: return
+    
+    DUE_CHATS = evaluate_post_policies(await db.get_post_policies(), prices)
+    
+    sends = []
+    for aid, uid, asset, target, cond, curr in evaluate_alerts(await db.get_all_alerts(), prices):
+        cond_txt = t("cond_above", uid) if cond == "ABOVE" else t("cond_below", uid)
+        msg = t("alert_set", uid).format(asset=asset, cond=cond_txt, target=format_price(target))
+        msg = f"🚨 <b>ALARM:</b>\n" + msg + f"\nCurrent: {format_price(curr)}"
+        
+        sends.append(send_alert(context, aid, uid, msg))
+    
+    # هشدارها با بالاترین اولویت و به صورت موازی در صف ارسال قرار می‌گیرند
+    if sends: await asyncio.gather(*sends)
+
+async def send_alert(context, aid, uid, msg):
+    try:
+        await SENDER.submit(PRIORITY_ALERT, uid, context.bot.send_message, uid, msg, parse_mode="HTML")
+        await db.delete_alert(aid)
+    except Forbidden:
+        # کاربر ربات را بلاک کرده است؛ هشدار دیگر قابل تحویل نیست
+        await db.delete_alert(aid)
+    except TelegramError as e:
+        logger.warning("Alert not delivered", extra=fields(alert=aid, user=uid, error=e))
+
+@instrument
+async def post_prices_job(context):
+    cid = context.job.chat_id
+    assets, live, (pct, usd, max_silence) = await db.get_chat_post_settings(cid)
+    last = STATE.sent.get(cid)
+    heartbeat = False
+    
+    # با وجود آستانه، فقط گروه‌های رسیده به آستانه یا گروه‌هایی که حداکثر سکوتشان گذشته پست می‌گیرند
+    if (pct or usd) and last and cid not in DUE_CHATS:
+        if not max_silence or time.time() - (last.posted_at or 0) < max_silence:
+            FANOUT_STATS["below_threshold"] += 1
+            return
+        # پست حداکثر سکوت حتی با متن تکراری ارسال می‌شود
+        heartbeat = True
+    
+    # اسنپ‌شات در طول انتظار برای ارسال ممکن است عوض شود؛ مبنای آستانه همین نسخه است
+    prices, version = LAST_PRICES, price_watcher.version
+    msg = format_price_message(prices, cid, assets)
+    
+    if not heartbeat and STATE.is_duplicate(cid, msg):
+        FANOUT_STATS["skipped"] += 1
+        return
+    try:
+        # در حالت تیکر زنده همان پیام قبلی ویرایش می‌شود
+        if live and last and last.message_id:
+            try:
+                await SENDER.submit(PRIORITY_POST, cid, context.bot.edit_message_text, msg, chat_id=cid, message_id=last.message_id, parse_mode="HTML")
+                STATE.mark_sent(cid, msg, last.message_id, version, prices)
+                DUE_CHATS.discard(cid)
+                FANOUT_STATS["edited"] += 1
+                return
+            except BadRequest as e:
+                if "not modified" in str(e):
+                    STATE.mark_sent(cid, msg, last.message_id, version, prices)
+                    FANOUT_STATS["skipped"] += 1
+                    return
+                # پیام قبلی حذف شده یا قابل ویرایش نیست؛ پیام جدید ارسال می‌شود
+                logger.info("Live ticker lost, sending a new message", extra=fields(chat=cid, error=e))
+
+        sent = await SENDER.submit(PRIORITY_POST, cid, context.bot.send_message, cid, msg, parse_mode="HTML")
+        STATE.mark_sent(cid, msg, sent.message_id, version, prices)
+        DUE_CHATS.discard(cid)
+        FANOUT_STATS["sent"] += 1
+    except TelegramError as e:
+        if "kicked" in str(e) or "not found" in str(e):
+            await db.remove_chat(cid)
+            context.job.schedule_removal()
+
+async def save_state():
+    # آخرین اسنپ‌شات و قیمت‌های قبلی هم ذخیره می‌شوند تا ری‌استارت بعدی گرم شروع شود
+    if not STATE.path: return
+    STATE.snapshot = price_watcher.snapshot
+    STATE.previous_prices = PREVIOUS_PRICES
+    # داده روی event loop گرفته می‌شود و سریال‌سازی و fsync در ترد انجام می‌شود
+    await asyncio.to_thread(STATE.write, STATE.dump())
+
+def warm_start():
+    """وضعیت ذخیره شده را قبل از دریافت اولین آپدیت بازیابی می‌کند."""
+    global LAST_PRICES
+    STATE.load()
+    PREVIOUS_PRICES.update(STATE.previous_prices)
+    price_watcher.seed(STATE.snapshot)
+    LAST_PRICES = price_watcher.prices
+    if LAST_PRICES:
+        age = price_watcher.age()
+        logger.info("Warm start", extra=fields(version=price_watcher.version, assets=len(LAST_PRICES), age=age if age is None else round(age)))
+
+@instrument
+async def state_job(context):
+    # ذخیره دوره‌ای وضعیت روی دیسک و گزارش مصرف حافظه
+    await save_state()
+    logger.info("State store", extra=fields(**STATE.stats()))
+    logger.info("Group fan-out calls", extra=fields(**FANOUT_STATS))
+    logger.info("Send queue depth", extra=fields(**SENDER.depth()))
+    logger.info("Update processing", extra=fields(**UPDATES.snapshot()))
+
+@instrument
+async def chat_member_handler(update, context):
+    m = update.my_chat_member
+    c = m.chat
+    if m.new_chat_member.status in [ChatMemberStatus.MEMBER, ChatMemberStatus.ADMINISTRATOR]:
+        db.add_or_update_chat(c.id, m.from_user.id, c.title or "Group")
+        db.set_chat_language(c.id, "fa")
+    elif m.new_chat_member.status == ChatMemberStatus.LEFT:
+        await db.remove_chat(c.id)
+        for j in context.job_queue.get_jobs_by_name(str(c.id)): j.schedule_removal()
+
+async def schedule_chat_jobs(context):
+    # ثبت job هر گروه بعد از شروع دریافت آپدیت‌ها انجام می‌شود تا راه‌اندازی منتظر آن نماند
+    scheduled = await db.get_all_scheduled_chats()
+    for row in scheduled:
+        cid, inv = row[0], row[1]
+        if inv > 0: context.job_queue.run_repeating(post_prices_job, interval=inv, first=10, chat_id=cid, name=str(cid))
+    logger.info("Scheduled group jobs", extra=fields(chats=len(scheduled)))
+
+async def post_init(app):
+    # دیتابیس روی ترد اختصاصی باز می‌شود؛ اگر نسخه طرح به‌روز باشد migration اجرا نمی‌شود
+    STARTUP.mark("build")
+    await db.start()
+    STARTUP.mark("database")
+    await SENDER.start()
+    warm_start()
+    # اشتراک Price API بعد از شروع گرم باز می‌شود تا نسخه‌ای که داریم دوباره دریافت نشود
+    if settings.PRICE_SOURCE == "api": await price_watcher.start()
+    STARTUP.mark("warm_state")
+    app.job_queue.run_once(schedule_chat_jobs, when=0)
+    # ارسال همگانی نیمه‌تمام قبل از ری‌استارت از آخرین صفحه ادامه می‌یابد
+    app.job_queue.run_once(resume_broadcast, when=5)
+    STARTUP.report(settings.STARTUP_BUDGET_MS)
+
+async def post_shutdown(app):
+    # نوشتن‌های در انتظار و وضعیت گفتگوها قبل از خروج ذخیره می‌شوند
+    await BROADCASTER.stop()
+    await SENDER.stop()
+    if settings.PRICE_SOURCE == "api": await price_watcher.stop()
+    await db.close()
+    await save_state()
+
+def main():
+    # لاگ‌ها از طریق صف و ترد پس‌زمینه در logs/bot.log (با چرخش) نوشته می‌شوند
+    setup_logging("bot")
+    # استفاده از توکن خوانده شده از کانفیگ
+    app = (Application.builder().token(settings.BOT_TOKEN).concurrent_updates(UPDATES)
+           .post_init(post_init).post_shutdown(post_shutdown).build())
+    BROADCASTER.on_prune = lambda chat_ids: unschedule_chats(app.job_queue, chat_ids)
+    
+    app.job_queue.run_repeating(fetch_job, interval=PRICE_WATCH_INTERVAL, first=0)
+    app.job_queue.run_repeating(state_job, interval=STATE_SAVE_INTERVAL, first=STATE_SAVE_INTERVAL)
+    
+    app.add_handler(CommandHandler("start", start_command))
+    app.add_handler(CommandHandler("calc", calc_command))
+    app.add_handler(CommandHandler("profile", profile_command))
+    app.add_handler(CommandHandler("broadcast", broadcast_command))
+    app.add_handler(CallbackQueryHandler(button_callback))
+    app.add_handler(InlineQueryHandler(inline_query_handler))
+    app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_text))
+    app.add_handler(ChatMemberHandler(chat_member_handler))
+    
+    logger.info("Bot Started (Bilingual & Secure)...")
+    app.run_polling()
+
+if __name__ == "__main__":
     main()
\ No newline at end of file
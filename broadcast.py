@@ -0,0 +1,180 @@
+"""
+ارسال همگانی پیام ادمین به تمام چت‌ها و صاحبان هشدار.
+
+گیرندگان صفحه به صفحه با cursor از دیتابیس خوانده می‌شوند، هر صفحه با تعداد محدودی
+worker از طریق زمان‌بند خروجی (و محدودیت‌های نرخ آن) ارسال می‌شود و بعد از هر صفحه
+پیشرفت در جدول broadcasts ذخیره می‌شود؛ بعد از ری‌استارت ارسال از همان صفحه ادامه می‌یابد.
+"""
+import time
+import asyncio
+import logging
+from collections import deque
+
+from telegram.error import TelegramError, BadRequest, Forbidden
+
+from sender import PRIORITY_INTERACTIVE, PRIORITY_POST
+from logsetup import fields
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 200
+WORKERS = 8
+REPORT_INTERVAL = 15
+
+
+class Progress:
+    __slots__ = ("id", "admin_id", "text", "cursor", "total", "sent", "failed", "pruned", "started", "done_at_start", "message_id")
+
+    def __init__(self, id, admin_id, text, cursor=None, total=0, sent=0, failed=0, pruned=0):
+        self.id = id
+        self.admin_id = admin_id
+        self.text = text
+        self.cursor = cursor
+        self.total = total
+        self.sent = sent
+        self.failed = failed
+        self.pruned = pruned
+        self.started = time.monotonic()
+        # نرخ ارسال فقط بر اساس همین اجرا محاسبه می‌شود (نه اجرای قبل از ری‌استارت)
+        self.done_at_start = self.done
+        self.message_id = None
+
+    @property
+    def done(self) -> int:
+        return self.sent + self.failed + self.pruned
+
+    def rate(self) -> float:
+        elapsed = time.monotonic() - self.started
+        return (self.done - self.done_at_start) / elapsed if elapsed > 0 else 0.0
+
+    def eta(self) -> float | None:
+        rate = self.rate()
+        return max(self.total - self.done, 0) / rate if rate else None
+
+    def format(self, status="running") -> str:
+        eta = self.eta()
+        eta_txt = f"{int(eta // 60)}m {int(eta % 60)}s" if eta is not None else "-"
+        return (f"📣 Broadcast #{self.id} ({status})\n"
+                f"Progress: {min(self.done, self.total)}/{self.total}\n"
+                f"✅ {self.sent}   ⚠️ {self.failed}   🗑 {self.pruned}\n"
+                f"Speed: {self.rate():.1f} msg/s   ETA: {eta_txt if status == 'running' else '-'}")
+
+
+class Broadcaster:
+    """
+    در هر لحظه حداکثر یک ارسال همگانی اجرا می‌شود.
+    on_prune(chat_ids) بعد از حذف گروهی چت‌های مرده (بلاک یا اخراج) فراخوانی می‌شود.
+    """
+
+    def __init__(self, db, sender, on_prune=None, page_size=PAGE_SIZE, workers=WORKERS):
+        self.db = db
+        self.sender = sender
+        self.on_prune = on_prune
+        self.page_size = page_size
+        self.workers = workers
+        self.progress = None
+        self._task = None
+        self._cancelled = False
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self, bot, admin_id, text) -> Progress:
+        total = await self.db.count_broadcast_recipients()
+        broadcast_id = await self.db.create_broadcast(admin_id, text, total)
+        self._launch(bot, Progress(broadcast_id, admin_id, text, total=total))
+        return self.progress
+
+    async def resume(self, bot) -> bool:
+        """ارسال همگانی نیمه‌تمام (وضعیت running) را از آخرین نقطه ذخیره شده ادامه می‌دهد."""
+        if self.running: return False
+        row = await self.db.get_active_broadcast()
+        if row is None: return False
+        self._launch(bot, Progress(*row))
+        logger.info("Resuming broadcast", extra=fields(id=row[0], cursor=row[3], done=self.progress.done, total=row[4]))
+        return True
+
+    async def cancel(self) -> bool:
+        """توقف با وضعیت cancelled؛ این ارسال بعد از ری‌استارت ادامه نمی‌یابد."""
+        if not self.running: return False
+        self._cancelled = True
+        await self.stop()
+        return True
+
+    async def stop(self):
+        # توقف هنگام خاموش شدن؛ وضعیت running می‌ماند تا اجرای بعدی آن را ادامه دهد
+        if self._task:
+            self._task.cancel()
+            try: await self._task
+            except asyncio.CancelledError: pass
+            self._task = None
+
+    def _launch(self, bot, progress):
+        self.progress = progress
+        self._cancelled = False
+        self._task = asyncio.create_task(self._run(bot, progress))
+
+    async def _run(self, bot, p):
+        status = "running"
+        try:
+            await self._report(bot, p, status)
+            last_report = time.monotonic()
+            while True:
+                ids = await self.db.get_broadcast_recipients(p.cursor, self.page_size)
+                if not ids: break
+                queue, dead = deque(ids), []
+                await asyncio.gather(*(self._worker(bot, p, queue, dead) for _ in range(min(self.workers, len(ids)))))
+                if dead:
+                    await self.db.remove_chats(dead)
+                    if self.on_prune: self.on_prune(dead)
+                p.cursor = ids[-1]
+                await self.db.save_broadcast_progress(p.id, p.cursor, p.sent, p.failed, p.pruned)
+                if time.monotonic() - last_report >= REPORT_INTERVAL:
+                    last_report = time.monotonic()
+                    await self._report(bot, p, status)
+            status = "done"
+        except asyncio.CancelledError:
+            if not self._cancelled: raise
+            status = "cancelled"
+        except Exception:
+            # وضعیت running می‌ماند و بعد از ری‌استارت از آخرین صفحه ادامه می‌یابد
+            logger.exception("Broadcast stopped", extra=fields(id=p.id, cursor=p.cursor))
+        finally:
+            if status != "running":
+                await self.db.save_broadcast_progress(p.id, p.cursor, p.sent, p.failed, p.pruned, status)
+                logger.info("Broadcast finished", extra=fields(id=p.id, status=status, sent=p.sent, failed=p.failed, pruned=p.pruned))
+                await self._report(bot, p, status)
+
+    async def _worker(self, bot, p, queue, dead):
+        while queue:
+            cid = queue.popleft()
+            try:
+                await self.sender.submit(PRIORITY_POST, cid, bot.send_message, cid, p.text)
+                p.sent += 1
+            except Forbidden:
+                # ربات بلاک یا از گروه اخراج شده است
+                dead.append(cid)
+                p.pruned += 1
+            except BadRequest as e:
+                if "not found" in str(e).lower():
+                    dead.append(cid)
+                    p.pruned += 1
+                else:
+                    p.failed += 1
+            except TelegramError as e:
+                p.failed += 1
+                logger.warning("Broadcast message not delivered", extra=fields(sample=True, chat=cid, error=e))
+
+    async def _report(self, bot, p, status):
+        """گزارش پیشرفت برای ادمین؛ همان پیام وضعیت ویرایش می‌شود."""
+        text = p.format(status)
+        try:
+            if p.message_id:
+                await self.sender.submit(PRIORITY_INTERACTIVE, p.admin_id, bot.edit_message_text, text,
+                                         chat_id=p.admin_id, message_id=p.message_id)
+            else:
+                message = await self.sender.submit(PRIORITY_INTERACTIVE, p.admin_id, bot.send_message, p.admin_id, text)
+                p.message_id = message.message_id
+        except TelegramError as e:
+            logger.warning("Broadcast report failed", extra=fields(id=p.id, error=e))
@@ -1,30 +1,50 @@
-from pydantic_settings import BaseSettings, SettingsConfigDict
-
-class BotSettings(BaseSettings):
-    """
-    Main configuration for the Bot and API services.
-    These values are automatically loaded from the .env file or environment variables.
-    """
-
-    # Telegram Bot Token obtained from BotFather
-    # No default value (must be provided)
-    BOT_TOKEN: str
-
-    # The Channel ID required for forced subscription check
-    # For public channels: @YourChannelName
-    # For private channels: -100... (Numeric ID)
-    CHANNEL_ID: str
-
-    # The URL of the running Price API
-    # Default is set to localhost port 8000
-    PRICE_API_URL: str = "http://127.0.0.1:8000/prices"
-
-    # Pydantic settings configuration
-    model_config = SettingsConfigDict(
-        env_file=".env", 
-        env_file_encoding="utf-8", 
-        extra="ignore"  # Ignore extra variables in .env that are not defined here
-    )
-
-# Create a settings instance to be used throughout the application
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+class BotSettings(BaseSettings):
+    """
+    Main configuration for the Bot and API services.
+    These values are automatically loaded from the .env file or environment variables.
+    """
+
+    # Telegram Bot Token obtained from BotFather
+    # No default value (must be provided)
+    BOT_TOKEN: str
+
+    # The Channel ID required for forced subscription check
+    # For public channels: @YourChannelName
+    # For private channels: -100... (Numeric ID)
+    CHANNEL_ID: str
+
+    # The URL of the running Price API
+    # Default is set to localhost port 8000
+    PRICE_API_URL: str = "http://127.0.0.1:8000/prices"
+
+    # Where the bot reads prices from: "file" (local prices.json) or "api" (PRICE_API_URL)
+    # In api mode the bot subscribes to PRICE_API_URL/stream and falls back to
+    # conditional polling every PRICE_POLL_INTERVAL seconds
+    PRICE_SOURCE: str = "file"
+    PRICE_POLL_INTERVAL: float = 1.0
+
+    # Extra quote currencies for /calc, as units per 1 USD
+    # Example in .env: QUOTE_CURRENCIES={"IRT": 60000}
+    QUOTE_CURRENCIES: dict[str, float] = {}
+
+    # Telegram user IDs allowed to run admin commands (e.g. /profile)
+    # Example in .env: ADMIN_IDS=[123456789]
+    ADMIN_IDS: list[int] = []
+
+    # Per-handler latency instrumentation; handlers slower than the threshold are logged
+    PROFILING_ENABLED: bool = True
+    SLOW_HANDLER_MS: int = 500
+    # Startup time budget in ms; exceeding it logs a warning (0 = no budget)
+    STARTUP_BUDGET_MS: int = 2000
+
+    # Pydantic settings configuration
+    model_config = SettingsConfigDict(
+        env_file=".env", 
+        env_file_encoding="utf-8", 
+        extra="ignore"  # Ignore extra variables in .env that are not defined here
+    )
+
+# Create a settings instance to be used throughout the application
 settings = BotSettings()
\ No newline at end of file
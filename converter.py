@@ -0,0 +1,67 @@
+import math
+
+
+class RateMatrix:
+    """
+    ماتریس کامل نرخ تبدیل بین تمام دارایی‌ها و ارزهای مرجع.
+    rows[i][j] یعنی یک واحد از دارایی i برابر چند واحد از دارایی j است.
+    """
+
+    __slots__ = ("key", "codes", "index", "rows")
+
+    def __init__(self, key, usd_values: dict):
+        self.key = key
+        self.codes = list(usd_values)
+        self.index = {code: i for i, code in enumerate(self.codes)}
+        values = list(usd_values.values())
+        # کل ماتریس در یک عملیات (تقسیم بیرونی بردار ارزش دلاری) ساخته می‌شود
+        self.rows = [[a / b for b in values] for a in values]
+
+    def rate(self, src: str, dst: str) -> float | None:
+        i, j = self.index.get(src), self.index.get(dst)
+        if i is None or j is None: return None
+        return self.rows[i][j]
+
+    def convert(self, amount: float, src: str, dst: str) -> float | None:
+        rate = self.rate(src, dst)
+        return None if rate is None else amount * rate
+
+
+class Converter:
+    """
+    ماتریس نرخ را فقط یک بار به ازای هر اسنپ‌شات دریافتی (key، مثلاً revision واچر) می‌سازد تا هر
+    درخواست تبدیل فقط یک جستجوی O(1) باشد.
+    quotes: تعداد واحد هر ارز مرجع به ازای یک دلار، مثلاً {"IRT": 60000}
+    """
+
+    def __init__(self, quotes: dict | None = None):
+        self.quotes = {"USD": 1.0}
+        for code, per_usd in (quotes or {}).items():
+            if per_usd and per_usd > 0:
+                self.quotes[code.upper()] = float(per_usd)
+        self._matrix = None
+
+    def matrix(self, key, prices: dict) -> RateMatrix:
+        if self._matrix is None or self._matrix.key != key:
+            usd_values = {
+                code: entry.price_num for code, entry in prices.items()
+                if entry.price_num
+            }
+            for code, per_usd in self.quotes.items():
+                usd_values.setdefault(code, 1.0 / per_usd)
+            self._matrix = RateMatrix(key, usd_values)
+        return self._matrix
+
+
+def format_amount(value: float) -> str:
+    """مقادیر بزرگ با دو رقم اعشار و مقادیر کوچک با دقت بیشتر نمایش داده می‌شوند."""
+    if abs(value) >= 100: return f"{value:,.2f}"
+    return f"{value:,.8f}".rstrip("0").rstrip(".")
+
+
+def format_price(value: float) -> str:
+    """قیمت دلاری با دو رقم اعشار؛ قیمت‌های زیر یک دلار (مثل SHIB و PEPE) با چهار رقم معنادار."""
+    if value == 0 or abs(value) >= 1: return f"{value:,.2f}"
+    decimals = 3 - math.floor(math.log10(abs(value)))
+    text = f"{value:.{decimals}f}".rstrip("0")
+    return text if len(text.split(".")[1]) >= 2 else f"{value:.2f}"
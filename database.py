@@ -1,153 +1,569 @@
-import sqlite3
-import logging
-
-DB_NAME = "bot_database.db"
-logger = logging.getLogger(__name__)
-
-def get_connection():
-    return sqlite3.connect(DB_NAME)
-
-def initialize_db():
-    conn = get_connection()
-    c = conn.cursor()
-    
-    # جدول چت‌ها
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS chats (
-            chat_id INTEGER PRIMARY KEY,
-            user_id INTEGER,
-            title TEXT,
-            interval INTEGER,
-            enabled_assets TEXT DEFAULT 'ALL',
-            language TEXT DEFAULT 'fa'
-        )
-    ''')
-    
-    # آپدیت جدول‌های قدیمی (اضافه کردن ستون‌های جدید)
-    try:
-        c.execute("ALTER TABLE chats ADD COLUMN enabled_assets TEXT DEFAULT 'ALL'")
-    except sqlite3.OperationalError: pass
-
-    try:
-        c.execute("ALTER TABLE chats ADD COLUMN language TEXT DEFAULT 'fa'")
-    except sqlite3.OperationalError: pass
-
-    # جدول هشدارها
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS alerts (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            asset TEXT,
-            target_price REAL,
-            condition TEXT
-        )
-    ''')
-    conn.commit()
-    conn.close()
-
-# --- مدیریت چت‌ها ---
-def add_or_update_chat(chat_id, user_id, title):
-    conn = get_connection()
-    c = conn.cursor()
-    # اگر چت جدید است، پیش‌فرض فارسی باشد. اگر هست، تایتل آپدیت شود.
-    c.execute("INSERT OR IGNORE INTO chats (chat_id, user_id, title, enabled_assets, language) VALUES (?, ?, ?, 'ALL', 'fa')", (chat_id, user_id, title))
-    c.execute("UPDATE chats SET title = ?, user_id = ? WHERE chat_id = ?", (title, user_id, chat_id))
-    conn.commit()
-    conn.close()
-
-def remove_chat(chat_id):
-    conn = get_connection()
-    c = conn.cursor()
-    c.execute("DELETE FROM chats WHERE chat_id = ?", (chat_id,))
-    conn.commit()
-    conn.close()
-
-def set_chat_interval(chat_id, interval):
-    conn = get_connection()
-    c = conn.cursor()
-    c.execute("UPDATE chats SET interval = ? WHERE chat_id = ?", (interval, chat_id))
-    conn.commit()
-    conn.close()
-
-def set_chat_assets(chat_id, assets_str):
-    conn = get_connection()
-    c = conn.cursor()
-    c.execute("UPDATE chats SET enabled_assets = ? WHERE chat_id = ?", (assets_str, chat_id))
-    conn.commit()
-    conn.close()
-
-def get_chat_assets(chat_id):
-    conn = get_connection()
-    c = conn.cursor()
-    c.execute("SELECT enabled_assets FROM chats WHERE chat_id = ?", (chat_id,))
-    result = c.fetchone()
-    conn.close()
-    return result[0] if result else "ALL"
-
-# --- مدیریت زبان ---
-def set_chat_language(chat_id, lang):
-    conn = get_connection()
-    c = conn.cursor()
-    # ابتدا سعی می‌کنیم آپدیت کنیم
-    c.execute("UPDATE chats SET language = ? WHERE chat_id = ?", (lang, chat_id))
-    # اگر سطر وجود نداشت (مثلاً کاربر جدید است)، اینسرت می‌کنیم
-    if c.rowcount == 0:
-         c.execute("INSERT INTO chats (chat_id, language) VALUES (?, ?)", (chat_id, lang))
-    conn.commit()
-    conn.close()
-
-def get_chat_language(chat_id):
-    conn = get_connection()
-    c = conn.cursor()
-    c.execute("SELECT language FROM chats WHERE chat_id = ?", (chat_id,))
-    result = c.fetchone()
-    conn.close()
-    return result[0] if result else "fa" # پیش‌فرض فارسی
-
-def get_user_chats(user_id):
-    conn = get_connection()
-    c = conn.cursor()
-    c.execute("SELECT chat_id, title, interval FROM chats WHERE user_id = ?", (user_id,))
-    results = c.fetchall()
-    conn.close()
-    return results
-
-def get_all_scheduled_chats():
-    conn = get_connection()
-    c = conn.cursor()
-    c.execute("SELECT chat_id, interval, enabled_assets, language FROM chats WHERE interval > 0")
-    results = c.fetchall()
-    conn.close()
-    return results
-
-# --- مدیریت هشدارها ---
-def add_alert(user_id, asset, target_price, condition):
-    conn = get_connection()
-    c = conn.cursor()
-    c.execute("INSERT INTO alerts (user_id, asset, target_price, condition) VALUES (?, ?, ?, ?)", 
-              (user_id, asset, target_price, condition))
-    conn.commit()
-    conn.close()
-
-def get_all_alerts():
-    conn = get_connection()
-    c = conn.cursor()
-    c.execute("SELECT id, user_id, asset, target_price, condition FROM alerts")
-    results = c.fetchall()
-    conn.close()
-    return results
-
-def get_user_alerts(user_id):
-    conn = get_connection()
-    c = conn.cursor()
-    c.execute("SELECT id, asset, target_price, condition FROM alerts WHERE user_id = ?", (user_id,))
-    results = c.fetchall()
-    conn.close()
-    return results
-
-def delete_alert(alert_id):
-    conn = get_connection()
-    c = conn.cursor()
-    c.execute("DELETE FROM alerts WHERE id = ?", (alert_id,))
-    conn.commit()
-    conn.close()
\ No newline at end of file
+import time
+import sqlite3
+import asyncio
+import logging
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from profiling import span
+from logsetup import fields
+
+DB_NAME = "bot_database.db"
+# نسخه طرح دیتابیس (PRAGMA user_version)؛ با هر جدول یا ستون جدید باید یک واحد افزایش یابد
+SCHEMA_VERSION = 3
+logger = logging.getLogger(__name__)
+
+def get_connection():
+    return sqlite3.connect(DB_NAME)
+
+def uses_connection(func):
+    """
+    تابع را با یک cursor اجرا می‌کند. اگر اتصالی (conn) داده نشود، یک اتصال موقت
+    باز شده و بعد از commit بسته می‌شود؛ در غیر این صورت commit به عهده صاحب اتصال است.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, conn=None):
+        if conn is not None:
+            return func(conn.cursor(), *args)
+        conn = get_connection()
+        try:
+            result = func(conn.cursor(), *args)
+            conn.commit()
+            return result
+        finally:
+            conn.close()
+    return wrapper
+
+def initialize_db():
+    conn = get_connection()
+    # اگر طرح دیتابیس به‌روز باشد هیچ CREATE یا ALTER اجرا نمی‌شود
+    if conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+        conn.close()
+        return
+    c = conn.cursor()
+    
+    # جدول چت‌ها
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS chats (
+            chat_id INTEGER PRIMARY KEY,
+            user_id INTEGER,
+            title TEXT,
+            interval INTEGER,
+            enabled_assets TEXT DEFAULT 'ALL',
+            language TEXT DEFAULT 'fa'
+        )
+    ''')
+    
+    # آپدیت جدول‌های قدیمی (اضافه کردن ستون‌های جدید)
+    try:
+        c.execute("ALTER TABLE chats ADD COLUMN enabled_assets TEXT DEFAULT 'ALL'")
+    except sqlite3.OperationalError: pass
+
+    try:
+        c.execute("ALTER TABLE chats ADD COLUMN language TEXT DEFAULT 'fa'")
+    except sqlite3.OperationalError: pass
+
+    try:
+        c.execute("ALTER TABLE chats ADD COLUMN live_ticker INTEGER DEFAULT 0")
+    except sqlite3.OperationalError: pass
+
+    # سیاست ارسال: فقط با تغییر حداقل درصد یا دلار، و حداکثر سکوت (ثانیه)
+    for column in ("post_threshold_pct REAL DEFAULT 0", "post_threshold_usd REAL DEFAULT 0", "max_silence INTEGER DEFAULT 0"):
+        try:
+            c.execute(f"ALTER TABLE chats ADD COLUMN {column}")
+        except sqlite3.OperationalError: pass
+
+    # جدول هشدارها
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS alerts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            asset TEXT,
+            target_price REAL,
+            condition TEXT
+        )
+    ''')
+
+    # پیمایش گیرندگان ارسال همگانی و هشدارهای هر کاربر از این ایندکس استفاده می‌کنند
+    c.execute("CREATE INDEX IF NOT EXISTS idx_alerts_user ON alerts (user_id)")
+
+    # تقاضای اخیر برای دارایی‌ها (درخواست‌های API و ربات)
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS asset_demand (
+            asset TEXT PRIMARY KEY,
+            last_requested REAL
+        )
+    ''')
+
+    # ارسال‌های همگانی؛ cursor آخرین گیرنده پردازش شده است تا بعد از ری‌استارت ادامه یابد
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS broadcasts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            admin_id INTEGER,
+            text TEXT,
+            status TEXT DEFAULT 'running',
+            cursor INTEGER,
+            total INTEGER DEFAULT 0,
+            sent INTEGER DEFAULT 0,
+            failed INTEGER DEFAULT 0,
+            pruned INTEGER DEFAULT 0,
+            created REAL
+        )
+    ''')
+
+    # lease بین چند نمونه scraper؛ فقط دارنده lease منتشر می‌کند
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS leases (
+            name TEXT PRIMARY KEY,
+            holder TEXT,
+            expires REAL
+        )
+    ''')
+    c.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    conn.commit()
+    conn.close()
+
+# --- مدیریت چت‌ها ---
+@uses_connection
+def add_or_update_chat(c, chat_id, user_id, title):
+    # اگر چت جدید است، پیش‌فرض فارسی باشد. اگر هست، تایتل آپدیت شود.
+    c.execute("INSERT OR IGNORE INTO chats (chat_id, user_id, title, enabled_assets, language) VALUES (?, ?, ?, 'ALL', 'fa')", (chat_id, user_id, title))
+    c.execute("UPDATE chats SET title = ?, user_id = ? WHERE chat_id = ?", (title, user_id, chat_id))
+
+@uses_connection
+def remove_chat(c, chat_id):
+    c.execute("DELETE FROM chats WHERE chat_id = ?", (chat_id,))
+
+@uses_connection
+def remove_chats(c, *chat_ids):
+    """حذف گروهی چت‌های مرده به همراه هشدارهای آن‌ها در یک تراکنش"""
+    rows = [(cid,) for cid in chat_ids]
+    c.executemany("DELETE FROM chats WHERE chat_id = ?", rows)
+    c.executemany("DELETE FROM alerts WHERE user_id = ?", rows)
+
+@uses_connection
+def set_chat_interval(c, chat_id, interval):
+    c.execute("UPDATE chats SET interval = ? WHERE chat_id = ?", (interval, chat_id))
+
+@uses_connection
+def set_chat_assets(c, chat_id, assets_str):
+    c.execute("UPDATE chats SET enabled_assets = ? WHERE chat_id = ?", (assets_str, chat_id))
+
+@uses_connection
+def get_chat_assets(c, chat_id):
+    c.execute("SELECT enabled_assets FROM chats WHERE chat_id = ?", (chat_id,))
+    result = c.fetchone()
+    return result[0] if result else "ALL"
+
+@uses_connection
+def set_chat_live_ticker(c, chat_id, enabled):
+    c.execute("UPDATE chats SET live_ticker = ? WHERE chat_id = ?", (1 if enabled else 0, chat_id))
+
+@uses_connection
+def set_chat_post_policy(c, chat_id, threshold_pct, threshold_usd, max_silence):
+    c.execute("UPDATE chats SET post_threshold_pct = ?, post_threshold_usd = ?, max_silence = ? WHERE chat_id = ?",
+              (threshold_pct, threshold_usd, max_silence, chat_id))
+
+@uses_connection
+def get_chat_post_settings(c, chat_id):
+    """تنظیمات ارسال خودکار یک گروه: (دارایی‌های فعال، حالت تیکر زنده، (درصد، دلار، حداکثر سکوت))"""
+    c.execute("SELECT enabled_assets, live_ticker, post_threshold_pct, post_threshold_usd, max_silence FROM chats WHERE chat_id = ?", (chat_id,))
+    result = c.fetchone()
+    return (result[0], bool(result[1]), (result[2] or 0, result[3] or 0, result[4] or 0)) if result else ("ALL", False, (0, 0, 0))
+
+@uses_connection
+def get_post_policies(c):
+    """گروه‌های زمان‌بندی شده‌ای که آستانه تغییر دارند: (chat_id، دارایی‌ها، درصد، دلار)"""
+    c.execute("""SELECT chat_id, enabled_assets, post_threshold_pct, post_threshold_usd FROM chats
+                 WHERE interval > 0 AND (post_threshold_pct > 0 OR post_threshold_usd > 0)""")
+    return c.fetchall()
+
+# --- مدیریت زبان ---
+@uses_connection
+def set_chat_language(c, chat_id, lang):
+    # ابتدا سعی می‌کنیم آپدیت کنیم
+    c.execute("UPDATE chats SET language = ? WHERE chat_id = ?", (lang, chat_id))
+    # اگر سطر وجود نداشت (مثلاً کاربر جدید است)، اینسرت می‌کنیم
+    if c.rowcount == 0:
+         c.execute("INSERT INTO chats (chat_id, language) VALUES (?, ?)", (chat_id, lang))
+
+@uses_connection
+def get_chat_language(c, chat_id):
+    c.execute("SELECT language FROM chats WHERE chat_id = ?", (chat_id,))
+    result = c.fetchone()
+    return result[0] if result else "fa" # پیش‌فرض فارسی
+
+@uses_connection
+def get_all_chat_languages(c):
+    c.execute("SELECT chat_id, language FROM chats WHERE language IS NOT NULL")
+    return c.fetchall()
+
+@uses_connection
+def get_user_chats(c, user_id):
+    c.execute("SELECT chat_id, title, interval FROM chats WHERE user_id = ?", (user_id,))
+    return c.fetchall()
+
+@uses_connection
+def get_all_scheduled_chats(c):
+    c.execute("SELECT chat_id, interval, enabled_assets, language FROM chats WHERE interval > 0")
+    return c.fetchall()
+
+# --- مدیریت هشدارها ---
+@uses_connection
+def add_alert(c, user_id, asset, target_price, condition):
+    c.execute("INSERT INTO alerts (user_id, asset, target_price, condition) VALUES (?, ?, ?, ?)",
+              (user_id, asset, target_price, condition))
+
+@uses_connection
+def get_all_alerts(c):
+    c.execute("SELECT id, user_id, asset, target_price, condition FROM alerts")
+    return c.fetchall()
+
+@uses_connection
+def get_user_alerts(c, user_id):
+    c.execute("SELECT id, asset, target_price, condition FROM alerts WHERE user_id = ?", (user_id,))
+    return c.fetchall()
+
+@uses_connection
+def delete_alert(c, alert_id):
+    c.execute("DELETE FROM alerts WHERE id = ?", (alert_id,))
+
+# --- تقاضای دارایی‌ها ---
+@uses_connection
+def touch_asset_demand(c, *assets):
+    now = time.time()
+    c.executemany("INSERT OR REPLACE INTO asset_demand (asset, last_requested) VALUES (?, ?)", [(a, now) for a in assets])
+
+@uses_connection
+def get_demanded_assets(c, demand_ttl=600):
+    """
+    کد تمام دارایی‌هایی که کسی به آن‌ها نیاز دارد: دارایی‌های فعال گروه‌های زمان‌بندی شده
+    (ممکن است شامل "ALL" باشد)، دارایی‌های هشدارها و درخواست‌های اخیر API و ربات.
+    """
+    demanded = set()
+    c.execute("SELECT DISTINCT enabled_assets FROM chats WHERE interval > 0")
+    for (assets_str,) in c.fetchall():
+        if assets_str: demanded.update(assets_str.split(","))
+    c.execute("SELECT DISTINCT asset FROM alerts")
+    demanded.update(row[0] for row in c.fetchall())
+    c.execute("SELECT asset FROM asset_demand WHERE last_requested > ?", (time.time() - demand_ttl,))
+    demanded.update(row[0] for row in c.fetchall())
+    return demanded
+
+# --- ارسال همگانی ---
+@uses_connection
+def count_broadcast_recipients(c):
+    c.execute("SELECT COUNT(*) FROM (SELECT chat_id FROM chats UNION SELECT user_id FROM alerts)")
+    return c.fetchone()[0]
+
+@uses_connection
+def get_broadcast_recipients(c, after, limit):
+    """
+    صفحه بعدی گیرندگان (چت‌ها و صاحبان هشدار) بعد از after به ترتیب شناسه.
+    پیمایش keyset روی کلید اصلی و ایندکس است؛ هیچ‌وقت کل جدول در حافظه خوانده نمی‌شود.
+    """
+    after = -(2 ** 63) if after is None else after
+    c.execute("SELECT chat_id FROM chats WHERE chat_id > ? ORDER BY chat_id LIMIT ?", (after, limit))
+    ids = {row[0] for row in c.fetchall()}
+    c.execute("SELECT DISTINCT user_id FROM alerts WHERE user_id > ? ORDER BY user_id LIMIT ?", (after, limit))
+    ids.update(row[0] for row in c.fetchall())
+    return sorted(ids)[:limit]
+
+@uses_connection
+def create_broadcast(c, admin_id, text, total):
+    c.execute("INSERT INTO broadcasts (admin_id, text, total, created) VALUES (?, ?, ?, ?)",
+              (admin_id, text, total, time.time()))
+    return c.lastrowid
+
+@uses_connection
+def get_active_broadcast(c):
+    c.execute("SELECT id, admin_id, text, cursor, total, sent, failed, pruned FROM broadcasts "
+              "WHERE status = 'running' ORDER BY id DESC LIMIT 1")
+    return c.fetchone()
+
+@uses_connection
+def save_broadcast_progress(c, broadcast_id, cursor, sent, failed, pruned, status="running"):
+    c.execute("UPDATE broadcasts SET cursor = ?, sent = ?, failed = ?, pruned = ?, status = ? WHERE id = ?",
+              (cursor, sent, failed, pruned, status, broadcast_id))
+
+# --- lease ---
+@uses_connection
+def acquire_lease(c, name, holder, ttl):
+    """
+    lease را برای holder می‌گیرد یا تمدید می‌کند؛ فقط اگر آزاد، منقضی یا متعلق به خود holder باشد.
+    یک دستور upsert واحد است، پس بین چند پروسه اتمیک است.
+    """
+    now = time.time()
+    c.execute("INSERT INTO leases (name, holder, expires) VALUES (?, ?, ?) "
+              "ON CONFLICT(name) DO UPDATE SET holder = excluded.holder, expires = excluded.expires "
+              "WHERE leases.holder = excluded.holder OR leases.expires < ?",
+              (name, holder, now + ttl, now))
+    return c.rowcount == 1
+
+@uses_connection
+def release_lease(c, name, holder):
+    c.execute("DELETE FROM leases WHERE name = ? AND holder = ?", (name, holder))
+
+
+class AsyncDatabase:
+    """
+    لایه غیرمسدودکننده دیتابیس برای هندلرهای async.
+    تمام کوئری‌ها روی یک ترد اختصاصی و با یک اتصال واحد اجرا می‌شوند تا fsync
+    هیچ‌وقت event loop را متوقف نکند. نوشتن‌های پرتکرار (چت، زبان، دارایی‌ها)
+    در حافظه تجمیع شده و به صورت دوره‌ای در یک تراکنش ذخیره می‌شوند.
+    خواندن‌ها قبل از اجرا فقط نوشتن‌های در انتظار را بدون commit روی همان اتصال اعمال
+    می‌کنند؛ پس آخرین نوشتن‌ها را می‌بینند ولی هزینه commit را نمی‌پردازند.
+    این تراکنش باز حداکثر تا flush بعدی (flush_interval) قفل نوشتن را نگه می‌دارد.
+    """
+
+    def __init__(self, db_name=DB_NAME, flush_interval=0.5):
+        self.db_name = db_name
+        self.flush_interval = flush_interval
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+        self._conn = None
+        # نوشتن‌های در انتظار: (نام تابع، chat_id یا دارایی) -> (تابع، آرگومان‌ها، future)
+        self._pending = {}
+        # future نوشتن‌هایی که روی اتصال اعمال شده‌اند ولی هنوز commit نشده‌اند؛
+        # فقط روی ترد دیتابیس خوانده و نوشته می‌شود تا ترتیبش با ترتیب اجرا یکی باشد
+        self._unsaved = []
+        # از آخرین commit دسته‌ای، نوشتنی اعمال شده است
+        self._dirty = False
+        # زبان همه چت‌ها در حافظه نگه داشته می‌شود تا ترجمه هیچ کوئری‌ای نزند
+        self._languages = {}
+        self._flush_task = None
+
+    async def _run(self, func, *args):
+        # اجرا روی ترد اختصاصی؛ ترتیب اجرا FIFO است
+        with span("db"):
+            return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    async def _run_then(self, done, func, *args):
+        """
+        مثل _run، ولی done(نتیجه) حتی اگر فراخواننده لغو شود روی event loop اجرا می‌شود؛
+        برای کامل کردن future نوشتن‌ها که نباید با لغو یک هندلر بی‌جواب بمانند.
+        """
+        future = asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+        future.add_done_callback(lambda f: f.cancelled() or f.exception() or done(f.result()))
+        with span("db"):
+            return await asyncio.shield(future)
+
+    def _open(self):
+        initialize_db()
+        self._conn = sqlite3.connect(self.db_name, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        return get_all_chat_languages(conn=self._conn)
+
+    def _close(self):
+        if self._conn:
+            self._conn.close()
+            self._conn = None
+
+    def _execute(self, func, args):
+        try:
+            return func(*args, conn=self._conn)
+        finally:
+            self._conn.commit()
+
+    def _query(self, func, args):
+        return func(*args, conn=self._conn)
+
+    def _commit(self):
+        """تراکنش باز را ذخیره می‌کند. خروجی: (future نوشتن‌های اعمال شده، خطای commit یا None)"""
+        unsaved, self._unsaved = self._unsaved, []
+        try:
+            self._conn.commit()
+        except sqlite3.Error as e:
+            # نوشتن‌ها ذخیره نشده‌اند و نباید در commit بعدی موفق گزارش شوند
+            try: self._conn.rollback()
+            except sqlite3.Error: pass
+            return unsaved, e
+        return unsaved, None
+
+    def _apply(self, entries):
+        """
+        نوشتن‌ها را بدون commit در تراکنش باز اتصال اجرا می‌کند. اگر کل دسته خطا بدهد،
+        دستورها یکی یکی دوباره اجرا می‌شوند تا فقط دستور خراب کنار گذاشته شود.
+        future نوشتن‌های موفق تا commit بعدی نگه داشته می‌شوند. خروجی: لیست (نوشتن، خطا) ناموفق
+        """
+        failed = []
+        try:
+            self._savepoint([(func, args) for func, args, _ in entries])
+        except Exception:
+            for entry in entries:
+                try: self._savepoint([entry[:2]])
+                except Exception as e: failed.append((entry, e))
+        failed_futures = {id(entry[2]) for entry, _ in failed}
+        self._unsaved.extend(future for _, _, future in entries if id(future) not in failed_futures)
+        return failed
+
+    def _savepoint(self, statements):
+        # savepoint داخل تراکنش باز است، پس RELEASE آن commit نمی‌کند
+        if not self._conn.in_transaction: self._conn.execute("BEGIN")
+        self._conn.execute("SAVEPOINT batch")
+        try:
+            for func, args in statements: func(*args, conn=self._conn)
+        except Exception:
+            self._conn.execute("ROLLBACK TO batch")
+            raise
+        finally:
+            self._conn.execute("RELEASE batch")
+
+    async def start(self):
+        self._languages = dict(await self._run(self._open))
+        self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def close(self):
+        if self._flush_task:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush()
+        await self._run(self._close)
+        self._executor.shutdown(wait=True)
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def flush(self):
+        """نوشتن‌های در انتظار را اعمال کرده و همه را در یک commit ذخیره می‌کند."""
+        await self._apply_pending()
+        if not self._dirty: return
+        self._dirty = False
+        await self._run_then(self._committed, self._commit)
+
+    @staticmethod
+    def _committed(result):
+        unsaved, error = result
+        if error is not None:
+            logger.error("Commit of batched writes failed", extra=fields(writes=len(unsaved), error=error))
+        for future in unsaved:
+            if future.done(): continue
+            if error is None: future.set_result(None)
+            else: future.set_exception(error)
+
+    @staticmethod
+    def _failed(failed):
+        for (func, args, future), e in failed:
+            logger.error("Batched write failed", extra=fields(write=func.__name__, args=args, error=e))
+            if not future.done(): future.set_exception(e)
+
+    async def _apply_pending(self):
+        if not self._pending: return
+        entries = list(self._pending.values())
+        self._pending.clear()
+        self._dirty = True
+        await self._run_then(self._failed, self._apply, entries)
+
+    def _defer(self, func, target, *args) -> asyncio.Future:
+        """
+        نوشتن را برای ذخیره دسته‌ای در صف می‌گذارد. future بعد از commit کامل می‌شود
+        و در صورت خطای همین نوشتن، خطا را برمی‌گرداند (خطا لاگ هم می‌شود).
+        """
+        # target همان chat_id یا کد دارایی است که نوشتن‌ها بر اساس آن تجمیع می‌شوند
+        key = (func.__name__, target)
+        # آخرین مقدار برنده است و به انتهای صف منتقل می‌شود
+        entry = self._pending.pop(key, None)
+        if entry:
+            future = entry[2]
+        else:
+            future = asyncio.get_running_loop().create_future()
+            # خطا از قبل لاگ شده است؛ future هایی که کسی منتظرشان نیست هشدار اضافه نمی‌دهند
+            future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._pending[key] = (func, (target,) + args, future)
+        return future
+
+    async def call(self, func, *args):
+        """
+        یک نوشتن مستقیم را اجرا و commit می‌کند؛ نوشتن‌های در انتظار قبل از آن
+        اعمال شده و همراه آن ذخیره می‌شوند.
+        """
+        await self._apply_pending()
+        return await self._run(self._execute, func, args)
+
+    async def read(self, func, *args):
+        """یک خواندن بدون commit؛ نوشتن‌های در انتظار قبل از آن روی همان اتصال اعمال می‌شوند."""
+        await self._apply_pending()
+        return await self._run(self._query, func, args)
+
+    # --- نوشتن‌های پرتکرار (تجمیع‌شده، بدون انتظار) ---
+    def add_or_update_chat(self, chat_id, user_id, title):
+        return self._defer(add_or_update_chat, chat_id, user_id, title)
+
+    def set_chat_language(self, chat_id, lang):
+        self._languages[chat_id] = lang
+        return self._defer(set_chat_language, chat_id, lang)
+
+    def set_chat_assets(self, chat_id, assets_str):
+        return self._defer(set_chat_assets, chat_id, assets_str)
+
+    def touch_asset_demand(self, asset):
+        return self._defer(touch_asset_demand, asset)
+
+    # --- خواندن ---
+    def get_chat_language(self, chat_id):
+        return self._languages.get(chat_id, "fa")
+
+    async def get_chat_assets(self, chat_id):
+        pending = self._pending.get(("set_chat_assets", chat_id))
+        if pending: return pending[1][1]
+        return await self.read(get_chat_assets, chat_id)
+
+    async def get_chat_post_settings(self, chat_id):
+        return await self.read(get_chat_post_settings, chat_id)
+
+    async def get_post_policies(self):
+        return await self.read(get_post_policies)
+
+    async def get_user_chats(self, user_id):
+        return await self.read(get_user_chats, user_id)
+
+    async def get_all_scheduled_chats(self):
+        return await self.read(get_all_scheduled_chats)
+
+    async def get_all_alerts(self):
+        return await self.read(get_all_alerts)
+
+    async def get_user_alerts(self, user_id):
+        return await self.read(get_user_alerts, user_id)
+
+    # --- نوشتن‌های مستقیم ---
+    async def remove_chat(self, chat_id):
+        self._languages.pop(chat_id, None)
+        await self.call(remove_chat, chat_id)
+
+    async def remove_chats(self, chat_ids):
+        for cid in chat_ids: self._languages.pop(cid, None)
+        await self.call(remove_chats, *chat_ids)
+
+    async def set_chat_interval(self, chat_id, interval):
+        await self.call(set_chat_interval, chat_id, interval)
+
+    async def set_chat_live_ticker(self, chat_id, enabled):
+        await self.call(set_chat_live_ticker, chat_id, enabled)
+
+    async def set_chat_post_policy(self, chat_id, threshold_pct, threshold_usd, max_silence):
+        await self.call(set_chat_post_policy, chat_id, threshold_pct, threshold_usd, max_silence)
+
+    async def add_alert(self, user_id, asset, target_price, condition):
+        await self.call(add_alert, user_id, asset, target_price, condition)
+
+    async def delete_alert(self, alert_id):
+        await self.call(delete_alert, alert_id)
+
+    # --- ارسال همگانی ---
+    async def count_broadcast_recipients(self):
+        return await self.read(count_broadcast_recipients)
+
+    async def get_broadcast_recipients(self, after, limit):
+        return await self.read(get_broadcast_recipients, after, limit)
+
+    async def create_broadcast(self, admin_id, text, total):
+        return await self.call(create_broadcast, admin_id, text, total)
+
+    async def get_active_broadcast(self):
+        return await self.read(get_active_broadcast)
+
+    async def save_broadcast_progress(self, broadcast_id, cursor, sent, failed, pruned, status="running"):
+        await self.call(save_broadcast_progress, broadcast_id, cursor, sent, failed, pruned, status)
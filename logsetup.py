@@ -0,0 +1,104 @@
+import os
+import sys
+import time
+import queue
+import atexit
+import logging
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+from pathlib import Path
+
+# تنظیمات لاگ؛ همه از طریق متغیرهای محیطی قابل تغییرند
+LOG_DIR = Path(os.environ.get("LOG_DIR", Path(__file__).parent / "logs"))
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO")
+LOG_MAX_BYTES = int(os.environ.get("LOG_MAX_BYTES", 5 * 1024 * 1024))
+LOG_BACKUPS = int(os.environ.get("LOG_BACKUPS", 5))
+LOG_ROTATE_WHEN = os.environ.get("LOG_ROTATE_WHEN", "")  # مثلاً "midnight" برای چرخش زمانی به جای حجمی
+LOG_CONSOLE = os.environ.get("LOG_CONSOLE", "1") != "0"
+LOG_SAMPLE_INTERVAL = float(os.environ.get("LOG_SAMPLE_INTERVAL", 60))
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(name)s - %(message)s"
+
+# لاگرهایی که در هر درخواست یا تیک یک خط INFO می‌نویسند و نمونه‌برداری می‌شوند
+SAMPLED_LOGGERS = {"httpx", "httpcore", "uvicorn.access", "telegram.ext.Updater"}
+
+
+def fields(sample=False, **values):
+    """
+    extra برای لاگ ساختاریافته:
+        logger.info("Prices fetched", extra=fields(sample=True, source="Binance", count=5))
+    متن پیام ثابت می‌ماند و مقادیر به صورت key=value در انتهای خط نوشته می‌شوند.
+    sample=True یعنی پیام تکراری مسیر داغ است و حداکثر یک بار در هر بازه نوشته می‌شود.
+    """
+    return {"fields": values, "sample": sample}
+
+
+class SampleFilter(logging.Filter):
+    """
+    پیام‌های تکراری (sample=True یا لاگرهای SAMPLED_LOGGERS زیر سطح WARNING) را به
+    حداکثر یک رکورد در هر interval ثانیه برای هر قالب پیام محدود می‌کند.
+    تعداد پیام‌های حذف شده در رکورد بعدی به صورت suppressed=N گزارش می‌شود.
+    """
+
+    def __init__(self, interval=LOG_SAMPLE_INTERVAL, loggers=SAMPLED_LOGGERS):
+        super().__init__()
+        self.interval = interval
+        self.loggers = loggers
+        self._last = {}  # (لاگر، قالب پیام، سطح) -> [زمان آخرین ثبت، تعداد حذف شده]
+
+    def filter(self, record):
+        sampled = getattr(record, "sample", False) or (record.name in self.loggers and record.levelno < logging.WARNING)
+        if not sampled: return True
+
+        key = (record.name, record.msg, record.levelno)
+        now = time.monotonic()
+        entry = self._last.get(key)
+        if entry is not None and now - entry[0] < self.interval:
+            entry[1] += 1
+            return False
+        if entry is not None and entry[1]:
+            record.fields = {**(getattr(record, "fields", None) or {}), "suppressed": entry[1]}
+        self._last[key] = [now, 0]
+        return True
+
+
+class FieldsFormatter(logging.Formatter):
+    """فیلدهای ساختاریافته رکورد (extra=fields(...)) را به شکل key=value به انتهای پیام اضافه می‌کند."""
+
+    def formatMessage(self, record):
+        text = super().formatMessage(record)
+        values = getattr(record, "fields", None)
+        if not values: return text
+        return text + " " + " ".join(f"{k}={v}" for k, v in values.items())
+
+
+def rotating_handler(path: Path) -> logging.Handler:
+    """هندلر فایل با چرخش حجمی (پیش‌فرض) یا زمانی (LOG_ROTATE_WHEN)؛ حجم پوشه لاگ محدود می‌ماند."""
+    if LOG_ROTATE_WHEN:
+        return TimedRotatingFileHandler(path, when=LOG_ROTATE_WHEN, backupCount=LOG_BACKUPS, encoding="utf-8")
+    return RotatingFileHandler(path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS, encoding="utf-8")
+
+
+def setup_logging(service: str) -> QueueListener:
+    """
+    تمام لاگ‌های پروسه از یک QueueHandler عبور می‌کنند و نوشتن روی دیسک و کنسول در
+    ترد پس‌زمینه QueueListener انجام می‌شود؛ event loop هیچ‌وقت منتظر I/O فایل نمی‌ماند.
+    """
+    LOG_DIR.mkdir(exist_ok=True)
+    handlers = [rotating_handler(LOG_DIR / f"{service}.log")]
+    if LOG_CONSOLE: handlers.append(logging.StreamHandler(sys.stderr))
+    formatter = FieldsFormatter(LOG_FORMAT)
+    for handler in handlers: handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.addFilter(SampleFilter())
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]: root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(LOG_LEVEL)
+
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    # رکوردهای باقی‌مانده در صف قبل از خروج نوشته می‌شوند
+    atexit.register(listener.stop)
+    return listener
@@ -1,76 +1,315 @@
-import json
-from pathlib import Path
-
-import uvicorn
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import JSONResponse
-from pydantic_settings import BaseSettings, SettingsConfigDict
-
-# مسیر فایل JSON که توسط scraper.py ساخته می‌شود
-PRICE_FILE = Path(__file__).parent / "prices.json"
-
-
-class Settings(BaseSettings):
-    """
-    تنظیمات برنامه را مدیریت می‌کند. این مقادیر می‌توانند از طریق متغیرهای محیطی
-    (Environment Variables) نیز مقداردهی شوند.
-    """
-    HOST: str = "0.0.0.0"
-    PORT: int = 8000
-
-    model_config = SettingsConfigDict(arbitrary_types_allowed=True, extra='ignore')
-
-
-# یک نمونه از تنظیمات ساخته می‌شود تا در کل برنامه استفاده شود
-settings = Settings()
-
-# نمونه اصلی برنامه FastAPI
-app = FastAPI(
-    title="Price API",
-    version="2.0",
-    description="یک API برای دریافت قیمت لحظه‌ای دارایی‌ها (بیت‌کوین و طلا) از سایت CoinMarketCap",
-)
-
-
-def get_prices_from_file() -> dict:
-    """قیمت‌ها را از فایل prices.json می‌خواند."""
-    if not PRICE_FILE.exists():
-        return {}
-    try:
-        with open(PRICE_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except (json.JSONDecodeError, IOError):
-        return {}
-
-
-@app.get("/prices", summary="دریافت آخرین قیمت تمام دارایی‌ها")
-async def get_all_prices():
-    """آخرین اطلاعات قیمت استخراج شده برای تمام دارایی‌ها را برمی‌گرداند."""
-    prices = get_prices_from_file()
-    if not prices:
-        raise HTTPException(status_code=503, detail="Price data is currently unavailable. The scraper might be running.")
-    return prices
-
-
-@app.get("/price/{asset_name}", summary="دریافت قیمت یک دارایی خاص")
-async def get_price(asset_name: str):
-    """آخرین اطلاعات قیمت برای یک دارایی مشخص (مانند BTC یا GOLD) را برمی‌گرداند."""
-    prices = get_prices_from_file()
-    asset_data = prices.get(asset_name.upper())
-    if not asset_data:
-        raise HTTPException(status_code=404, detail="Asset not found")
-    return asset_data
-
-
-@app.get("/health", summary="بررسی وضعیت سلامت سرویس")
-async def health_check():
-    """یک اندپوینت ساده برای بررسی اینکه آیا سرویس در حال اجراست."""
-    prices = get_prices_from_file()
-    return {"status": "ok", "tracked_assets": list(prices.keys())}
-
-
-if __name__ == "__main__":
-    """
-    این بخش به شما اجازه می‌دهد تا برنامه را مستقیماً با دستور `python main.py` اجرا کنید.
-    """
-    uvicorn.run(app, host=settings.HOST, port=settings.PORT, log_level="info")
\ No newline at end of file
+from time import perf_counter, monotonic
+STARTED = perf_counter()  # زمان‌سنجی راه‌اندازی از قبل از importهای سنگین
+
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+from fastapi import FastAPI, HTTPException, Query, Header, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+import profiling
+import database
+from assets import registry
+from converter import Converter
+from snapshot import SnapshotWatcher, read_snapshot, write_snapshot, encode_snapshot
+from logsetup import setup_logging, fields
+
+# مسیر فایل JSON که توسط scraper.py ساخته می‌شود
+PRICE_FILE = Path(__file__).parent / "prices.json"
+DEMAND_FLUSH_INTERVAL = 2.0
+# آخرین اسنپ‌شات سرو شده برای شروع گرم بعد از ری‌استارت (حتی اگر prices.json هنوز ساخته نشده باشد)
+WARM_STATE_FILE = Path(__file__).parent / "api_state.json"
+WARM_STATE_INTERVAL = 60
+# بازه بررسی نسخه جدید برای مشترکین /prices/stream و فاصله پیام‌های keep-alive
+STREAM_POLL_INTERVAL = 0.5
+STREAM_KEEPALIVE = 15
+logger = logging.getLogger(__name__)
+
+
+class Settings(BaseSettings):
+    """
+    تنظیمات برنامه را مدیریت می‌کند. این مقادیر می‌توانند از طریق متغیرهای محیطی
+    (Environment Variables) نیز مقداردهی شوند.
+    """
+    HOST: str = "0.0.0.0"
+    PORT: int = 8000
+    # ارزهای مرجع اضافه برای تبدیل، به صورت تعداد واحد به ازای یک دلار؛ مثال: {"IRT": 60000}
+    QUOTE_CURRENCIES: dict[str, float] = {}
+    # توکن دسترسی به اندپوینت‌های دیباگ (خالی یعنی غیرفعال)
+    ADMIN_TOKEN: str = ""
+    # زمان‌سنجی درخواست‌ها؛ درخواست‌های کندتر از آستانه لاگ می‌شوند
+    PROFILING_ENABLED: bool = True
+    SLOW_HANDLER_MS: int = 500
+    # بودجه زمان راه‌اندازی (میلی‌ثانیه)؛ در صورت عبور، هشدار لاگ می‌شود (0 یعنی بدون بودجه)
+    STARTUP_BUDGET_MS: int = 2000
+
+    model_config = SettingsConfigDict(arbitrary_types_allowed=True, extra='ignore')
+
+
+# یک نمونه از تنظیمات ساخته می‌شود تا در کل برنامه استفاده شود
+settings = Settings()
+
+# تقاضای دارایی‌های سرد در حافظه جمع شده و به صورت دوره‌ای در دیتابیس ثبت می‌شود تا scraper آن‌ها را هم بگیرد
+_pending_demand = set()
+_last_demand = {}
+
+
+def note_demand(code: str):
+    """اگر دارایی در رجیستری باشد، درخواست آن برای scraper ثبت می‌شود (حداکثر یک بار در دقیقه)."""
+    if code in registry and monotonic() - _last_demand.get(code, -60) >= 60:
+        _last_demand[code] = monotonic()
+        _pending_demand.add(code)
+
+
+async def demand_flush_loop():
+    while True:
+        await asyncio.sleep(DEMAND_FLUSH_INTERVAL)
+        if not _pending_demand: continue
+        batch = list(_pending_demand)
+        _pending_demand.clear()
+        try:
+            await asyncio.to_thread(database.touch_asset_demand, *batch)
+        except Exception as e:
+            logger.warning("Could not record asset demand", extra=fields(error=e))
+
+
+_saved_version = None
+
+
+def save_warm_state():
+    global _saved_version
+    if price_watcher.snapshot is None or price_watcher.version == _saved_version: return
+    write_snapshot(WARM_STATE_FILE, price_watcher.snapshot)
+    _saved_version = price_watcher.version
+
+
+# مشترکین استریم روی یک Event مشترک منتظر می‌مانند که با انتشار هر نسخه جدید تعویض می‌شود
+_snapshot_changed = asyncio.Event()
+_stream_payload = (None, b"")
+
+
+def stream_event() -> bytes:
+    """رویداد SSE اسنپ‌شات فعلی (ساختار ستونی encode_snapshot)؛ برای هر نسخه فقط یک بار سریال‌سازی می‌شود."""
+    global _stream_payload
+    # کلید کش revision است؛ نسخه فایل بعد از ری‌ست یا برای فایل‌های قدیمی (نسخه 0) ممکن است تکرار شود
+    if _stream_payload[0] != price_watcher.revision:
+        data = encode_snapshot(price_watcher.snapshot)
+        _stream_payload = (price_watcher.revision, f"id: {price_watcher.version}\nevent: snapshot\ndata: {data}\n\n".encode("utf-8"))
+    return _stream_payload[1]
+
+
+async def snapshot_notify_loop():
+    global _snapshot_changed
+    # هندلرهای HTTP هم poll می‌کنند و ممکن است نسخه جدید را زودتر مصرف کنند؛
+    # پس ملاک، revision واچر نسبت به آخرین اطلاع‌رسانی است نه خروجی poll
+    notified = price_watcher.revision
+    while True:
+        await asyncio.sleep(STREAM_POLL_INTERVAL)
+        try:
+            price_watcher.poll()
+        except OSError as e:
+            logger.warning("Could not read price snapshot", extra=fields(error=e))
+            continue
+        if price_watcher.revision == notified: continue
+        notified = price_watcher.revision
+        event, _snapshot_changed = _snapshot_changed, asyncio.Event()
+        event.set()
+
+
+async def warm_state_loop():
+    while True:
+        await asyncio.sleep(WARM_STATE_INTERVAL)
+        try:
+            await asyncio.to_thread(save_warm_state)
+        except OSError as e:
+            logger.warning("Could not save warm state", extra=fields(error=e))
+
+
+@asynccontextmanager
+async def lifespan(app):
+    global _saved_version
+    STARTUP.mark("build")
+    # قبل از پذیرش اولین درخواست، اسنپ‌شات ذخیره شده بارگذاری و سپس با فایل فعلی مقایسه می‌شود
+    price_watcher.seed(read_snapshot(WARM_STATE_FILE))
+    _saved_version = price_watcher.version if price_watcher.snapshot else None
+    price_watcher.poll()
+    STARTUP.mark("warm_state")
+    await asyncio.to_thread(database.initialize_db)
+    STARTUP.mark("database")
+    STARTUP.report(settings.STARTUP_BUDGET_MS)
+    tasks = [asyncio.create_task(loop()) for loop in (demand_flush_loop, warm_state_loop, snapshot_notify_loop)]
+    yield
+    for task in tasks: task.cancel()
+    save_warm_state()
+
+
+# نمونه اصلی برنامه FastAPI
+app = FastAPI(
+    title="Price API",
+    version="2.0",
+    description="یک API برای دریافت قیمت لحظه‌ای دارایی‌ها (بیت‌کوین و طلا) از سایت CoinMarketCap",
+    lifespan=lifespan,
+)
+
+
+# فایل فقط وقتی دوباره خوانده می‌شود که نسخه جدیدی منتشر شده باشد
+price_watcher = SnapshotWatcher(PRICE_FILE)
+profiling.configure(settings.PROFILING_ENABLED, settings.SLOW_HANDLER_MS)
+STARTUP = profiling.PhaseTimer("api", STARTED)
+STARTUP.mark("imports")
+converter = Converter(settings.QUOTE_CURRENCIES)
+
+
+def get_prices_from_file() -> dict:
+    """آخرین قیمت‌های منتشر شده در prices.json را برمی‌گرداند (کد دارایی -> PriceEntry)."""
+    price_watcher.poll()
+    return price_watcher.prices
+
+
+_json_prices = (None, {})
+
+
+def json_prices() -> dict:
+    """بدنه پاسخ /prices؛ برای هر اسنپ‌شات فقط یک بار از PriceEntry ها ساخته می‌شود."""
+    global _json_prices
+    if _json_prices[0] != price_watcher.revision:
+        _json_prices = (price_watcher.revision, {code: entry.to_dict() for code, entry in price_watcher.prices.items()})
+    return _json_prices[1]
+
+
+@app.middleware("http")
+async def timing_middleware(request: Request, call_next):
+    """زمان هر درخواست را بر اساس الگوی مسیر (نه مسیر واقعی) ثبت می‌کند."""
+    if not profiling.ENABLED:
+        return await call_next(request)
+    start = perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    profiling.record(f"{request.method} {route.path if route else request.url.path}", perf_counter() - start)
+    return response
+
+
+@app.middleware("http")
+async def snapshot_headers(request: Request, call_next):
+    """نسخه و عمر اسنپ‌شات در هدرها؛ X-Snapshot-Stale نشان می‌دهد داده قدیمی است."""
+    response = await call_next(request)
+    if price_watcher.snapshot is not None:
+        age = price_watcher.age()
+        response.headers["X-Snapshot-Version"] = str(price_watcher.version)
+        if price_watcher.snapshot.get("ts"): response.headers["X-Snapshot-Ts"] = price_watcher.snapshot["ts"]
+        if age is not None: response.headers["X-Snapshot-Age"] = str(int(age))
+        response.headers["X-Snapshot-Stale"] = "1" if price_watcher.is_stale() else "0"
+    return response
+
+
+@app.get("/prices", summary="دریافت آخرین قیمت تمام دارایی‌ها")
+async def get_all_prices(if_none_match: str = Header("")):
+    """
+    آخرین اطلاعات قیمت استخراج شده برای تمام دارایی‌ها را برمی‌گرداند.
+    ETag همان نسخه اسنپ‌شات است؛ با If-None-Match برابر، پاسخ 304 بدون بدنه برمی‌گردد.
+    """
+    if not get_prices_from_file():
+        raise HTTPException(status_code=503, detail="Price data is currently unavailable. The scraper might be running.")
+    prices = json_prices()
+    # فایل‌های قدیمی بدون نسخه ETag ندارند
+    if not price_watcher.version: return prices
+    etag = f'"{price_watcher.version}"'
+    if etag in if_none_match:
+        return Response(status_code=304, headers={"ETag": etag})
+    return JSONResponse(prices, headers={"ETag": etag})
+
+
+@app.get("/prices/stream", summary="اشتراک رویدادهای اسنپ‌شات قیمت (Server-Sent Events)")
+async def stream_prices(request: Request, last_event_id: str = Header("")):
+    """
+    با انتشار هر نسخه جدید، کل اسنپ‌شات (با ساختار ستونی snapshot.encode_snapshot) به صورت یک رویداد SSE ارسال می‌شود.
+    اگر Last-Event-ID برابر نسخه فعلی باشد، اسنپ‌شات فعلی دوباره فرستاده نمی‌شود.
+    """
+    get_prices_from_file()
+
+    async def events():
+        # id رویداد نسخه اسنپ‌شات است، ولی تشخیص تغییر با revision واچر انجام می‌شود
+        resumed = last_event_id.isdigit() and price_watcher.version and int(last_event_id) == price_watcher.version
+        sent = price_watcher.revision if resumed else None
+        while not await request.is_disconnected():
+            # Event قبل از مقایسه گرفته می‌شود تا انتشاری بین این دو از دست نرود
+            changed = _snapshot_changed
+            if price_watcher.snapshot is not None and price_watcher.revision != sent:
+                sent = price_watcher.revision
+                yield stream_event()
+            try:
+                await asyncio.wait_for(changed.wait(), STREAM_KEEPALIVE)
+            except asyncio.TimeoutError:
+                yield b": keepalive\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+@app.get("/price/{asset_name}", summary="دریافت قیمت یک دارایی خاص")
+async def get_price(asset_name: str):
+    """آخرین اطلاعات قیمت برای یک دارایی مشخص (مانند BTC یا GOLD) را برمی‌گرداند."""
+    prices = get_prices_from_file()
+    code = asset_name.upper()
+    note_demand(code)
+    entry = prices.get(code)
+    if entry is None:
+        if code in registry:
+            # دارایی سرد است؛ در تیک بعدی scraper دریافت می‌شود
+            raise HTTPException(status_code=503, detail="Asset is warming up, retry in a few seconds", headers={"Retry-After": "5"})
+        raise HTTPException(status_code=404, detail="Asset not found")
+    return entry.to_dict()
+
+
+@app.get("/convert", summary="تبدیل مقدار بین دو دارایی یا ارز مرجع")
+async def convert(
+    amount: float,
+    from_asset: str = Query(..., alias="from"),
+    to_asset: str = Query("USD", alias="to"),
+):
+    """مثال: /convert?amount=0.5&from=BTC&to=ETH"""
+    prices = get_prices_from_file()
+    if not prices:
+        raise HTTPException(status_code=503, detail="Price data is currently unavailable. The scraper might be running.")
+    src, dst = from_asset.upper(), to_asset.upper()
+    note_demand(src)
+    note_demand(dst)
+    matrix = converter.matrix(price_watcher.revision, prices)
+    rate = matrix.rate(src, dst)
+    if rate is None:
+        if any(code in registry and code not in prices for code in (src, dst)):
+            # مثل /price: دارایی شناخته‌شده ولی سرد
+            raise HTTPException(status_code=503, detail="Asset is warming up, retry in a few seconds", headers={"Retry-After": "5"})
+        raise HTTPException(status_code=404, detail="Asset not found")
+    return {"amount": amount, "from": src, "to": dst, "rate": rate, "result": amount * rate, "version": price_watcher.version}
+
+
+@app.get("/debug/profile", summary="پروفایل کوتاه‌مدت سرویس (فقط ادمین)", response_class=PlainTextResponse)
+async def debug_profile(seconds: float = Query(10, ge=1, le=120), x_admin_token: str = Header("")):
+    """cProfile و tracemalloc را برای چند ثانیه روشن کرده و گزارش متنی برمی‌گرداند."""
+    if not settings.ADMIN_TOKEN or x_admin_token != settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Forbidden")
+    try:
+        return await profiling.profile_for(seconds)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@app.get("/health", summary="بررسی وضعیت سلامت سرویس")
+async def health_check():
+    """یک اندپوینت ساده برای بررسی اینکه آیا سرویس در حال اجراست."""
+    prices = get_prices_from_file()
+    return {"status": "ok", "tracked_assets": list(prices.keys())}
+
+
+if __name__ == "__main__":
+    """
+    این بخش به شما اجازه می‌دهد تا برنامه را مستقیماً با دستور `python main.py` اجرا کنید.
+    """
+    # uvicorn فقط برای اجرای مستقیم لازم است
+    import uvicorn
+    # log_config=None: لاگ‌های uvicorn هم از صف لاگ عبور می‌کنند و access log نمونه‌برداری می‌شود
+    setup_logging("api")
+    uvicorn.run(app, host=settings.HOST, port=settings.PORT, log_level="info", log_config=None)
\ No newline at end of file
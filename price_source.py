@@ -0,0 +1,135 @@
+"""
+منبع قیمت ربات: فایل محلی prices.json یا Price API روی یک سرور دیگر.
+
+    PRICE_SOURCE=file   # پیش‌فرض؛ خواندن prices.json کنار ربات
+    PRICE_SOURCE=api    # دریافت از PRICE_API_URL (مثلاً http://10.0.0.5:8000/prices)
+
+در حالت api ابتدا اشتراک SSE روی PRICE_API_URL/stream امتحان می‌شود؛ اگر API از آن
+پشتیبانی نکند (404)، درخواست‌های شرطی دوره‌ای با If-None-Match جایگزین آن می‌شوند.
+هر دو منبع رابط SnapshotWatcher را دارند و بقیه ربات تفاوتی نمی‌بیند.
+"""
+import asyncio
+import hashlib
+import logging
+
+import httpx
+
+from snapshot import SnapshotWatcher, decode_snapshot
+from logsetup import fields
+
+logger = logging.getLogger(__name__)
+
+# مهلت خواندن استریم؛ API هر ۱۵ ثانیه keep-alive می‌فرستد، پس سکوت طولانی‌تر یعنی اتصال قطع شده
+STREAM_READ_TIMEOUT = 45
+RETRY_MIN = 1
+RETRY_MAX = 30
+
+
+class RemoteSnapshotSource(SnapshotWatcher):
+    """
+    اسنپ‌شات را در پس‌زمینه از Price API دریافت می‌کند و poll() مثل حالت فایل
+    فقط یک بار هر نسخه جدید را برمی‌گرداند.
+    یک کلاینت httpx با اتصال keep-alive برای تمام درخواست‌ها استفاده می‌شود.
+    """
+
+    def __init__(self, url: str, interval: float = 1.0):
+        super().__init__(None)
+        self.url = url.rstrip("/")
+        self.interval = interval
+        self.streaming = True
+        self._etag = None
+        self._digest = None
+        self._pending = None
+        self._client = None
+        self._task = None
+
+    async def start(self):
+        self._client = httpx.AsyncClient(
+            timeout=httpx.Timeout(10),
+            limits=httpx.Limits(max_connections=4, max_keepalive_connections=2, keepalive_expiry=60),
+        )
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        if self._client:
+            await self._client.aclose()
+            self._client = None
+
+    def poll(self) -> dict | None:
+        snapshot, self._pending = self._pending, None
+        return snapshot
+
+    def _receive(self, snapshot: dict):
+        if self._accept(snapshot): self._pending = snapshot
+
+    async def _run(self):
+        delay = RETRY_MIN
+        while True:
+            try:
+                if self.streaming:
+                    received = await self._stream()
+                    if self.streaming:
+                        # سرور استریم را بدون خطا بست؛ اتصال دوباره هم با backoff است تا حلقه داغ نشود
+                        if received: delay = RETRY_MIN
+                        logger.info("Price stream closed", extra=fields(sample=True, events=received, retry=delay))
+                        await asyncio.sleep(delay)
+                        delay = min(delay * 2, RETRY_MAX)
+                        continue
+                else: await self._fetch()
+                delay = RETRY_MIN
+            except Exception as e:
+                # CancelledError از Exception نیست و stop() را متوقف نمی‌کند
+                logger.warning("Price API unavailable", extra=fields(sample=True, error=e, retry=delay))
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, RETRY_MAX)
+                continue
+            if not self.streaming: await asyncio.sleep(self.interval)
+
+    async def _stream(self) -> int:
+        """تا قطع اتصال، رویدادهای snapshot استریم SSE را دریافت می‌کند و تعداد آن‌ها را برمی‌گرداند."""
+        headers = {"Accept": "text/event-stream"}
+        if self.version: headers["Last-Event-ID"] = str(self.version)
+        timeout = httpx.Timeout(10, read=STREAM_READ_TIMEOUT)
+        async with self._client.stream("GET", f"{self.url}/stream", headers=headers, timeout=timeout) as response:
+            if response.status_code == 404:
+                logger.info("Price API has no stream endpoint, polling with If-None-Match")
+                self.streaming = False
+                return 0
+            response.raise_for_status()
+            logger.info("Subscribed to price stream", extra=fields(url=self.url))
+            data, received = [], 0
+            async for line in response.aiter_lines():
+                if line.startswith("data:"):
+                    data.append(line[5:].lstrip())
+                elif not line and data:
+                    self._receive(decode_snapshot("\n".join(data)))
+                    data = []
+                    received += 1
+            return received
+
+    async def _fetch(self):
+        """درخواست شرطی؛ پاسخ 304 یعنی نسخه جدیدی منتشر نشده است."""
+        headers = {"If-None-Match": self._etag} if self._etag else {}
+        response = await self._client.get(self.url, headers=headers)
+        if response.status_code == 304: return
+        response.raise_for_status()
+        self._etag = response.headers.get("ETag")
+        # بدون ETag هر بار کل پاسخ می‌آید؛ پاسخ تکراری نباید revision را جلو ببرد
+        digest = None if self._etag else hashlib.blake2b(response.content, digest_size=8).digest()
+        if digest and digest == self._digest: return
+        self._receive(decode_snapshot({
+            "version": int(response.headers.get("X-Snapshot-Version", 0)),
+            "ts": response.headers.get("X-Snapshot-Ts"),
+            "prices": response.json(),
+        }))
+        self._digest = digest
+
+
+def create_price_source(settings, path):
+    """منبع قیمت بر اساس settings.PRICE_SOURCE ("file" یا "api")"""
+    if settings.PRICE_SOURCE == "api":
+        return RemoteSnapshotSource(settings.PRICE_API_URL, settings.PRICE_POLL_INTERVAL)
+    return SnapshotWatcher(path)
@@ -0,0 +1,181 @@
+import asyncio
+import logging
+import functools
+import contextvars
+from time import perf_counter
+
+from logsetup import fields
+
+logger = logging.getLogger(__name__)
+
+# در حالت خاموش فقط یک شرط بررسی می‌شود و هیچ زمان‌سنجی انجام نمی‌شود
+ENABLED = True
+SLOW_THRESHOLD_MS = 500
+
+_current = contextvars.ContextVar("invocation", default=None)
+_stats = {}
+_profiling = False
+
+
+def configure(enabled=True, slow_threshold_ms=500):
+    global ENABLED, SLOW_THRESHOLD_MS
+    ENABLED = enabled
+    SLOW_THRESHOLD_MS = slow_threshold_ms
+
+
+class _Invocation:
+    __slots__ = ("name", "spans")
+
+    def __init__(self, name):
+        self.name = name
+        self.spans = {}
+
+
+class _Stat:
+    __slots__ = ("count", "total", "max", "slow", "spans")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.slow = 0
+        self.spans = {}
+
+
+def record(name, elapsed, spans=None):
+    """زمان یک فراخوانی (بر حسب ثانیه) را ثبت کرده و فراخوانی‌های کند را لاگ می‌کند."""
+    stat = _stats.get(name)
+    if stat is None: stat = _stats[name] = _Stat()
+    stat.count += 1
+    stat.total += elapsed
+    stat.max = max(stat.max, elapsed)
+    for kind, t in (spans or {}).items():
+        stat.spans[kind] = stat.spans.get(kind, 0.0) + t
+
+    if elapsed * 1000 >= SLOW_THRESHOLD_MS:
+        stat.slow += 1
+        breakdown = {f"{k}_ms": round(v * 1000) for k, v in (spans or {}).items()}
+        logger.warning("Slow handler", extra=fields(handler=name, ms=round(elapsed * 1000), **breakdown))
+
+
+def instrument(func):
+    """زمان اجرای یک هندلر یا job را اندازه می‌گیرد. فراخوانی‌های تو در تو جزو فراخوانی بیرونی حساب می‌شوند."""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        if not ENABLED or _current.get() is not None:
+            return await func(*args, **kwargs)
+        inv = _Invocation(func.__name__)
+        token = _current.set(inv)
+        start = perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            elapsed = perf_counter() - start
+            _current.reset(token)
+            record(inv.name, elapsed, inv.spans)
+    return wrapper
+
+
+class span:
+    """
+    زیربخش یک فراخوانی (مثلاً db، telegram یا render) را زمان‌سنجی می‌کند.
+    خارج از یک فراخوانی instrument شده هیچ کاری انجام نمی‌دهد.
+    """
+    __slots__ = ("kind", "inv", "start")
+
+    def __init__(self, kind):
+        self.kind = kind
+
+    def __enter__(self):
+        self.inv = _current.get()
+        if self.inv is not None: self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if self.inv is not None:
+            self.inv.spans[self.kind] = self.inv.spans.get(self.kind, 0.0) + perf_counter() - self.start
+        return False
+
+
+def spanned(kind):
+    """دکوراتور برای توابع sync که کل اجرای آن‌ها یک span است."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(kind): return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class PhaseTimer:
+    """
+    زمان مراحل راه‌اندازی یک سرویس (import، دیتابیس، بازیابی وضعیت و ...).
+    start باید قبل از importهای سنگین گرفته شود تا زمان آن‌ها هم حساب شود.
+    """
+
+    def __init__(self, service, start=None):
+        self.service = service
+        self.start = self._last = start if start is not None else perf_counter()
+        self.phases = {}
+
+    def mark(self, phase):
+        now = perf_counter()
+        self.phases[phase] = self.phases.get(phase, 0.0) + now - self._last
+        self._last = now
+
+    def report(self, budget_ms=0):
+        """زمان هر مرحله را لاگ می‌کند؛ در صورت عبور از بودجه، با سطح WARNING."""
+        total_ms = (self._last - self.start) * 1000
+        values = {f"{k}_ms": round(v * 1000, 1) for k, v in self.phases.items()}
+        over = budget_ms and total_ms > budget_ms
+        logger.log(logging.WARNING if over else logging.INFO, "Startup" + (" over budget" if over else ""),
+                   extra=fields(service=self.service, total_ms=round(total_ms, 1), budget_ms=budget_ms or None, **values))
+        return total_ms
+
+
+def report() -> str:
+    """خلاصه زمان‌ها برای هر هندلر، مرتب شده بر اساس مجموع زمان."""
+    lines = [f"{'name':<24}{'calls':>8}{'avg ms':>9}{'max ms':>9}{'slow':>6}  spans (avg ms)"]
+    for name, s in sorted(_stats.items(), key=lambda kv: -kv[1].total):
+        spans = " ".join(f"{k}={v * 1000 / s.count:.1f}" for k, v in s.spans.items())
+        lines.append(f"{name:<24}{s.count:>8}{s.total * 1000 / s.count:>9.1f}{s.max * 1000:>9.1f}{s.slow:>6}  {spans}")
+    return "\n".join(lines)
+
+
+async def profile_for(seconds: float, top: int = 30) -> str:
+    """
+    برای یک بازه زمانی ثابت cProfile و tracemalloc را روشن کرده و گزارش متنی برمی‌گرداند.
+    پروفایلر روی ترد event loop فعال می‌شود، پس تمام هندلرها و jobها را پوشش می‌دهد.
+    """
+    global _profiling
+    if _profiling:
+        raise RuntimeError("A profiling session is already running")
+
+    # ماژول‌های پروفایلینگ فقط هنگام نیاز بارگذاری می‌شوند
+    import io
+    import pstats
+    import cProfile
+    import tracemalloc
+
+    _profiling = True
+    profiler = cProfile.Profile()
+    started_tracemalloc = not tracemalloc.is_tracing()
+    try:
+        if started_tracemalloc: tracemalloc.start()
+        profiler.enable()
+        await asyncio.sleep(seconds)
+    finally:
+        profiler.disable()
+        snapshot = tracemalloc.take_snapshot() if tracemalloc.is_tracing() else None
+        if started_tracemalloc: tracemalloc.stop()
+        _profiling = False
+
+    out = io.StringIO()
+    out.write(f"=== Handler latency ===\n{report()}\n\n")
+    out.write(f"=== cProfile ({seconds}s, top {top} by cumulative time) ===\n")
+    pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(top)
+    if snapshot:
+        out.write(f"\n=== tracemalloc (top {top} allocation sites) ===\n")
+        for stat in snapshot.statistics("lineno")[:top]:
+            out.write(f"{stat}\n")
+    return out.getvalue()
@@ -0,0 +1,180 @@
+"""
+ضبط و بازپخش پاسخ‌های سرویس‌های بالادستی اسکرپر (صرافی‌ها، کوین‌گکو و صفحه طلا).
+
+    SCRAPER_RECORD=logs/upstream.jsonl.gz python scraper.py     # ضبط ترافیک واقعی
+    SCRAPER_REPLAY=logs/upstream.jsonl.gz python scraper.py     # بازپخش بدون شبکه
+
+تنظیمات بازپخش (متغیرهای محیطی):
+    SCRAPER_REPLAY_SPEED      ضریب سرعت؛ ۱ یعنی زمان واقعی، 0 یعنی بدون هیچ انتظاری
+    SCRAPER_REPLAY_LATENCY    تأخیر اضافه برای هر درخواست (میلی‌ثانیه)
+    SCRAPER_REPLAY_FAILURES   احتمال خطای اتصال ساختگی برای هر درخواست (۰ تا ۱)
+    SCRAPER_REPLAY_SEED       seed برای تکرارپذیر بودن خطاهای ساختگی
+
+آرشیو یک فایل gzip از خطوط JSON است؛ هر خط یک پاسخ (یا خطای شبکه) به همراه
+زمان نسبی از شروع ضبط و مدت پاسخ‌گویی است.
+"""
+import os
+import gzip
+import json
+import base64
+import random
+import asyncio
+import logging
+from collections import defaultdict, deque
+from time import monotonic
+
+import httpx
+
+from logsetup import fields
+
+logger = logging.getLogger(__name__)
+
+# پارامترهای ضد کش (مثل ?t=12345 صفحه طلا) در تطبیق درخواست‌ها نادیده گرفته می‌شوند
+IGNORED_PARAMS = {"t"}
+# فقط هدرهایی که پردازش پاسخ به آن‌ها وابسته است ذخیره می‌شوند
+KEPT_HEADERS = ("content-type", "etag", "retry-after")
+
+
+def request_key(request: httpx.Request) -> str:
+    params = sorted((k, v) for k, v in request.url.params.multi_items() if k not in IGNORED_PARAMS)
+    query = "&".join(f"{k}={v}" for k, v in params)
+    return f"{request.method} {request.url.host}{request.url.path}" + (f"?{query}" if query else "")
+
+
+def path_key(key: str) -> str:
+    return key.split("?", 1)[0]
+
+
+class RecordingTransport(httpx.AsyncBaseTransport):
+    """
+    درخواست‌ها را به ترنسپورت واقعی می‌دهد و هر پاسخ یا خطا را با زمان‌بندی در آرشیو می‌نویسد.
+    ترنسپورت داخلی یک بار ساخته می‌شود و بین کلاینت‌های هر تیک مشترک است.
+    """
+
+    def __init__(self, path, inner: httpx.AsyncBaseTransport | None = None):
+        self.path = path
+        self.inner = inner or httpx.AsyncHTTPTransport()
+        self._file = gzip.open(path, "at", encoding="utf-8")
+        self._started = monotonic()
+        self.count = 0
+
+    def _write(self, entry):
+        self._file.write(json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n")
+        self._file.flush()
+        self.count += 1
+
+    async def handle_async_request(self, request):
+        offset = monotonic() - self._started
+        start = monotonic()
+        entry = {"t": round(offset, 3), "key": request_key(request)}
+        try:
+            response = await self.inner.handle_async_request(request)
+            raw = b"".join([chunk async for chunk in response.stream])
+            await response.aclose()
+        except httpx.TransportError as e:
+            entry.update(elapsed=round(monotonic() - start, 3), error=type(e).__name__, message=str(e))
+            self._write(entry)
+            raise
+
+        entry.update(
+            elapsed=round(monotonic() - start, 3),
+            status=response.status_code,
+            headers={k: response.headers[k] for k in KEPT_HEADERS if k in response.headers},
+        )
+        # بدنه بعد از باز کردن فشرده‌سازی (gzip/br) ذخیره می‌شود؛ کلاینت همان بایت‌های خام را دریافت می‌کند
+        body = httpx.Response(response.status_code, headers=response.headers, content=raw).read()
+        try:
+            entry["body"] = body.decode("utf-8")
+        except UnicodeDecodeError:
+            entry["body_b64"] = base64.b64encode(body).decode("ascii")
+        self._write(entry)
+        return httpx.Response(response.status_code, headers=response.headers, content=raw, request=request,
+                              extensions=response.extensions)
+
+    async def aclose(self):
+        # هر تیک کلاینت خودش را می‌بندد؛ اتصال‌ها و فایل آرشیو تا پایان پروسه باز می‌مانند
+        pass
+
+    async def close(self):
+        self._file.close()
+        await self.inner.aclose()
+
+
+class ReplayTransport(httpx.AsyncBaseTransport):
+    """
+    پاسخ‌های ضبط شده را به همان ترتیب برای هر درخواست برمی‌گرداند (بعد از اتمام، از اول تکرار می‌شوند).
+    مدت پاسخ‌گویی ضبط شده با ضریب speed شبیه‌سازی می‌شود و می‌توان تأخیر و خطای ساختگی اضافه کرد.
+    """
+
+    def __init__(self, path, speed=1.0, latency=0.0, failure_rate=0.0, seed=None):
+        self.speed = speed
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed)
+        self._entries = defaultdict(list)
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip(): continue
+                entry = json.loads(line)
+                self._entries[entry["key"]].append(entry)
+                # اگر پارامترهای درخواست عوض شده باشند (مثلاً لیست دارایی‌های کوین‌گکو)، تطبیق با مسیر انجام می‌شود
+                if path_key(entry["key"]) != entry["key"]:
+                    self._entries[path_key(entry["key"])].append(entry)
+        self._queues = {}
+        self.served = 0
+        self.missing = 0
+
+    def _next(self, key):
+        queue = self._queues.get(key)
+        if not queue:
+            entries = self._entries.get(key)
+            if not entries: return None
+            queue = self._queues[key] = deque(entries)
+        return queue.popleft()
+
+    async def handle_async_request(self, request):
+        key = request_key(request)
+        entry = self._next(key) or self._next(path_key(key))
+        if entry is None:
+            self.missing += 1
+            return httpx.Response(404, text=f"No recorded response for {key}", request=request)
+
+        delay = self.latency + (entry.get("elapsed", 0) / self.speed if self.speed else 0)
+        if delay > 0: await asyncio.sleep(delay)
+
+        if self.failure_rate and self._random.random() < self.failure_rate:
+            raise httpx.ConnectError("Injected replay failure", request=request)
+        if "error" in entry:
+            error = getattr(httpx, entry["error"], httpx.TransportError)
+            raise error(entry.get("message", ""), request=request)
+
+        self.served += 1
+        content = base64.b64decode(entry["body_b64"]) if "body_b64" in entry else entry.get("body", "").encode("utf-8")
+        return httpx.Response(entry["status"], headers=entry.get("headers", {}), content=content, request=request)
+
+    async def aclose(self):
+        pass
+
+
+def transport_from_env():
+    """
+    ترنسپورت مناسب بر اساس متغیرهای محیطی SCRAPER_RECORD و SCRAPER_REPLAY
+    (در حالت عادی None، یعنی ترنسپورت پیش‌فرض httpx).
+    """
+    replay_path = os.environ.get("SCRAPER_REPLAY")
+    if replay_path:
+        transport = ReplayTransport(
+            replay_path,
+            speed=float(os.environ.get("SCRAPER_REPLAY_SPEED", 1)),
+            latency=float(os.environ.get("SCRAPER_REPLAY_LATENCY", 0)) / 1000,
+            failure_rate=float(os.environ.get("SCRAPER_REPLAY_FAILURES", 0)),
+            seed=os.environ.get("SCRAPER_REPLAY_SEED"),
+        )
+        logger.info("Replaying upstream traffic", extra=fields(path=replay_path))
+        return transport
+
+    record_path = os.environ.get("SCRAPER_RECORD")
+    if record_path:
+        logger.info("Recording upstream traffic", extra=fields(path=record_path))
+        return RecordingTransport(record_path)
+    return None
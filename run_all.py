@@ -1,55 +1,65 @@
+import os
 import subprocess
 import sys
 import time
 import logging
+import threading
 from pathlib import Path
 
-# تنظیمات لاگ
-LOG_DIR = Path(__file__).parent / "logs"
-LOG_DIR.mkdir(exist_ok=True)
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-    handlers=[
-        logging.FileHandler(LOG_DIR / "launcher.log"),
-        logging.StreamHandler()
-    ]
-)
+from logsetup import LOG_DIR, setup_logging, rotating_handler, fields
+
+# تنظیمات لاگ (فایل launcher.log با چرخش حجمی)
+setup_logging("launcher")
 
 # پیدا کردن مسیر مفسر پایتون
 # در محیط‌های مجازی cPanel، استفاده از sys.executable بهترین راه است
 PYTHON_EXECUTABLE = sys.executable
 BASE_DIR = Path(__file__).parent
 
+def pump_output(name, stream):
+    """
+    خروجی کنسول سرویس (مثلاً traceback یک کرش) را در فایل چرخشی {name}.out.log می‌نویسد.
+    لاگ‌های عادی هر سرویس مستقیماً در فایل چرخشی خودش در پوشه logs نوشته می‌شوند.
+    """
+    handler = rotating_handler(LOG_DIR / f"{name}.out.log")
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    try:
+        for line in stream:
+            handler.handle(logging.makeLogRecord({"msg": line.rstrip("\n")}))
+    finally:
+        handler.close()
+
 def start_process(name, file_path, args=None):
     """یک پروسه جدید را شروع کرده و آن را مانیتور می‌کند."""
     if args is None:
         args = []
     
     command = [PYTHON_EXECUTABLE, str(file_path)] + args
-    log_file_path = LOG_DIR / f"{name}.log"
+    # سرویس‌ها خودشان در logs/ می‌نویسند؛ کنسول آن‌ها خاموش است تا لاگ دوبار نوشته نشود
+    env = {**os.environ, "LOG_CONSOLE": "0"}
     
     try:
-        logging.info(f"Starting {name}...")
-        # باز کردن فایل لاگ در حالت append
-        log_file = open(log_file_path, "a", encoding="utf-8")
+        logging.info("Starting service", extra=fields(service=name))
         
-        # اجرای دستور و هدایت stdout و stderr به فایل لاگ
+        # اجرای دستور و هدایت stdout و stderr به ترد نویسنده فایل چرخشی
         process = subprocess.Popen(
             command,
-            stdout=log_file,
-            stderr=log_file,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
             cwd=BASE_DIR,
+            env=env,
             text=True,
             encoding='utf-8'
         )
-        logging.info(f"{name} started successfully with PID: {process.pid}. Logging to {log_file_path}")
-        return process, log_file
+        pump = threading.Thread(target=pump_output, args=(name, process.stdout), name=f"{name}-output", daemon=True)
+        pump.start()
+        logging.info("Service started", extra=fields(service=name, pid=process.pid, logs=LOG_DIR))
+        return process, pump
     except FileNotFoundError:
-        logging.error(f"Error: Could not find {PYTHON_EXECUTABLE}. Make sure you are in a virtual environment.")
+        logging.error("Could not find the Python interpreter. Make sure you are in a virtual environment.", extra=fields(python=PYTHON_EXECUTABLE))
         return None, None
     except Exception as e:
-        logging.error(f"Failed to start {name}: {e}")
+        logging.error("Failed to start service", extra=fields(service=name, error=e))
         return None, None
 
 def main():
@@ -58,11 +68,11 @@ def main():
     """
     logging.info("=============================================")
     logging.info("Starting all services in parallel...")
-    logging.info(f"Using Python interpreter: {PYTHON_EXECUTABLE}")
+    logging.info("Using Python interpreter", extra=fields(python=PYTHON_EXECUTABLE))
     logging.info("=============================================")
 
     processes = {}
-    log_files = {}
+    pumps = {}
 
     # لیست سرویس‌ها برای اجرا
     # Uvicorn از داخل main.py اجرا می‌شود و نیازی به آرگومان جدا ندارد
@@ -75,13 +85,13 @@ def main():
     try:
         for name, (path, args) in services.items():
             if not path.exists():
-                logging.error(f"File not found for service '{name}': {path}")
+                logging.error("Service file not found", extra=fields(service=name, path=path))
                 continue
             
-            proc, log_file = start_process(name, path, args)
+            proc, pump = start_process(name, path, args)
             if proc:
                 processes[name] = proc
-                log_files[name] = log_file
+                pumps[name] = pump
             time.sleep(2) # فاصله کوتاه بین اجرای سرویس‌ها
 
         if not processes:
@@ -94,7 +104,7 @@ def main():
         while True:
             for name, proc in processes.items():
                 if proc.poll() is not None:
-                    logging.warning(f"Service '{name}' has terminated unexpectedly with exit code {proc.returncode}.")
+                    logging.warning("Service terminated unexpectedly", extra=fields(service=name, code=proc.returncode))
                     # اینجا می‌توان منطق راه‌اندازی مجدد را اضافه کرد
             time.sleep(10)
 
@@ -102,20 +112,19 @@ def main():
         logging.info("\nShutdown signal received. Terminating all services...")
     finally:
         for name, proc in processes.items():
-            logging.info(f"Stopping {name} (PID: {proc.pid})...")
+            logging.info("Stopping service", extra=fields(service=name, pid=proc.pid))
             proc.terminate() # ارسال سیگنال خاتمه
             try:
                 proc.wait(timeout=5) # 5 ثانیه برای خاتمه منتظر بمان
-                logging.info(f"{name} stopped.")
+                logging.info("Service stopped", extra=fields(service=name))
             except subprocess.TimeoutExpired:
-                logging.warning(f"{name} did not terminate gracefully. Forcing shutdown...")
+                logging.warning("Service did not terminate gracefully, forcing shutdown", extra=fields(service=name))
                 proc.kill() # اگر خاتمه نیافت، آن را مجبور به توقف کن
-                logging.warning(f"{name} killed.")
+                logging.warning("Service killed", extra=fields(service=name))
         
-        # بستن فایل‌های لاگ
-        for name, log_file in log_files.items():
-            if log_file:
-                log_file.close()
+        # منتظر ماندن برای نوشته شدن آخرین خروجی سرویس‌ها
+        for name, pump in pumps.items():
+            pump.join(timeout=2)
         
         logging.info("All services have been shut down. Exiting.")
 
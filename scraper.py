@@ -1,201 +1,319 @@
-import asyncio
-import json
-import random
-import logging
-from datetime import datetime, timezone
-from pathlib import Path
-import httpx
-from bs4 import BeautifulSoup
-
-# تنظیمات فایل و لاگ
-PRICE_FILE = Path(__file__).parent / "prices.json"
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
-logger = logging.getLogger(__name__)
-
-SCRAPE_INTERVAL = 5.0  # کمی افزایش فاصله برای جلوگیری از بن شدن در کوین‌گکو
-ASSETS = ["BTC", "ETH", "BNB", "USDT", "TRX"]
-COINMARKETCAP_GOLD = "https://coinmarketcap.com/real-world-assets/gold/"
-
-# هدرهای مرورگر برای جلوگیری از تشخیص ربات
-HEADERS = {
-    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-    "Cache-Control": "no-cache",
-    "Pragma": "no-cache"
-}
-
-async def fetch_from_exchanges(client):
-    """تلاش برای دریافت قیمت از صرافی‌های مختلف به ترتیب اولویت"""
-    
-    # لیست منابع به ترتیب اولویت
-    sources = [
-        {
-            "name": "Binance",
-            "url": "https://api.binance.com/api/v3/ticker/price",
-            "map": {"BTC": "BTCUSDT", "ETH": "ETHUSDT", "BNB": "BNBUSDT", "TRX": "TRXUSDT", "USDT": "USDCUSDT"},
-            "type": "list_symbol_price"
-        },
-        {
-            "name": "Mexc",
-            "url": "https://api.mexc.com/api/v3/ticker/price",
-            "map": {"BTC": "BTCUSDT", "ETH": "ETHUSDT", "BNB": "BNBUSDT", "TRX": "TRXUSDT", "USDT": "USDCUSDT"},
-            "type": "list_symbol_price"
-        },
-        {
-            "name": "LBank",
-            "url": "https://api.lbkex.com/v2/ticker/24hr.do",
-            "map": {"BTC": "btc_usdt", "ETH": "eth_usdt", "BNB": "bnb_usdt", "TRX": "trx_usdt", "USDT": "usdt_usd"}, # USDT در البانک معمولا جفت ندارد، با ۱ جایگزین میکنیم
-            "type": "lbank_structure"
-        }
-    ]
-
-    prices = {}
-    
-    for source in sources:
-        try:
-            resp = await client.get(source["url"], timeout=4.0)
-            if resp.status_code != 200:
-                continue
-            
-            data = resp.json()
-            current_source_prices = {}
-
-            # پردازش داده بسته به ساختار API
-            if source["type"] == "list_symbol_price":
-                # ساختار بایننس و مکسی: [{'symbol': 'BTCUSDT', 'price': '90000'}]
-                market_map = {item['symbol']: float(item['price']) for item in data}
-                for asset in ASSETS:
-                    pair = source["map"].get(asset)
-                    if asset == "USDT": 
-                        prices[asset] = 1.0 # تتر همیشه ۱ فرض می‌شود
-                    elif pair in market_map:
-                        prices[asset] = market_map[pair]
-
-            elif source["type"] == "lbank_structure":
-                # ساختار البانک: {'data': [{'symbol': 'btc_usdt', 'ticker': {'latest': '...'}}]}
-                if 'data' in data:
-                    market_map = {item['symbol']: float(item['ticker']['latest']) for item in data['data']}
-                    for asset in ASSETS:
-                        pair = source["map"].get(asset)
-                        if asset == "USDT": prices[asset] = 1.0
-                        elif pair in market_map: prices[asset] = market_map[pair]
-
-            # اگر اکثر قیمت‌ها پیدا شدند، لوپ را می‌شکنیم و برمی‌گردیم
-            if len(prices) >= len(ASSETS) - 1:
-                logger.info(f"Prices fetched from {source['name']}")
-                return prices
-
-        except Exception as e:
-            logger.warning(f"Failed to fetch from {source['name']}: {e}")
-            continue
-            
-    return prices
-
-async def fetch_from_coingecko(client):
-    """منبع آخر: کوین گکو (اگر همه صرافی‌ها فیلتر بودند)"""
-    url = "https://api.coingecko.com/api/v3/simple/price?ids=bitcoin,ethereum,binancecoin,tether,tron&vs_currencies=usd"
-    cg_map = {"bitcoin": "BTC", "ethereum": "ETH", "binancecoin": "BNB", "tether": "USDT", "tron": "TRX"}
-    prices = {}
-    try:
-        resp = await client.get(url, timeout=5.0)
-        if resp.status_code == 200:
-            data = resp.json()
-            for cg_id, asset_code in cg_map.items():
-                if cg_id in data:
-                    prices[asset_code] = float(data[cg_id]["usd"])
-            logger.info("Prices fetched from CoinGecko (Fallback)")
-    except Exception as e:
-        logger.warning(f"CoinGecko failed: {e}")
-    return prices
-
-def extract_gold(html):
-    """استخراج قیمت طلا از HTML"""
-    try:
-        soup = BeautifulSoup(html, "html.parser")
-        # روش ۱: سلکتورهای CSS
-        tag = soup.select_one("div.priceValue, span[data-test='text-cdp-price-display'], div.sc-142c02c-0.lmjbLF")
-        if tag: return tag.text
-        
-        # روش ۲: پیدا کردن الگوی قیمت در کل متن
-        import re
-        match = re.search(r"\$\d{1,3}(,\d{3})*(\.\d+)?", html)
-        if match: return match.group(0)
-    except Exception:
-        pass
-    return None
-
-def normalize(val):
-    if val is None: return None, None
-    try:
-        if isinstance(val, str):
-            # حذف علامت دلار و کاما
-            num = float(val.replace('$', '').replace(',', ''))
-        else:
-            num = float(val)
-        return f"${num:,.2f}", num
-    except:
-        return None, None
-
-async def run_scraper():
-    logger.info("Scraper started with Multi-Layer Fallback strategy...")
-    while True:
-        final_data = {}
-        ts = datetime.now(timezone.utc).isoformat()
-        
-        async with httpx.AsyncClient(headers=HEADERS, timeout=10.0, follow_redirects=True) as client:
-            
-            # 1. تلاش برای دریافت کریپتو (لایه ۱ و ۲ و ۳)
-            crypto_prices = await fetch_from_exchanges(client)
-            
-            # 2. اگر کریپتو پیدا نشد، تلاش با کوین‌گکو (لایه ۴)
-            if not crypto_prices or len(crypto_prices) < 3:
-                logger.warning("Exchanges failed, trying CoinGecko...")
-                crypto_prices = await fetch_from_coingecko(client)
-
-            # استانداردسازی داده‌های کریپتو
-            for asset in ASSETS:
-                val = crypto_prices.get(asset)
-                p_str, p_num = normalize(val)
-                
-                if p_str:
-                    final_data[asset] = {"price": p_str, "price_num": p_num, "ts": ts}
-                    print(f"✅ {asset}: {p_str}")
-                else:
-                    final_data[asset] = {"price": None, "price_num": None, "ts": ts, "error": "Failed"}
-                    print(f"❌ {asset}: Failed")
-
-            # 3. دریافت قیمت طلا (جداگانه)
-            try:
-                # اضافه کردن پارامتر تصادفی برای دور زدن کش
-                url = f"{COINMARKETCAP_GOLD}?t={random.randint(1,99999)}"
-                resp = await client.get(url)
-                raw_gold = extract_gold(resp.text)
-                g_str, g_num = normalize(raw_gold)
-                
-                if g_str:
-                    final_data["GOLD"] = {"price": g_str, "price_num": g_num, "ts": ts}
-                    print(f"✅ GOLD: {g_str}")
-                else:
-                    final_data["GOLD"] = {"price": None, "ts": ts}
-            except Exception as e:
-                logger.error(f"Gold fetch error: {e}")
-                final_data["GOLD"] = {"price": None, "ts": ts}
-
-        # ذخیره در فایل
-        try:
-            with open(PRICE_FILE, "w", encoding="utf-8") as f:
-                json.dump(final_data, f, ensure_ascii=False, indent=4)
-        except Exception as e:
-            logger.error(f"File save error: {e}")
-        
-        await asyncio.sleep(SCRAPE_INTERVAL)
-
-if __name__ == "__main__":
-    # تنظیم مخصوص ویندوز برای جلوگیری از ارورهای Event Loop
-    import sys
-    if sys.platform == 'win32':
-        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
-    
-    try:
-        asyncio.run(run_scraper())
-    except KeyboardInterrupt:
-        print("Scraper stopped.")
\ No newline at end of file
+from time import perf_counter
+STARTED = perf_counter()  # زمان‌سنجی راه‌اندازی از قبل از importهای سنگین
+
+import os
+import re
+import socket
+import sqlite3
+import asyncio
+import random
+import logging
+from datetime import datetime, timezone
+from pathlib import Path
+import httpx
+
+import profiling
+from snapshot import SnapshotWriter, PriceEntry
+from logsetup import setup_logging, fields
+from replay import transport_from_env, ReplayTransport, RecordingTransport
+from assets import registry
+from converter import format_price
+from database import initialize_db, get_demanded_assets, acquire_lease, release_lease
+
+# تنظیمات فایل و لاگ (پیکربندی لاگ در logsetup.py)
+PRICE_FILE = Path(__file__).parent / "prices.json"
+logger = logging.getLogger(__name__)
+
+SCRAPE_INTERVAL = 5.0  # کمی افزایش فاصله برای جلوگیری از بن شدن در کوین‌گکو
+# چند نمونه scraper می‌توانند هم‌زمان اجرا شوند؛ فقط دارنده lease درخواست می‌فرستد و منتشر می‌کند
+LEASE_NAME = "scraper"
+SCRAPER_ID = os.environ.get("SCRAPER_ID") or f"{socket.gethostname()}:{os.getpid()}"
+COINGECKO_URL = "https://api.coingecko.com/api/v3/simple/price"
+COINMARKETCAP_GOLD = "https://coinmarketcap.com/real-world-assets/gold/"
+GOLD_PRICE_RE = re.compile(r"\$\d{1,3}(,\d{3})*(\.\d+)?")
+
+# هدرهای مرورگر برای جلوگیری از تشخیص ربات
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Cache-Control": "no-cache",
+    "Pragma": "no-cache"
+}
+
+# لیست منابع صرافی‌ها به ترتیب اولویت
+# نماد هر دارایی در هر صرافی از رجیستری دارایی‌ها (assets.json) خوانده می‌شود
+EXCHANGE_SOURCES = [
+    {
+        "name": "Binance",
+        "url": "https://api.binance.com/api/v3/ticker/price",
+        "type": "list_symbol_price"
+    },
+    {
+        "name": "Mexc",
+        "url": "https://api.mexc.com/api/v3/ticker/price",
+        "type": "list_symbol_price"
+    },
+    {
+        "name": "LBank",
+        "url": "https://api.lbkex.com/v2/ticker/24hr.do",
+        "type": "lbank_structure"
+    }
+]
+
+def parse_exchange_payload(source, data, assets):
+    """پاسخ JSON یک صرافی را برای دارایی‌های خواسته شده به دیکشنری {دارایی: قیمت} تبدیل می‌کند."""
+    prices = {}
+    # فقط جفت‌ارزهای مورد نیاز بررسی می‌شوند، نه تمام بازارهای صرافی
+    wanted = {}
+    for asset in assets:
+        if asset.fixed_usd is not None: prices[asset.code] = asset.fixed_usd # مثلاً تتر همیشه ۱ فرض می‌شود
+        elif source["name"] in asset.symbols: wanted[asset.symbols[source["name"]]] = asset.code
+
+    # پردازش داده بسته به ساختار API
+    if source["type"] == "list_symbol_price":
+        # ساختار بایننس و مکسی: [{'symbol': 'BTCUSDT', 'price': '90000'}]
+        for item in data:
+            code = wanted.get(item['symbol'])
+            if code: prices[code] = float(item['price'])
+
+    elif source["type"] == "lbank_structure":
+        # ساختار البانک: {'data': [{'symbol': 'btc_usdt', 'ticker': {'latest': '...'}}]}
+        for item in data.get('data', ()):
+            code = wanted.get(item['symbol'])
+            if code: prices[code] = float(item['ticker']['latest'])
+
+    return prices
+
+async def fetch_from_exchanges(client, assets):
+    """تلاش برای دریافت قیمت از صرافی‌های مختلف به ترتیب اولویت"""
+    prices = {}
+    
+    for source in EXCHANGE_SOURCES:
+        try:
+            resp = await client.get(source["url"], timeout=4.0)
+            if resp.status_code != 200:
+                continue
+            
+            prices.update(parse_exchange_payload(source, resp.json(), assets))
+
+            # اگر اکثر قیمت‌ها پیدا شدند، لوپ را می‌شکنیم و برمی‌گردیم
+            if len(prices) >= len(assets) - 1:
+                logger.info("Prices fetched", extra=fields(sample=True, source=source["name"], count=len(prices)))
+                return prices
+
+        except Exception as e:
+            logger.warning("Exchange fetch failed", extra=fields(sample=True, source=source["name"], error=e))
+            continue
+            
+    return prices
+
+async def fetch_from_coingecko(client, assets):
+    """منبع آخر: کوین گکو (اگر همه صرافی‌ها فیلتر بودند)"""
+    cg_map = {a.coingecko: a.code for a in assets if a.coingecko}
+    prices = {a.code: a.fixed_usd for a in assets if a.fixed_usd is not None}
+    if not cg_map: return prices
+    try:
+        resp = await client.get(COINGECKO_URL, params={"ids": ",".join(cg_map), "vs_currencies": "usd"}, timeout=5.0)
+        if resp.status_code == 200:
+            data = resp.json()
+            for cg_id, asset_code in cg_map.items():
+                if cg_id in data:
+                    prices[asset_code] = float(data[cg_id]["usd"])
+            logger.info("Prices fetched from CoinGecko (Fallback)")
+    except Exception as e:
+        logger.warning("CoinGecko failed", extra=fields(sample=True, error=e))
+    return prices
+
+async def get_wanted_assets():
+    """
+    فقط دارایی‌هایی که کسی به آن‌ها نیاز دارد اسکرپ می‌شوند: پیش‌فرض‌ها به علاوه
+    دارایی‌های گروه‌ها، هشدارها و درخواست‌های اخیر API/ربات.
+    """
+    try:
+        demanded = await asyncio.to_thread(get_demanded_assets)
+    except Exception as e:
+        logger.warning("Could not read asset demand, using defaults", extra=fields(error=e))
+        demanded = set()
+    codes = set(registry.defaults)
+    codes.update(c for c in demanded if c in registry)
+    return [registry.get(c) for c in registry.sort(codes)]
+
+def extract_gold(html):
+    """استخراج قیمت طلا از HTML"""
+    try:
+        # BeautifulSoup فقط وقتی طلا فعال است و اولین بار لازم شود بارگذاری می‌شود
+        from bs4 import BeautifulSoup
+        soup = BeautifulSoup(html, "html.parser")
+        # روش ۱: سلکتورهای CSS
+        tag = soup.select_one("div.priceValue, span[data-test='text-cdp-price-display'], div.sc-142c02c-0.lmjbLF")
+        if tag: return tag.text
+        
+        # روش ۲: پیدا کردن الگوی قیمت در کل متن
+        match = GOLD_PRICE_RE.search(html)
+        if match: return match.group(0)
+    except Exception:
+        pass
+    return None
+
+def normalize(val):
+    if val is None: return None, None
+    try:
+        if isinstance(val, str):
+            # حذف علامت دلار و کاما
+            num = float(val.replace('$', '').replace(',', ''))
+        else:
+            num = float(val)
+        return f"${format_price(num)}", num
+    except:
+        return None, None
+
+def make_entry(val, ts):
+    """مقدار خام را اعتبارسنجی کرده و PriceEntry می‌سازد؛ مقدار نامعتبر (صفر، منفی، NaN) ناموفق ثبت می‌شود."""
+    p_str, p_num = normalize(val)
+    if not p_str: return PriceEntry.failed(ts)
+    try:
+        return PriceEntry(p_str, p_num, ts)
+    except ValueError:
+        return PriceEntry.failed(ts, "Invalid")
+
+async def scrape_once(client, wanted, ts):
+    """یک دور کامل دریافت قیمت دارایی‌های خواسته شده؛ خروجی کد دارایی -> PriceEntry است."""
+    final_data = {}
+    crypto_assets = [a for a in wanted if a.source is None]
+
+    # 1. تلاش برای دریافت کریپتو (لایه ۱ و ۲ و ۳)
+    crypto_prices = await fetch_from_exchanges(client, crypto_assets)
+    
+    # 2. اگر کریپتو پیدا نشد، تلاش با کوین‌گکو (لایه ۴)
+    if not crypto_prices or len(crypto_prices) < min(3, len(crypto_assets)):
+        logger.warning("Exchanges failed, trying CoinGecko", extra=fields(sample=True))
+        crypto_prices = await fetch_from_coingecko(client, crypto_assets)
+
+    # استانداردسازی داده‌های کریپتو
+    for asset in (a.code for a in crypto_assets):
+        final_data[asset] = make_entry(crypto_prices.get(asset), ts)
+
+    # 3. دریافت قیمت طلا (جداگانه)
+    if any(a.source == "gold" for a in wanted):
+        try:
+            # اضافه کردن پارامتر تصادفی برای دور زدن کش
+            url = f"{COINMARKETCAP_GOLD}?t={random.randint(1,99999)}"
+            resp = await client.get(url)
+            final_data["GOLD"] = make_entry(extract_gold(resp.text), ts)
+        except Exception as e:
+            logger.error("Gold fetch failed", extra=fields(sample=True, error=e))
+            final_data["GOLD"] = PriceEntry.failed(ts, type(e).__name__)
+
+    return final_data
+
+class Lease:
+    """
+    lease انتشار در SQLite. نمونه فعال هر ttl/3 ثانیه آن را تمدید می‌کند و نمونه‌های
+    آماده‌به‌کار با همان فاصله برای گرفتنش تلاش می‌کنند؛ با توقف نمونه فعال، حداکثر
+    بعد از ttl + ttl/3 یک نمونه دیگر جایگزین می‌شود.
+    """
+
+    def __init__(self, name, holder, ttl):
+        self.name = name
+        self.holder = holder
+        self.ttl = ttl
+        self.held = False
+        self.acquired = asyncio.Event()
+
+    async def renew(self) -> bool:
+        try:
+            held = await asyncio.to_thread(acquire_lease, self.name, self.holder, self.ttl)
+        except sqlite3.Error as e:
+            logger.warning("Lease check failed", extra=fields(sample=True, error=e))
+            held = False
+        if held and not self.held:
+            logger.info("Lease acquired, publishing", extra=fields(holder=self.holder, ttl=round(self.ttl, 2)))
+        elif self.held and not held:
+            logger.warning("Lease lost, standing by", extra=fields(holder=self.holder))
+        self.held = held
+        if held: self.acquired.set()
+        else: self.acquired.clear()
+        return held
+
+    async def keep(self):
+        while True:
+            await self.renew()
+            await asyncio.sleep(self.ttl / 3)
+
+    async def release(self):
+        if self.held:
+            self.held = False
+            await asyncio.to_thread(release_lease, self.name, self.holder)
+
+async def run_scraper():
+    logger.info("Scraper started with Multi-Layer Fallback strategy...")
+    startup = profiling.PhaseTimer("scraper", STARTED)
+    startup.mark("imports")
+    writer = SnapshotWriter(PRICE_FILE)
+    initialize_db()
+    startup.mark("database")
+    # در حالت ضبط یا بازپخش (SCRAPER_RECORD / SCRAPER_REPLAY) ترنسپورت httpx جایگزین می‌شود
+    transport = transport_from_env()
+    interval = SCRAPE_INTERVAL
+    if isinstance(transport, ReplayTransport):
+        interval = SCRAPE_INTERVAL / transport.speed if transport.speed else 0
+    # ttl کوتاه‌تر از فاصله تیک است تا جایگزینی نمونه متوقف شده در کمتر از یک تیک انجام شود
+    lease = Lease(LEASE_NAME, SCRAPER_ID, max(interval * 2 / 3, 1.0))
+    await lease.renew()
+    if not lease.held:
+        logger.info("Another scraper holds the lease, standing by", extra=fields(holder=SCRAPER_ID))
+    lease_task = asyncio.create_task(lease.keep())
+    active = lease.held
+    startup.report()
+    try:
+        while True:
+            if not lease.held:
+                # نمونه آماده‌به‌کار هیچ درخواستی به سرویس‌های بالادستی نمی‌فرستد
+                active = False
+                await lease.acquired.wait()
+                continue
+            if not active:
+                # نسخه فعلی فایل را نمونه قبلی منتشر کرده است؛ نسخه‌ها از همان‌جا ادامه می‌یابند
+                writer = SnapshotWriter(PRICE_FILE)
+                active = True
+
+            ts = datetime.now(timezone.utc).isoformat()
+            wanted = await get_wanted_assets()
+            
+            async with httpx.AsyncClient(headers=HEADERS, timeout=10.0, follow_redirects=True, transport=transport) as client:
+                final_data = await scrape_once(client, wanted, ts)
+
+            # به جای یک خط برای هر دارایی در هر تیک، یک خلاصه نمونه‌برداری شده ثبت می‌شود
+            failed = [code for code, entry in final_data.items() if entry.price is None]
+            if failed:
+                logger.warning("Assets missing", extra=fields(sample=True, assets=",".join(failed)))
+
+            # اگر در طول تیک lease از دست رفته باشد، نمونه دیگری منتشر می‌کند
+            if not await lease.renew(): continue
+
+            # ذخیره اتمیک در فایل (فقط اگر قیمتی تغییر کرده باشد یا زمان heartbeat رسیده باشد)
+            try:
+                if writer.publish(final_data):
+                    logger.info("Snapshot published", extra=fields(sample=True, version=writer.version, assets=len(final_data) - len(failed)))
+            except Exception as e:
+                logger.error("File save error", extra=fields(error=e))
+            
+            await asyncio.sleep(interval)
+    finally:
+        lease_task.cancel()
+        # lease آزاد می‌شود تا نمونه آماده‌به‌کار بدون انتظار برای انقضا جایگزین شود
+        await lease.release()
+        if isinstance(transport, RecordingTransport):
+            await transport.close()
+            logger.info("Recorded upstream responses", extra=fields(count=transport.count, path=transport.path))
+
+if __name__ == "__main__":
+    # تنظیم مخصوص ویندوز برای جلوگیری از ارورهای Event Loop
+    import sys
+    if sys.platform == 'win32':
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+    
+    setup_logging("scraper")
+    try:
+        asyncio.run(run_scraper())
+    except KeyboardInterrupt:
+        logger.info("Scraper stopped.")
\ No newline at end of file
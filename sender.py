@@ -0,0 +1,199 @@
+import asyncio
+import heapq
+import logging
+import itertools
+from collections import deque
+
+from telegram.error import RetryAfter
+
+from profiling import span
+from logsetup import fields
+
+logger = logging.getLogger(__name__)
+
+# اولویت‌ها: هشدار قیمت > پاسخ تعاملی > پست زمان‌بندی شده
+PRIORITY_ALERT = 0
+PRIORITY_INTERACTIVE = 1
+PRIORITY_POST = 2
+LANE_NAMES = ("alert", "interactive", "post")
+
+# محدودیت‌های تلگرام: حدود ۳۰ پیام در ثانیه در کل، ۱ پیام در ثانیه در هر چت خصوصی
+# و ۲۰ پیام در دقیقه در هر گروه
+GLOBAL_RATE = 30.0
+PRIVATE_RATE = 1.0
+GROUP_RATE = 20 / 60
+MAX_RETRIES = 5
+MAX_IN_FLIGHT = 16
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated", "blocked_until")
+
+    def __init__(self, rate, capacity, now):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+        self.blocked_until = 0.0
+
+    def delay(self, now) -> float:
+        """چند ثانیه تا در دسترس بودن توکن بعدی باقی مانده است (۰ یعنی همین الان)."""
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def consume(self):
+        self.tokens -= 1
+
+    def is_idle(self, now) -> bool:
+        return now >= self.blocked_until and self.tokens + (now - self.updated) * self.rate >= self.capacity
+
+
+class _Request:
+    __slots__ = ("priority", "chat_id", "func", "args", "kwargs", "future", "attempts")
+
+    def __init__(self, priority, chat_id, func, args, kwargs, future):
+        self.priority = priority
+        self.chat_id = chat_id
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.future = future
+        self.attempts = 0
+
+
+class SendScheduler:
+    """
+    زمان‌بند مرکزی تمام فراخوانی‌های خروجی به API تلگرام.
+    محدودیت کلی و محدودیت هر چت با token bucket اعمال می‌شود، خطای 429 با
+    رعایت retry_after دوباره تلاش می‌شود و هشدارها هیچ‌وقت پشت پست‌های گروهی
+    صف نمی‌کشند.
+    chat_id برابر None برای فراخوانی‌هایی است که پیام چت نیستند (مثل answerCallbackQuery)
+    و فقط محدودیت کلی و مدیریت 429 را می‌گیرند.
+    """
+
+    def __init__(self, global_rate=GLOBAL_RATE, private_rate=PRIVATE_RATE, group_rate=GROUP_RATE):
+        self.private_rate = private_rate
+        self.group_rate = group_rate
+        self._lanes = [deque() for _ in LANE_NAMES]
+        self._delayed = []  # heap: (زمان آماده شدن، ترتیب، درخواست)
+        self._seq = itertools.count()
+        self._global = None
+        self._global_rate = global_rate
+        self._chats = {}
+        self._wakeup = asyncio.Event()
+        self._in_flight = asyncio.Semaphore(MAX_IN_FLIGHT)
+        self._tasks = set()
+        self._worker = None
+
+    async def start(self):
+        self._global = TokenBucket(self._global_rate, self._global_rate, self._now())
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._worker:
+            self._worker.cancel()
+            self._worker = None
+
+    def _now(self):
+        return asyncio.get_running_loop().time()
+
+    def submit_nowait(self, priority, chat_id, func, /, *args, **kwargs) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        self._lanes[priority].append(_Request(priority, chat_id, func, args, kwargs, future))
+        self._wakeup.set()
+        return future
+
+    async def submit(self, priority, chat_id, func, /, *args, **kwargs):
+        """
+        فراخوانی را در صف اولویت مربوطه قرار داده و منتظر نتیجه آن می‌ماند.
+        پارامترهای زمان‌بند positional-only هستند تا با chat_id خود فراخوانی تداخل نداشته باشند.
+        """
+        with span("telegram"):
+            return await self.submit_nowait(priority, chat_id, func, *args, **kwargs)
+
+    def depth(self) -> dict:
+        depth = {name: len(lane) for name, lane in zip(LANE_NAMES, self._lanes)}
+        for _, _, req in self._delayed: depth[LANE_NAMES[req.priority]] += 1
+        return depth
+
+    def _bucket(self, chat_id, now):
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) > 10_000:
+                # باکت‌های پر و بیکار اطلاعاتی ندارند و حذف می‌شوند
+                self._chats = {k: b for k, b in self._chats.items() if not b.is_idle(now)}
+            rate = self.group_rate if int(chat_id) < 0 else self.private_rate
+            bucket = self._chats[chat_id] = TokenBucket(rate, 3, now)
+        return bucket
+
+    def _defer(self, req, ready_at):
+        heapq.heappush(self._delayed, (ready_at, next(self._seq), req))
+
+    def _promote(self, now):
+        # درخواست‌های آماده شده به ابتدای صف خودشان برمی‌گردند
+        ready = [[] for _ in LANE_NAMES]
+        while self._delayed and self._delayed[0][0] <= now:
+            ready[self._delayed[0][2].priority].append(heapq.heappop(self._delayed)[2])
+        for lane, reqs in zip(self._lanes, ready):
+            lane.extendleft(reversed(reqs))
+
+    def _next(self):
+        for lane in self._lanes:
+            if lane: return lane.popleft()
+        return None
+
+    async def _run(self):
+        while True:
+            now = self._now()
+            self._promote(now)
+            req = self._next()
+            if req is not None and req.future.done():
+                continue  # فرستنده منصرف شده است
+            if req is None:
+                self._wakeup.clear()
+                timeout = self._delayed[0][0] - now if self._delayed else None
+                try: await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError: pass
+                continue
+
+            bucket = self._bucket(req.chat_id, now) if req.chat_id is not None else None
+            wait = bucket.delay(now) if bucket else 0
+            if wait > 0:
+                self._defer(req, now + wait)
+                continue
+
+            wait = self._global.delay(now)
+            if wait > 0:
+                self._lanes[req.priority].appendleft(req)
+                await asyncio.sleep(wait)
+                continue
+
+            if bucket: bucket.consume()
+            self._global.consume()
+            await self._in_flight.acquire()
+            task = asyncio.create_task(self._execute(req))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _execute(self, req):
+        try:
+            result = await req.func(*req.args, **req.kwargs)
+            if not req.future.done(): req.future.set_result(result)
+        except RetryAfter as e:
+            req.attempts += 1
+            retry_after = e.retry_after.total_seconds() if hasattr(e.retry_after, "total_seconds") else float(e.retry_after)
+            logger.warning("Flood control", extra=fields(chat=req.chat_id, retry_after=retry_after, attempt=req.attempts))
+            if req.attempts > MAX_RETRIES:
+                if not req.future.done(): req.future.set_exception(e)
+            else:
+                ready_at = self._now() + retry_after
+                if req.chat_id is not None: self._bucket(req.chat_id, self._now()).blocked_until = ready_at
+                self._defer(req, ready_at)
+                self._wakeup.set()
+        except Exception as e:
+            if not req.future.done(): req.future.set_exception(e)
+        finally:
+            self._in_flight.release()
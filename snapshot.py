@@ -0,0 +1,280 @@
+import json
+import os
+import math
+import time
+import tempfile
+import logging
+from datetime import datetime, timezone
+from pathlib import Path
+
+from logsetup import fields
+
+logger = logging.getLogger(__name__)
+
+# اسنپ‌شاتی که قدیمی‌تر از این (ثانیه) باشد با نشانگر «قدیمی» نمایش داده می‌شود
+STALE_AFTER = 120
+# عقب رفتن نسخه بیش از این مقدار یعنی شمارنده نویسنده از نو شروع شده است (مثلاً بعد از پاک شدن فایل)
+RESET_GAP = 10
+
+# ساختار اسنپ‌شات در حافظه (در scraper، ربات و API):
+# {"version": 12, "ts": "...", "prices": {"BTC": PriceEntry(...), ...}}
+# در پاسخ API هر PriceEntry با to_dict به {"price": "$...", "price_num": ..., "ts": "..."} تبدیل می‌شود.
+# هر دارایی همیشه price، price_num و ts دارد؛ دارایی ناموفق price و price_num برابر None و error دارد.
+#
+# ساختار ستونی روی دیسک و استریم (encode_snapshot)؛ زمان مشترک تیک فقط یک بار نوشته می‌شود:
+# {"format": 2, "version": 12, "ts": "...", "tick": "...", "codes": [...], "price": [...], "num": [...], "errors": {...}}
+SNAPSHOT_FORMAT = 2
+
+
+class PriceEntry:
+    """
+    قیمت یک دارایی در اسنپ‌شات؛ مدل مشترک scraper، ربات و API. price رشته نمایشی از پیش
+    فرمت شده است تا هیچ خواننده‌ای دوباره فرمت نکند. اعتبارسنجی فقط هنگام ساخت در scraper
+    و خواندن فرمت‌های قدیمی انجام می‌شود؛ فرمت ستونی را فقط encode_snapshot از ورودی‌های
+    معتبر می‌نویسد و بدون اعتبارسنجی دوباره خوانده می‌شود.
+    """
+    __slots__ = ("price", "price_num", "ts", "error")
+
+    def __init__(self, price: str | None, price_num: float | None, ts: str, error: str | None = None):
+        if price_num is None:
+            if price is not None: raise ValueError("Price text without a numeric price")
+            error = error or "Failed"
+        elif not isinstance(price, str) or not math.isfinite(price_num) or price_num <= 0:
+            raise ValueError(f"Invalid price: {price!r} / {price_num!r}")
+        self.price = price
+        self.price_num = price_num
+        self.ts = ts
+        self.error = error
+
+    @classmethod
+    def failed(cls, ts: str, error: str = "Failed") -> "PriceEntry":
+        return cls(None, None, ts, error)
+
+    @classmethod
+    def coerce(cls, price, price_num, ts, error=None) -> "PriceEntry":
+        """برای داده خوانده شده از فایل یا شبکه؛ مقدار نامعتبر (مثلاً در فایل‌های قدیمی) ناموفق ثبت می‌شود."""
+        try:
+            return cls(price, price_num, ts, error)
+        except (ValueError, TypeError):
+            return cls.failed(ts, "Invalid")
+
+    @classmethod
+    def from_dict(cls, data: dict | None) -> "PriceEntry":
+        data = data or {}
+        return cls.coerce(data.get("price"), data.get("price_num"), data.get("ts"), data.get("error"))
+
+    def to_dict(self) -> dict:
+        data = {"price": self.price, "price_num": self.price_num, "ts": self.ts}
+        if self.error: data["error"] = self.error
+        return data
+
+
+def encode_snapshot(snapshot: dict) -> str:
+    """اسنپ‌شات را به شکل ستونی و فشرده (حدود نصف JSON تو در تو) سریال می‌کند."""
+    prices = snapshot["prices"]
+    codes = list(prices)
+    entries = [prices[c] for c in codes]
+    tss = {e.ts for e in entries}
+    data = {
+        "format": SNAPSHOT_FORMAT,
+        "version": snapshot["version"],
+        "ts": snapshot["ts"],
+        "tick": tss.pop() if len(tss) == 1 else None,
+        "codes": codes,
+        "price": [e.price for e in entries],
+        "num": [e.price_num for e in entries],
+    }
+    if data["tick"] is None and entries: data["tss"] = [e.ts for e in entries]
+    errors = {c: e.error for c, e in zip(codes, entries) if e.error}
+    if errors: data["errors"] = errors
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+def decode_snapshot(data) -> dict:
+    """
+    اسنپ‌شات ستونی (یا JSON تو در توی قدیمی) را به ساختار اسنپ‌شات با PriceEntry برمی‌گرداند.
+    data می‌تواند رشته/بایت یا دیکشنری از قبل parse شده باشد.
+    """
+    if isinstance(data, (str, bytes)): data = json.loads(data)
+    if data.get("format") == SNAPSHOT_FORMAT:
+        tss = data.get("tss") or [data["tick"]] * len(data["codes"])
+        # این فرمت را فقط encode_snapshot از ورودی‌های معتبر می‌نویسد؛ ساخت بدون __init__ و اعتبارسنجی دوباره
+        new = object.__new__
+        prices = {}
+        for code, price, num, ts in zip(data["codes"], data["price"], data["num"], tss):
+            entry = prices[code] = new(PriceEntry)
+            entry.price = price
+            entry.price_num = num
+            entry.ts = ts
+            entry.error = None
+        for code, error in data.get("errors", {}).items(): prices[code].error = error
+        return {"version": data["version"], "ts": data["ts"], "prices": prices}
+    # سازگاری با فایل‌های قدیمی که فقط دیکشنری قیمت‌ها بودند
+    if "prices" not in data:
+        data = {"version": 0, "ts": None, "prices": data}
+    prices = {code: PriceEntry.from_dict(entry) for code, entry in data["prices"].items()}
+    return {"version": data.get("version", 0), "ts": data.get("ts"), "prices": prices}
+
+
+def read_snapshot(path: Path) -> dict | None:
+    """اسنپ‌شات را از فایل می‌خواند. در صورت نبود یا خرابی فایل None برمی‌گرداند."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return decode_snapshot(f.read())
+    except (FileNotFoundError, json.JSONDecodeError, KeyError, IOError):
+        return None
+
+
+def write_snapshot(path: Path, snapshot: dict) -> None:
+    write_text_atomic(path, encode_snapshot(snapshot))
+
+
+def write_json_atomic(path: Path, data) -> None:
+    """داده را فشرده در یک فایل موقت نوشته و سپس با rename جایگزین فایل اصلی می‌کند."""
+    write_text_atomic(path, json.dumps(data, ensure_ascii=False, separators=(",", ":")))
+
+
+def write_text_atomic(path: Path, text: str) -> None:
+    path = Path(path)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.stem}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except Exception:
+        try: os.unlink(tmp_path)
+        except OSError: pass
+        raise
+
+
+def snapshot_age(snapshot: dict | None) -> float | None:
+    """چند ثانیه از انتشار اسنپ‌شات گذشته است (برای فایل‌های قدیمی بدون زمان None)."""
+    if not snapshot or not snapshot.get("ts"): return None
+    try:
+        published = datetime.fromisoformat(snapshot["ts"])
+    except ValueError:
+        return None
+    return (datetime.now(timezone.utc) - published).total_seconds()
+
+
+def _comparable(prices: dict) -> dict:
+    """زمان‌ها را حذف می‌کند تا فقط تغییر واقعی قیمت‌ها مقایسه شود."""
+    return {k: (e.price, e.price_num, e.error) for k, e in prices.items()}
+
+
+class SnapshotWriter:
+    """
+    اسنپ‌شات قیمت‌ها را به صورت اتمیک (فایل موقت + rename) و فشرده می‌نویسد.
+    نسخه به صورت یکنواخت افزایش می‌یابد و اگر قیمتی تغییر نکرده باشد، نوشتن انجام نمی‌شود؛
+    مگر اینکه heartbeat ثانیه از انتشار قبلی گذشته باشد تا در بازار آرام (مثلاً طلا در
+    تعطیلات) اسنپ‌شات سالم «قدیمی» (STALE_AFTER) حساب نشود.
+    """
+
+    def __init__(self, path: Path, heartbeat: float = STALE_AFTER / 2):
+        self.path = Path(path)
+        self.heartbeat = heartbeat
+        last = read_snapshot(self.path)
+        self.version = last["version"] if last else 0
+        self._last = _comparable(last["prices"]) if last else None
+        self._published = time.monotonic() - (snapshot_age(last) or 0)
+
+    def publish(self, entries: dict) -> bool:
+        """
+        entries: کد دارایی -> PriceEntry (از قبل اعتبارسنجی شده).
+        اگر قیمت‌ها تغییر کرده باشند (یا زمان heartbeat رسیده باشد) نسخه جدید را منتشر می‌کند و True برمی‌گرداند.
+        """
+        prices = dict(entries)
+        comparable = _comparable(prices)
+        if comparable == self._last and time.monotonic() - self._published < self.heartbeat:
+            return False
+
+        snapshot = {
+            "version": self.version + 1,
+            "ts": datetime.now(timezone.utc).isoformat(),
+            "prices": prices,
+        }
+        write_snapshot(self.path, snapshot)
+        self.version = snapshot["version"]
+        self._last = comparable
+        self._published = time.monotonic()
+        return True
+
+
+class SnapshotWatcher:
+    """
+    تغییرات فایل اسنپ‌شات را با یک stat ارزان تشخیص می‌دهد و فقط وقتی نسخه
+    جدیدتری منتشر شده باشد فایل را دوباره می‌خواند.
+    """
+
+    def __init__(self, path: Path | None):
+        self.path = Path(path) if path else None
+        self.version = -1
+        # با هر اسنپ‌شات پذیرفته شده یک واحد زیاد می‌شود؛ برخلاف version برای فایل‌های قدیمی بدون نسخه هم تغییر می‌کند
+        self.revision = 0
+        self.snapshot = None
+        self._stamp = None
+        self._seeded = False
+
+    @property
+    def prices(self) -> dict:
+        return self.snapshot["prices"] if self.snapshot else {}
+
+    def age(self) -> float | None:
+        return snapshot_age(self.snapshot)
+
+    def is_stale(self) -> bool:
+        age = self.age()
+        return age is not None and age > STALE_AFTER
+
+    def seed(self, snapshot: dict | None):
+        """
+        اسنپ‌شات ذخیره شده قبل از ری‌استارت را به عنوان مقدار اولیه قرار می‌دهد تا
+        بدون انتظار برای فایل قیمت‌ها پاسخ داده شود. اولین فایل خوانده شده بعد از آن
+        (حتی با نسخه کمتر، مثلاً بعد از پاک شدن فایل) جایگزین آن می‌شود.
+        """
+        if not snapshot or snapshot.get("version", 0) <= self.version: return
+        self.version = snapshot["version"]
+        self.snapshot = snapshot
+        self.revision += 1
+        self._seeded = True
+
+    def poll(self) -> dict | None:
+        """در صورت وجود نسخه جدید، اسنپ‌شات را برمی‌گرداند؛ در غیر این صورت None."""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+
+        stamp = (st.st_mtime_ns, st.st_size, st.st_ino)
+        if stamp == self._stamp:
+            return None
+
+        snapshot = read_snapshot(self.path)
+        if snapshot is None:
+            return None
+        self._stamp = stamp
+        # نویسنده هیچ‌وقت نسخه کمتری روی فایل نمی‌نویسد؛ فایل تغییر یافته با نسخه کمتر یعنی
+        # فایل پاک و از نو ساخته شده است (inode ممکن است دوباره استفاده شود و نشانه قابل اعتمادی نیست)
+        return snapshot if self._accept(snapshot, replaced=True) else None
+
+    def _accept(self, snapshot: dict, replaced: bool = False) -> bool:
+        """
+        اگر اسنپ‌شات جدیدتر از نسخه فعلی باشد آن را جایگزین کرده و True برمی‌گرداند.
+        نسخه کمتر فقط وقتی پذیرفته می‌شود که شمارنده نویسنده از نو شروع شده باشد: فایل
+        از نو ساخته شده (replaced) یا نسخه بیش از RESET_GAP عقب رفته باشد (مثلاً ری‌استارت Price API).
+        """
+        # نسخه ۰ یعنی فایل قدیمی بدون نسخه؛ در این حالت فقط تغییر فایل ملاک است
+        seeded, self._seeded = self._seeded, False
+        version = snapshot["version"]
+        if version and version <= self.version:
+            if version == self.version: return False
+            if not seeded:
+                if not replaced and self.version - version <= RESET_GAP: return False
+                logger.info("Snapshot version went back, treating it as a reset", extra=fields(old=self.version, new=version))
+
+        self.version = snapshot["version"]
+        self.snapshot = snapshot
+        self.revision += 1
+        return True
@@ -0,0 +1,195 @@
+import sys
+import json
+import time
+import hashlib
+import logging
+from collections import OrderedDict
+from pathlib import Path
+
+from logsetup import fields
+from snapshot import write_json_atomic, encode_snapshot, decode_snapshot
+
+logger = logging.getLogger(__name__)
+
+
+def digest(text: str) -> bytes:
+    """به جای نگه‌داشتن کل متن پیام، فقط یک هش ۸ بایتی ذخیره می‌شود."""
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest()
+
+
+class UserState:
+    """وضعیت گفتگوی یک کاربر (مثلاً منتظر وارد کردن قیمت هشدار)."""
+    __slots__ = ("action", "asset")
+
+    def __init__(self, action, asset=None):
+        self.action = action
+        self.asset = asset
+
+
+class SentMessage:
+    """
+    آخرین پیام ارسال شده به یک چت؛ فقط هش متن، شناسه پیام، نسخه اسنپ‌شاتی که
+    پیام از آن ساخته شده و زمان ارسال نگه‌داری می‌شود.
+    """
+    __slots__ = ("digest", "message_id", "version", "posted_at")
+
+    def __init__(self, digest, message_id=None, version=None, posted_at=None):
+        self.digest = digest
+        self.message_id = message_id
+        self.version = version
+        self.posted_at = posted_at
+
+
+class BoundedCache:
+    """
+    کش محدود با سیاست LRU و انقضای زمانی (TTL).
+    هر ورودی به صورت (مقدار، زمان انقضا) ذخیره می‌شود؛ ttl=None یعنی بدون انقضا.
+    """
+
+    def __init__(self, maxsize, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+
+    def get(self, key, default=None):
+        item = self._data.get(key)
+        if item is None: return default
+        value, expires = item
+        if expires is not None and expires < time.time():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key, value, expires=None):
+        if expires is None and self.ttl is not None:
+            expires = time.time() + self.ttl
+        self._data[key] = (value, expires)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        item = self._data.pop(key, None)
+        return default if item is None else item[0]
+
+    def purge_expired(self):
+        now = time.time()
+        expired = [k for k, (_, exp) in self._data.items() if exp is not None and exp < now]
+        for k in expired: del self._data[k]
+        return len(expired)
+
+    def items(self):
+        for key, (value, expires) in self._data.items():
+            yield key, value, expires
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def nbytes(self):
+        """برآورد حافظه مصرفی ورودی‌ها (کلید، رکورد و فیلدهای آن)."""
+        total = sys.getsizeof(self._data)
+        for key, (value, expires) in self._data.items():
+            total += sys.getsizeof(key) + sys.getsizeof(value) + 64  # تاپل و گره OrderedDict
+            for field in getattr(value, "__slots__", ()):
+                total += sys.getsizeof(getattr(value, field))
+        return total
+
+
+class StateStore:
+    """
+    حافظه داخلی ربات با اندازه محدود:
+    - user_states: وضعیت گفتگوی کاربران که بعد از state_ttl ثانیه منقضی می‌شود
+    - sent: هش آخرین پیام ارسال شده به هر چت (LRU)
+    - members: نتیجه مثبت بررسی عضویت کانال که بعد از member_ttl ثانیه منقضی می‌شود
+    - snapshot و previous_prices: آخرین اسنپ‌شات قیمت و قیمت‌های قبلی برای شروع گرم
+    - references: قیمت‌های عددی هر نسخه اسنپ‌شات که آخرین پست یک چت از آن ساخته شده
+      (مبنای سنجش آستانه تغییر؛ چت‌های هم‌نسخه یک رکورد مشترک دارند)
+    در صورت تعیین path، وضعیت روی دیسک ذخیره می‌شود تا بعد از ری‌استارت باقی بماند.
+    """
+
+    def __init__(self, path: Path | None = None, max_users=10_000, state_ttl=600, max_chats=50_000, member_ttl=300):
+        self.path = Path(path) if path else None
+        self.user_states = BoundedCache(max_users, ttl=state_ttl)
+        self.sent = BoundedCache(max_chats)
+        self.members = BoundedCache(max_users, ttl=member_ttl)
+        self.snapshot = None
+        self.previous_prices = {}
+        self.references = {}
+
+    # --- پیام‌های ارسالی ---
+    def is_duplicate(self, chat_id, text) -> bool:
+        record = self.sent.get(chat_id)
+        return record is not None and record.digest == digest(text)
+
+    def mark_sent(self, chat_id, text, message_id=None, version=None, prices=None):
+        """ثبت ارسال؛ در صورت دادن prices، قیمت‌های آن نسخه به عنوان مبنای آستانه نگه‌داری می‌شوند."""
+        self.sent.set(chat_id, SentMessage(digest(text), message_id, version, time.time()))
+        if version is not None and version not in self.references and prices is not None:
+            self.references[version] = {k: v.price_num for k, v in prices.items() if v.price_num}
+
+    def prune_references(self):
+        """نسخه‌هایی که دیگر مبنای هیچ چتی نیستند حذف می‌شوند."""
+        used = {v.version for _, v, _ in self.sent.items()}
+        for version in [v for v in self.references if v not in used]: del self.references[version]
+
+    # --- ذخیره و بازیابی ---
+    def save(self):
+        if self.path: self.write(self.dump())
+
+    def dump(self) -> dict:
+        """
+        داده قابل ذخیره را می‌سازد. باید روی event loop صدا زده شود تا با تغییر
+        وضعیت هم‌زمان نباشد؛ نوشتن آن (write) را می‌توان به یک ترد سپرد.
+        """
+        self.user_states.purge_expired()
+        self.members.purge_expired()
+        self.prune_references()
+        data = {
+            "user_states": [[k, v.action, v.asset, exp] for k, v, exp in self.user_states.items()],
+            "sent": [[k, v.digest.hex(), v.message_id, v.version, v.posted_at] for k, v, _ in self.sent.items()],
+            "references": [[version, prices] for version, prices in self.references.items()],
+            "members": [[k, exp] for k, _, exp in self.members.items()],
+            "snapshot": encode_snapshot(self.snapshot) if self.snapshot else None,
+            "previous_prices": dict(self.previous_prices),
+        }
+        return data
+
+    def write(self, data: dict):
+        write_json_atomic(self.path, data)
+
+    def load(self):
+        if not self.path or not self.path.exists(): return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (json.JSONDecodeError, IOError) as e:
+            logger.warning("Could not load state file", extra=fields(path=self.path, error=e))
+            return
+        now = time.time()
+        for uid, action, asset, exp in data.get("user_states", []):
+            if exp is None or exp > now:
+                self.user_states.set(uid, UserState(action, asset), expires=exp)
+        for cid, hexdigest, message_id, *rest in data.get("sent", []):
+            self.sent.set(cid, SentMessage(bytes.fromhex(hexdigest), message_id, *rest))
+        self.references = {version: prices for version, prices in data.get("references", [])}
+        for uid, exp in data.get("members", []):
+            if exp is None or exp > now: self.members.set(uid, True, expires=exp)
+        # فایل‌های قدیمی اسنپ‌شات را به صورت JSON تو در تو ذخیره کرده‌اند
+        self.snapshot = decode_snapshot(data["snapshot"]) if data.get("snapshot") else None
+        self.previous_prices = data.get("previous_prices") or {}
+
+    def stats(self) -> dict:
+        sent_bytes = self.sent.nbytes()
+        return {
+            "user_states": len(self.user_states),
+            "chats": len(self.sent),
+            "members": len(self.members),
+            "references": len(self.references),
+            "user_states_bytes": self.user_states.nbytes(),
+            "sent_bytes": sent_bytes,
+            "bytes_per_chat": sent_bytes // len(self.sent) if len(self.sent) else 0,
+        }
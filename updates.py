@@ -0,0 +1,124 @@
+"""
+پردازش هم‌زمان آپدیت‌های تلگرام با حفظ ترتیب برای هر کاربر و هر چت.
+
+آپدیت‌های یک کاربر یا یک چت به ترتیب دریافت اجرا می‌شوند، ولی هندلر کند یک کاربر
+(مثلاً get_chat_member یا دیتابیس) بقیه کاربران را معطل نمی‌کند.
+"""
+import time
+import asyncio
+import logging
+from collections import Counter
+
+from telegram import Update
+from telegram.error import TelegramError
+from telegram.ext import BaseUpdateProcessor
+
+from sender import PRIORITY_INTERACTIVE
+
+logger = logging.getLogger(__name__)
+
+# تعداد هندلرهایی که واقعاً هم‌زمان اجرا می‌شوند
+WORKERS = 32
+# حداکثر آپدیت‌های در جریان (در انتظار نوبت یا در حال اجرا)
+MAX_PENDING = 1024
+# با عبور صف از این حد، آپدیت‌های تعاملی قدیمی‌تر از MAX_AGE ثانیه دور ریخته می‌شوند
+SHED_BACKLOG = 100
+MAX_AGE = 10.0
+# دکمه‌هایی که فقط آخرین کلیک روی هر پیام اهمیت دارد (مثل 🔄)
+COALESCED_CALLBACKS = frozenset({"price_all"})
+
+
+class OrderedUpdateProcessor(BaseUpdateProcessor):
+    """
+    هر آپدیت پشت آپدیت‌های قبلی همان کاربر و همان چت صف می‌کشد (زنجیره future ها)
+    و بعد برای یکی از WORKERS جایگاه اجرا منتظر می‌ماند؛ انتظار برای نوبت جایگاهی اشغال نمی‌کند.
+    کلیک‌های تکراری روی دکمه‌های COALESCED_CALLBACKS یک پیام به آخرینشان خلاصه می‌شوند.
+    """
+
+    def __init__(self, sender=None, workers=WORKERS, max_pending=MAX_PENDING, shed_backlog=SHED_BACKLOG, max_age=MAX_AGE):
+        super().__init__(max_pending)
+        # بستن لودینگ دکمه کلیک‌های خلاصه شده هم از زمان‌بند خروجی عبور می‌کند
+        self.sender = sender
+        self.workers = workers
+        self.shed_backlog = shed_backlog
+        self.max_age = max_age
+        self.stats = Counter()
+        self._slots = None
+        self._tails = {}  # ("user" | "chat", شناسه) -> future آخرین آپدیت
+        self._latest = {}  # (chat_id, message_id, data) -> update_id آخرین کلیک
+        self._backlog = 0
+        self._max_wait = 0.0
+
+    async def initialize(self):
+        self._slots = asyncio.Semaphore(self.workers)
+
+    async def shutdown(self):
+        pass
+
+    def snapshot(self) -> dict:
+        """آمار از آخرین فراخوانی به بعد، برای لاگ دوره‌ای"""
+        stats = {**self.stats, "backlog": self._backlog, "max_wait_ms": round(self._max_wait * 1000)}
+        self.stats.clear()
+        self._max_wait = 0.0
+        return stats
+
+    @staticmethod
+    def _keys(update):
+        if not isinstance(update, Update): return ()
+        keys = []
+        if update.effective_user: keys.append(("user", update.effective_user.id))
+        if update.effective_chat: keys.append(("chat", update.effective_chat.id))
+        return keys
+
+    @staticmethod
+    def _coalesce_key(update):
+        query = update.callback_query if isinstance(update, Update) else None
+        if query is None or query.data not in COALESCED_CALLBACKS or query.message is None: return None
+        return query.message.chat.id, query.message.message_id, query.data
+
+    def _is_stale(self, update, arrived) -> bool:
+        # فقط آپدیت‌های تعاملی؛ تغییر عضویت ربات در گروه‌ها هیچ‌وقت دور ریخته نمی‌شود
+        if not isinstance(update, Update): return False
+        if not (update.callback_query or update.inline_query or update.message): return False
+        age = time.monotonic() - arrived
+        # پیام‌هایی که هنگام خاموش بودن ربات در صف تلگرام مانده‌اند هم قدیمی حساب می‌شوند
+        if update.message and update.message.date:
+            age = max(age, time.time() - update.message.date.timestamp())
+        return age > self.max_age
+
+    async def do_process_update(self, update, coroutine):
+        arrived = time.monotonic()
+        keys = self._keys(update)
+        waits = [self._tails[k] for k in keys if k in self._tails]
+        done = asyncio.get_running_loop().create_future()
+        for k in keys: self._tails[k] = done
+        coalesce = self._coalesce_key(update)
+        if coalesce: self._latest[coalesce] = update.update_id
+        self._backlog += 1
+        try:
+            # wait (نه gather): لغو این آپدیت نباید future آپدیت‌های قبلی را لغو کند
+            if waits: await asyncio.wait(waits)
+            if coalesce and self._latest.get(coalesce) != update.update_id:
+                # کلیک جدیدتری روی همین پیام در صف است؛ فقط لودینگ دکمه بسته می‌شود
+                self.stats["coalesced"] += 1
+                try:
+                    if self.sender: await self.sender.submit(PRIORITY_INTERACTIVE, None, update.callback_query.answer)
+                    else: await update.callback_query.answer()
+                except TelegramError: pass
+                return
+            async with self._slots:
+                wait = time.monotonic() - arrived
+                self._max_wait = max(self._max_wait, wait)
+                if self._backlog > self.shed_backlog and self._is_stale(update, arrived):
+                    self.stats["shed"] += 1
+                    return
+                self.stats["processed"] += 1
+                await coroutine
+        finally:
+            # آپدیت دور ریخته شده (یا لغو شده) اجرا نمی‌شود؛ بستن کوروتین اجرا شده بی‌اثر است
+            coroutine.close()
+            self._backlog -= 1
+            done.set_result(None)
+            for k in keys:
+                if self._tails.get(k) is done: del self._tails[k]
+            if coalesce and self._latest.get(coalesce) == update.update_id: del self._latest[coalesce]